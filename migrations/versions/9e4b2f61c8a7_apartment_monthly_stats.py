@@ -0,0 +1,82 @@
+"""apartment monthly stats
+
+Revision ID: 9e4b2f61c8a7
+Revises: 5c1e7a9d3b24
+Create Date: 2026-10-19 15:40:12.338021
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9e4b2f61c8a7"
+down_revision: Union[str, None] = "5c1e7a9d3b24"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nights are the dates a guest sleeps over (start_date <= night < end_date),
+    # every check-out is a turnover and cleaning days are counted once per date
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW apartment_monthly_stats AS
+        WITH events AS (
+            SELECT booking.apartment_id,
+                   date_trunc('month', night)::date AS month,
+                   1 AS nights, 0 AS turnovers
+            FROM booking,
+                 generate_series(
+                     booking.start_date,
+                     booking.end_date - 1,
+                     interval '1 day'
+                 ) AS night
+            UNION ALL
+            SELECT apartment_id, date_trunc('month', end_date)::date, 0, 1
+            FROM booking
+        ),
+        cleanings AS (
+            SELECT apartment_id, date_trunc('month', cleaning_date)::date AS month,
+                   count(DISTINCT cleaning_date) AS cleaning_days
+            FROM booking
+            GROUP BY 1, 2
+        ),
+        totals AS (
+            SELECT apartment_id, month,
+                   sum(nights) AS nights_booked,
+                   sum(turnovers) AS turnovers
+            FROM events
+            GROUP BY 1, 2
+        )
+        SELECT apartment_id,
+               month,
+               coalesce(totals.nights_booked, 0)::integer AS nights_booked,
+               coalesce(totals.turnovers, 0)::integer AS turnovers,
+               coalesce(cleanings.cleaning_days, 0)::integer AS cleaning_days,
+               round(
+                   coalesce(totals.nights_booked, 0)::numeric
+                   / extract(day FROM month + interval '1 month' - interval '1 day'),
+                   4
+               )::float AS occupancy_rate
+        FROM totals
+        FULL JOIN cleanings USING (apartment_id, month)
+        """
+    )
+    # required by REFRESH ... CONCURRENTLY
+    op.create_index(
+        "apartment_monthly_stats_apartment_id_month_idx",
+        "apartment_monthly_stats",
+        ["apartment_id", "month"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "apartment_monthly_stats_apartment_id_month_idx",
+        table_name="apartment_monthly_stats",
+    )
+    op.execute("DROP MATERIALIZED VIEW apartment_monthly_stats")
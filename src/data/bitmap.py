@@ -0,0 +1,95 @@
+from calendar import isleap
+from datetime import date, timedelta
+from typing import Iterable, Iterator, Mapping, Protocol
+
+from src.data.value import STATUS_BITS, ApartmentStatus
+
+# one bit per day of a year, day n is bit n % 8 of byte n // 8,
+# the same numbering postgres get_bit uses on bytea
+
+FIELDS = ("checkins", "checkouts", "cleanings", "nights", "blocked")
+ONE_DAY = timedelta(days=1)
+
+
+class Stay(Protocol):
+    start_date: date
+    end_date: date
+    cleaning_date: date | None
+
+
+def year_days(year: int) -> int:
+    return 366 if isleap(year) else 365
+
+
+def empty(year: int) -> bytearray:
+    return bytearray((year_days(year) + 7) // 8)
+
+
+def day_index(day: date) -> int:
+    return day.timetuple().tm_yday - 1
+
+
+def year_spans(start: date, end: date) -> Iterator[tuple[int, int, int]]:
+    # splits [start, end) into (year, first index, last index + 1) per year
+    while start < end:
+        year_end = date(start.year + 1, 1, 1)
+        stop = min(end, year_end)
+        yield start.year, day_index(start), day_index(stop - timedelta(days=1)) + 1
+        start = stop
+
+
+def set_range(bitmap: bytearray, start: int, stop: int) -> None:
+    for index in range(start, stop):
+        bitmap[index >> 3] |= 1 << (index & 7)
+
+
+def copy_range(bitmap: bytearray, source: bytes, start: int, stop: int) -> None:
+    for index in range(start, stop):
+        if is_set(source, index):
+            bitmap[index >> 3] |= 1 << (index & 7)
+        else:
+            bitmap[index >> 3] &= ~(1 << (index & 7))
+
+
+def is_set(bitmap: bytes, index: int) -> bool:
+    return bool(bitmap[index >> 3] & (1 << (index & 7)))
+
+
+def any_in_range(bitmap: bytes, start: int, stop: int) -> bool:
+    return any(bitmap[index >> 3] & (1 << (index & 7)) for index in range(start, stop))
+
+
+def build(stays: Iterable[Stay]) -> dict[int, dict[str, bytearray]]:
+    # nights run from check-in up to check-out and a booking blocks new
+    # stays from check-in up to its cleaning, the same rule as Booking.blocks
+    years: dict[int, dict[str, bytearray]] = {}
+
+    def mark(name: str, start: date, end: date) -> None:
+        for year, first, stop in year_spans(start, end):
+            if year not in years:
+                years[year] = {field: empty(year) for field in FIELDS}
+            set_range(years[year][name], first, stop)
+
+    for stay in stays:
+        cleaning_date = stay.cleaning_date or stay.end_date
+        mark("checkins", stay.start_date, stay.start_date + ONE_DAY)
+        mark("checkouts", stay.end_date, stay.end_date + ONE_DAY)
+        mark("cleanings", cleaning_date, cleaning_date + ONE_DAY)
+        mark("nights", stay.start_date, stay.end_date)
+        mark("blocked", stay.start_date, cleaning_date)
+    return years
+
+
+def day_mask(bitmaps: Mapping[str, bytes], index: int) -> int:
+    # Apartment.status as a STATUS_BITS mask, 0 for a vacant day
+    checkin = is_set(bitmaps["checkins"], index)
+    mask = 0
+    if checkin:
+        mask |= STATUS_BITS[ApartmentStatus.CHECKIN]
+    if is_set(bitmaps["checkouts"], index):
+        mask |= STATUS_BITS[ApartmentStatus.CHECKOUT]
+    if is_set(bitmaps["cleanings"], index):
+        mask |= STATUS_BITS[ApartmentStatus.CLEANING]
+    if not checkin and is_set(bitmaps["nights"], index):
+        mask |= STATUS_BITS[ApartmentStatus.OCCUPIED]
+    return mask
@@ -1,9 +1,11 @@
+from collections import defaultdict
 from datetime import UTC, date, datetime
-from itertools import dropwhile, takewhile
-from typing import Generator, NamedTuple, Self, Sequence, Union, cast
+from hashlib import blake2b
+from itertools import groupby
+from typing import Generator, Iterable, NamedTuple, Self, Sequence, Union, cast
 
 from cuid2 import Cuid
-from dateutil.rrule import DAILY, rrule
+from sqlalchemy import ColumnElement, and_, exists, func, or_, text, tuple_
 from sqlalchemy.orm import contains_eager
 from sqlmodel import (
     CheckConstraint,
@@ -15,14 +17,64 @@ from sqlmodel import (
     SQLModel,
     delete,
     select,
+    update,
 )
 from sqlmodel.ext.asyncio.session import AsyncSession
-
-from src.data.value import ApartmentStatus
+from sqlmodel.sql.expression import Select, SelectOfScalar
+
+from src.data import bitmap, span
+from src.data.value import (
+    STATUS_BITS,
+    ApartmentMonth,
+    ApartmentStatus,
+    DirtyIntervals,
+)
 from src.data.value import Booking as BookingValue
 
 CUID = Cuid(length=32)
 
+# Apartment.status in SQL: the bookings covering a day (start_date through
+# cleaning_date) decide its statuses, reported as a STATUS_BITS mask,
+# days without any covering booking are vacant and left out
+STATUS_MASKS = text(
+    """
+    WITH days AS (
+        SELECT day::date AS day
+        FROM generate_series(
+            CAST(:from_date AS date), CAST(:to_date AS date), interval '1 day'
+        ) AS day
+    ),
+    covering AS (
+        SELECT booking.apartment_id, days.day,
+               booking.start_date, booking.end_date, booking.cleaning_date,
+               count(*) OVER w AS bookings,
+               row_number() OVER (w ORDER BY booking.start_date) AS position
+        FROM booking
+        JOIN days
+          ON booking.start_date <= days.day AND days.day <= booking.cleaning_date
+        WHERE booking.apartment_id = ANY(:apartment_ids)
+          AND booking.start_date <= CAST(:to_date AS date)
+          AND booking.cleaning_date >= CAST(:from_date AS date)
+        WINDOW w AS (PARTITION BY booking.apartment_id, days.day)
+    )
+    SELECT apartment_id, day,
+           CASE
+               WHEN bookings = 2 AND end_date = cleaning_date
+                   THEN {checkout} | {cleaning} | {checkin}
+               WHEN bookings = 2 THEN {cleaning} | {checkin}
+               WHEN end_date = day AND cleaning_date = day
+                   THEN {checkout} | {cleaning}
+               WHEN start_date = day THEN {checkin}
+               WHEN end_date = day THEN {checkout}
+               WHEN cleaning_date = day THEN {cleaning}
+               WHEN start_date < day AND day < end_date THEN {occupied}
+               ELSE {vacant}
+           END AS mask
+    FROM covering
+    WHERE position = 1
+    """.format(**{status.lower(): bit for status, bit in STATUS_BITS.items()})
+)
+
 
 class DayInfo(NamedTuple):
     num_of_bookings: int
@@ -48,15 +100,68 @@ class User(SQLModel, table=True):
     username: str
     password: str
     created_at: datetime = timezoned()
+    # set once the occupancy bitmaps cover every booking of the user,
+    # until then they must not be read
+    occupancy_built_at: datetime | None = Field(
+        default=None, sa_column=Column(DateTime(timezone=True), nullable=True)
+    )
 
     apartments: list["Apartment"] = Relationship(back_populates="user")
 
     @classmethod
-    async def create(cls, session: AsyncSession, username: str, password: str) -> Self:
-        user = cls(username=username, password=password)
+    async def create(
+        cls,
+        session: AsyncSession,
+        username: str,
+        password: str,
+        occupancy_built: bool = False,
+    ) -> Self:
+        # a new user has no bookings, imports keep the bitmaps complete
+        # from here on when they maintain them
+        user = cls(
+            username=username,
+            password=password,
+            occupancy_built_at=datetime.now(UTC) if occupancy_built else None,
+        )
         session.add(user)
         return user
 
+    @classmethod
+    async def occupancy_ready(cls, session: AsyncSession, user_id: str) -> bool:
+        result = await session.exec(
+            select(cls.occupancy_built_at).where(cls.id == user_id)
+        )
+        return result.one_or_none() is not None
+
+    @classmethod
+    async def set_occupancy_built(
+        cls, session: AsyncSession, user_id: str, built: bool
+    ) -> None:
+        # cleared by imports that do not maintain the bitmaps, which are
+        # then stale until the backfill runs again
+        statement = update(cls).where(cls.id == user_id)  # type: ignore[arg-type]
+        if not built:
+            statement = statement.where(cls.occupancy_built_at.is_not(None))  # type: ignore[union-attr]
+        await session.exec(  # type: ignore[call-overload]
+            statement.values(occupancy_built_at=datetime.now(UTC) if built else None)
+        )
+
+    @staticmethod
+    def lock_key(user_id: str) -> int:
+        return int.from_bytes(
+            blake2b(user_id.encode(), digest_size=8).digest(), "big", signed=True
+        )
+
+    @classmethod
+    async def lock(cls, session: AsyncSession, user_id: str) -> None:
+        # serializes imports per user until the transaction ends,
+        # instead of row locks on every overlapping booking
+        await session.exec(select(func.pg_advisory_xact_lock(cls.lock_key(user_id))))
+
+    @staticmethod
+    async def get_by_id(session: AsyncSession, id: str) -> Union["User", None]:
+        return (await session.exec(select(User).where(User.id == id))).one_or_none()
+
     @staticmethod
     async def get_by_username(
         session: AsyncSession, username: str
@@ -69,6 +174,9 @@ class User(SQLModel, table=True):
 class Booking(SQLModel, table=True):
     __table_args__ = (
         Index("booking_start_date_end_date_idx", "start_date", "end_date"),
+        Index(
+            "booking_apartment_id_cleaning_date_idx", "apartment_id", "cleaning_date"
+        ),
         CheckConstraint("cleaning_date >= end_date"),
         CheckConstraint("cleaning_deadline >= cleaning_date"),
     )
@@ -85,8 +193,25 @@ class Booking(SQLModel, table=True):
     apartment_id: str | None = Field(foreign_key="apartment.id", nullable=False)
     apartment: "Apartment" = Relationship(back_populates="bookings")
 
+    @classmethod
+    def blocking(cls, check_in: date, check_out: date) -> ColumnElement[bool]:
+        # a stay may begin on the day this booking is cleaned
+        # and end on the day it checks in, as status() allows both turnovers
+        return and_(
+            cls.start_date < check_out,  # type: ignore[arg-type]
+            cls.cleaning_date > check_in,  # type: ignore[operator]
+        )
+
+    @classmethod
+    def export_rows(cls, apartment_id: str) -> Select:
+        return (
+            select(cls.start_date, cls.end_date, cls.guest_name)
+            .where(cls.apartment_id == apartment_id)
+            .order_by(cls.start_date)  # type: ignore[arg-type]
+        )
+
     async def get_overlapping_bookings(
-        self, session: AsyncSession, apartment_id: str
+        self, session: AsyncSession, apartment_id: str, user_id: str
     ) -> Sequence["Booking"]:
         return (
             (
@@ -95,8 +220,8 @@ class Booking(SQLModel, table=True):
                     .join(Apartment)
                     .where(self.start_date <= Booking.end_date)
                     .where(self.end_date > Booking.start_date)
+                    .where(Apartment.user_id == user_id)
                     .where(Apartment.id != apartment_id)
-                    .with_for_update()
                 )
             )
             .unique()
@@ -105,6 +230,10 @@ class Booking(SQLModel, table=True):
 
 
 class Apartment(SQLModel, table=True):
+    __table_args__ = (
+        Index("apartment_user_id_number_id_idx", "user_id", "number", "id"),
+    )
+
     id: str | None = Field(primary_key=True, default=None)
     number: int
     created_at: datetime = timezoned()
@@ -131,6 +260,29 @@ class Apartment(SQLModel, table=True):
         )
         return apartment.unique().one_or_none()
 
+    @classmethod
+    async def last_updated(
+        cls, session: AsyncSession, number: int | str, user_id: str
+    ) -> datetime | None:
+        return (
+            await session.exec(
+                select(cls.updated_at).where(cls.id == cls.make_id(user_id, number))
+            )
+        ).one_or_none()
+
+    @classmethod
+    async def version(
+        cls, session: AsyncSession, number: int | str, user_id: str
+    ) -> tuple[str, int, datetime | None] | None:
+        row = (
+            await session.exec(
+                select(cls.id, cls.number, cls.updated_at).where(
+                    cls.id == cls.make_id(user_id, number)
+                )
+            )
+        ).one_or_none()
+        return cast(tuple[str, int, datetime | None] | None, row)
+
     @classmethod
     async def create(
         cls, session: AsyncSession, number: int | str, user_id: str
@@ -145,102 +297,81 @@ class Apartment(SQLModel, table=True):
         return apartment
 
     def status(self, dt: date) -> list[ApartmentStatus]:
-        overlapping_bookings = list(
-            takewhile(
-                lambda b: b.start_date <= dt <= cast(date, b.cleaning_date),
-                dropwhile(
-                    lambda b: (b.start_date > dt or cast(date, b.cleaning_date) < dt),
-                    self.bookings,
-                ),
-            )
-        )
-        # a maximum of two bookings can overlap and
-        # if they do it means a checkin, a checkout and a cleaning
-        # is must happen that day
-        if not overlapping_bookings:
-            return [ApartmentStatus.VACANT]
-
-        if len(overlapping_bookings) == 2:
-            if (
-                overlapping_bookings[0].end_date
-                == overlapping_bookings[0].cleaning_date
-            ):
-                return [
-                    ApartmentStatus.CHECKOUT,
-                    ApartmentStatus.CLEANING,
-                    ApartmentStatus.CHECKIN,
-                ]
-            return [
-                ApartmentStatus.CLEANING,
-                ApartmentStatus.CHECKIN,
-            ]
-
-        if (
-            overlapping_bookings[0].end_date == dt
-            and overlapping_bookings[0].cleaning_date == dt
-        ):
-            return [ApartmentStatus.CHECKOUT, ApartmentStatus.CLEANING]
-        if overlapping_bookings[0].start_date == dt:
-            return [ApartmentStatus.CHECKIN]
-        if overlapping_bookings[0].end_date == dt:
-            return [ApartmentStatus.CHECKOUT]
-        if overlapping_bookings[0].cleaning_date == dt:
-            return [ApartmentStatus.CLEANING]
-        if overlapping_bookings[0].start_date < dt < overlapping_bookings[0].end_date:
-            return [ApartmentStatus.OCCUPIED]
-        return [ApartmentStatus.VACANT]
+        # only the covering bookings become spans, whole schedules
+        # go through span.sweep instead
+        found = []
+        for booking in self.bookings:
+            if booking.start_date <= dt <= cast(date, booking.cleaning_date):
+                found.append(booking)
+            elif found:
+                break
+        return span.statuses_of(span.Span.many(found), dt.toordinal())
 
     async def prepare(
-        self,
-        session: AsyncSession,
+        self, session: AsyncSession, dirty: DirtyIntervals | None = None
     ) -> Self:
+        if dirty is not None:
+            for booking in self.bookings:
+                dirty.add(
+                    cast(str, self.id),
+                    booking.start_date,
+                    cast(date, booking.cleaning_date),
+                )
         await self.delete_own_bookings(session)
         await session.refresh(self)
         return self
 
     async def set_schedule(
-        self, session: AsyncSession, bookings: list[BookingValue]
-    ) -> None:
+        self,
+        session: AsyncSession,
+        bookings: list[BookingValue],
+        dirty: DirtyIntervals | None = None,
+    ) -> DirtyIntervals:
+        # returns the days whose statuses changed, on other apartments too
+        # when their cleanings moved to a shared cleaning date
+        dirty = DirtyIntervals() if dirty is None else dirty
         for booking in bookings:
             new_booking = Booking(**booking.model_dump(), apartment=self)
             overlapping = tuple(
-                await new_booking.get_overlapping_bookings(session, cast(str, self.id))
+                await new_booking.get_overlapping_bookings(
+                    session, cast(str, self.id), self.user_id
+                )
             )
             best = self.determine_best_cleaning_date(new_booking, overlapping)
-            self.assign_cleaning_date(session, new_booking, best)
+            self.assign_cleaning_date(session, new_booking, best, dirty)
+            dirty.add(
+                cast(str, self.id),
+                new_booking.start_date,
+                cast(date, new_booking.cleaning_date),
+            )
         self.updated_at = datetime.now(tz=UTC)
+        return dirty
 
     def determine_best_cleaning_date(
         self, booking: Booking, overlapping: tuple[Booking, ...]
     ) -> DayInfo | None:
-        best: DayInfo | None = None
         if not overlapping:
-            return best
+            return None
         deadline = self.get_furthest_deadline(overlapping)
         end_date = self.get_furthest_end_date_generator(overlapping, booking)
-        for ddate in rrule(
-            DAILY,
-            dtstart=booking.end_date,
-            until=(
-                booking.cleaning_deadline
-                or deadline
-                or max(end_date)  # fallback to latest checkout
-            ),
-        ):
-            day = ddate.date()
-            bookings_vacant_on_ddate = {
-                b.id: b
-                for b in overlapping
-                if b.end_date <= day <= (b.cleaning_deadline or date(3000, 1, 1))
-            }
-
-            day_info = DayInfo(
-                len(bookings_vacant_on_ddate), day, bookings_vacant_on_ddate
-            )
-            if not best or (len(best.bookings) < len(day_info.bookings)):
-                best = day_info
-
-        return best
+        until = (
+            booking.cleaning_deadline
+            or deadline
+            or max(end_date)  # fallback to latest checkout
+        )
+        candidates = [
+            (b, span.Span.of(b)) for b in {b.id: b for b in overlapping}.values()
+        ]
+        best_day, best_count = None, -1
+        for day in range(booking.end_date.toordinal(), until.toordinal() + 1):
+            count = sum(1 for _, s in candidates if s.end <= day <= s.deadline)
+            # an empty best is replaced by any later day
+            if best_count <= 0 or count > best_count:
+                best_day, best_count = day, count
+        if best_day is None:
+            return None
+        vacant = {b.id: b for b, s in candidates if s.end <= best_day <= s.deadline}
+        return DayInfo(len(vacant), date.fromordinal(best_day), vacant)
 
     @staticmethod
     def get_furthest_deadline(overlapping: tuple[Booking, ...]) -> date | None:
@@ -267,27 +398,218 @@ class Apartment(SQLModel, table=True):
 
     @staticmethod
     def assign_cleaning_date(
-        session: AsyncSession, booking: Booking, best: DayInfo | None
+        session: AsyncSession,
+        booking: Booking,
+        best: DayInfo | None,
+        dirty: DirtyIntervals | None = None,
     ) -> None:
         if not best:
             booking.cleaning_date = booking.end_date  # clean the room ASAP
             session.add(booking)
         else:
-            for b in (*best.bookings.values(), booking):
+            for b in best.bookings.values():
+                # statuses change from the old cleaning day to the new one
+                if dirty is not None and b.cleaning_date != best.date:
+                    dirty.add(
+                        cast(str, b.apartment_id),
+                        cast(date, b.cleaning_date or b.end_date),
+                        best.date,
+                    )
                 b.cleaning_date = best.date
                 session.add(b)
+            booking.cleaning_date = best.date
+            session.add(booking)
+
+    @staticmethod
+    async def list_available(
+        session: AsyncSession, user_id: str, check_in: date, check_out: date
+    ) -> list["Apartment"]:
+        result = await session.exec(
+            select(Apartment)
+            .where(Apartment.user_id == user_id)
+            .where(
+                ~exists()
+                .where(Booking.apartment_id == Apartment.id)
+                .where(Booking.blocking(check_in, check_out))
+            )
+            .order_by(Apartment.number, Apartment.id)  # type: ignore[arg-type]
+        )
+        return list(result.all())
+
+    @staticmethod
+    async def list_active(
+        session: AsyncSession, user_id: str, from_date: date, to_date: date
+    ) -> list["Apartment"]:
+        # only the bookings a status between the two dates can depend on,
+        # i.e. those running from check-in up to their cleaning
+        result = await session.exec(
+            select(Apartment)
+            .join(Booking)
+            .options(contains_eager(Apartment.bookings))  # type: ignore[arg-type]
+            .where(Apartment.user_id == user_id)
+            .where(Booking.start_date <= to_date)
+            .where(Booking.cleaning_date >= from_date)  # type: ignore[operator]
+            .order_by(
+                Apartment.number,  # type: ignore[arg-type]
+                Apartment.id,
+                Booking.start_date,  # type: ignore[arg-type]
+            )
+        )
+        return list(result.unique().all())
+
+    @staticmethod
+    async def list_window(
+        session: AsyncSession,
+        user_id: str,
+        from_date: date,
+        to_date: date,
+        limit: int | None = None,
+        after: tuple[int, str] | None = None,
+    ) -> list["Apartment"]:
+        # like list_active but keeping apartments without bookings in the
+        # window, which then come back with no bookings loaded
+        statement = (
+            select(Apartment)
+            .outerjoin(
+                Booking,
+                and_(
+                    Booking.apartment_id == Apartment.id,  # type: ignore[arg-type]
+                    Booking.start_date <= to_date,  # type: ignore[arg-type]
+                    func.coalesce(Booking.cleaning_date, Booking.end_date) >= from_date,
+                ),
+            )
+            .options(contains_eager(Apartment.bookings))  # type: ignore[arg-type]
+            .where(Apartment.user_id == user_id)
+        )
+        if limit is not None or after is not None:
+            statement = statement.where(
+                Apartment.id.in_(  # type: ignore[union-attr]
+                    Apartment.page(user_id, limit, after).scalar_subquery()
+                )
+            )
+        result = await session.exec(
+            statement.order_by(
+                Apartment.number,  # type: ignore[arg-type]
+                Apartment.id,
+                Booking.start_date,  # type: ignore[arg-type]
+            )
+        )
+        return list(result.unique().all())
+
+    @staticmethod
+    def export_rows(user_id: str) -> Select:
+        # every apartment of the user with its bookings, apartments without
+        # any come back once with empty booking columns
+        return (
+            select(
+                Apartment.id,
+                Apartment.number,
+                Booking.start_date,
+                Booking.end_date,
+                Booking.guest_name,
+            )
+            .outerjoin(Booking, Booking.apartment_id == Apartment.id)  # type: ignore[arg-type]
+            .where(Apartment.user_id == user_id)
+            .order_by(
+                Apartment.number,  # type: ignore[arg-type]
+                Apartment.id,
+                Booking.start_date,  # type: ignore[arg-type]
+            )
+        )
+
+    @staticmethod
+    def page(
+        user_id: str, limit: int | None, after: tuple[int, str] | None
+    ) -> SelectOfScalar[str | None]:
+        page = (
+            select(Apartment.id)
+            .where(Apartment.user_id == user_id)
+            .where(exists().where(Booking.apartment_id == Apartment.id))
+        )
+        if after is not None:
+            page = page.where(tuple_(Apartment.number, Apartment.id) > after)
+        return page.order_by(Apartment.number, Apartment.id).limit(limit)  # type: ignore[arg-type]
+
+    @staticmethod
+    async def list_numbers(
+        session: AsyncSession,
+        user_id: str,
+        limit: int | None = None,
+        after: tuple[int, str] | None = None,
+    ) -> list[tuple[str, int]]:
+        page = Apartment.page(user_id, limit, after).subquery()
+        result = await session.exec(
+            select(Apartment.id, Apartment.number)
+            .join(page, page.c.id == Apartment.id)
+            .order_by(Apartment.number, Apartment.id)  # type: ignore[arg-type]
+        )
+        return [(cast(str, id), number) for id, number in result.all()]
+
+    @staticmethod
+    async def booking_bounds(
+        session: AsyncSession, apartment_ids: list[str]
+    ) -> tuple[date | None, date | None]:
+        # the same defaults make_schedule derives from the loaded bookings
+        result = await session.exec(
+            select(
+                func.min(Booking.start_date),
+                func.max(
+                    func.coalesce(Booking.cleaning_deadline, Booking.cleaning_date)
+                ),
+            ).where(Booking.apartment_id.in_(apartment_ids))  # type: ignore[union-attr]
+        )
+        return cast(tuple[date | None, date | None], tuple(result.one()))
+
+    @staticmethod
+    async def user_booking_bounds(
+        session: AsyncSession, user_id: str
+    ) -> tuple[date | None, date | None]:
+        # over the whole portfolio, so every page of a listing gets one window
+        result = await session.exec(
+            select(
+                func.min(Booking.start_date),
+                func.max(
+                    func.coalesce(Booking.cleaning_deadline, Booking.cleaning_date)
+                ),
+            )
+            .join(Apartment)
+            .where(Apartment.user_id == user_id)
+        )
+        return cast(tuple[date | None, date | None], tuple(result.one()))
+
+    @staticmethod
+    async def status_masks(
+        session: AsyncSession, apartment_ids: list[str], from_date: date, to_date: date
+    ) -> list[tuple[str, date, int]]:
+        result = await session.exec(
+            STATUS_MASKS.bindparams(
+                apartment_ids=apartment_ids, from_date=from_date, to_date=to_date
+            )
+        )
+        return [tuple(row) for row in result.all()]  # type: ignore[misc]
 
     @staticmethod
     async def list(
         session: AsyncSession,
         user_id: str,
+        limit: int | None = None,
+        after: tuple[int, str] | None = None,
     ) -> list["Apartment"]:
         statement = (
             select(Apartment).join(Booking).options(contains_eager(Apartment.bookings))  # type: ignore[arg-type]
         )
 
+        if limit is not None or after is not None:
+            statement = statement.where(
+                Apartment.id.in_(  # type: ignore[union-attr]
+                    Apartment.page(user_id, limit, after).scalar_subquery()
+                )
+            )
+
         statement = statement.where(Apartment.user_id == user_id).order_by(
-            Booking.start_date  # type: ignore[arg-type]
+            Apartment.number,  # type: ignore[arg-type]
+            Apartment.id,
+            Booking.start_date,  # type: ignore[arg-type]
         )
 
         result = await session.exec(statement)
@@ -297,3 +619,207 @@ class Apartment(SQLModel, table=True):
         await session.exec(  # type: ignore[call-overload]
             delete(Booking).where(Booking.apartment_id == self.id)  # type: ignore[arg-type]
         )
+
+
+class ApartmentOccupancy(SQLModel, table=True):
+    # per apartment and year one bit per day, see src.data.bitmap
+    __tablename__ = "apartment_occupancy"
+
+    apartment_id: str = Field(foreign_key="apartment.id", primary_key=True)
+    year: int = Field(primary_key=True)
+    checkins: bytes
+    checkouts: bytes
+    cleanings: bytes
+    nights: bytes
+    blocked: bytes
+    updated_at: datetime = timezoned()
+
+    @staticmethod
+    async def stays(
+        session: AsyncSession, condition: ColumnElement[bool]
+    ) -> defaultdict[str, list[bitmap.Stay]]:
+        result = await session.exec(
+            select(
+                Booking.apartment_id,
+                Booking.start_date,
+                Booking.end_date,
+                Booking.cleaning_date,
+            ).where(condition)
+        )
+        stays: defaultdict[str, list[bitmap.Stay]] = defaultdict(list)
+        for row in result.all():
+            stays[row.apartment_id].append(row)
+        return stays
+
+    @classmethod
+    async def rebuild(cls, session: AsyncSession, apartment_ids: Iterable[str]) -> None:
+        ids = sorted(set(apartment_ids))
+        stays = await cls.stays(
+            session,
+            Booking.apartment_id.in_(ids),  # type: ignore[union-attr]
+        )
+        await session.exec(  # type: ignore[call-overload]
+            delete(cls).where(cls.apartment_id.in_(ids))  # type: ignore[attr-defined]
+        )
+        now = datetime.now(UTC)
+        for id in ids:
+            for year, bitmaps in bitmap.build(stays[id]).items():
+                session.add(
+                    cls(
+                        apartment_id=id,
+                        year=year,
+                        updated_at=now,
+                        **{name: bytes(bits) for name, bits in bitmaps.items()},
+                    )
+                )
+
+    @classmethod
+    async def update(cls, session: AsyncSession, dirty: DirtyIntervals) -> None:
+        # re-derives only the dirty days, from the bookings overlapping them
+        if not dirty:
+            return
+        stays = await cls.stays(
+            session,
+            or_(
+                *(
+                    and_(
+                        Booking.apartment_id == id,
+                        Booking.start_date <= end,  # type: ignore[arg-type]
+                        Booking.cleaning_date >= start,  # type: ignore[operator]
+                    )
+                    for id, start, end in dirty
+                )
+            ),
+        )
+        result = await session.exec(
+            select(cls).where(
+                or_(
+                    *(
+                        and_(
+                            cls.apartment_id == id,
+                            cls.year.between(start.year, end.year),  # type: ignore[attr-defined]
+                        )
+                        for id, start, end in dirty
+                    )
+                )
+            )
+        )
+        rows = {(row.apartment_id, row.year): row for row in result.all()}
+        now = datetime.now(UTC)
+        for id, start, end in dirty:
+            fresh = bitmap.build(stays[id])
+            for year, first, stop in bitmap.year_spans(start, end + bitmap.ONE_DAY):
+                row = rows.get((id, year))
+                if row is None and year not in fresh:
+                    continue
+                blank = bytes(bitmap.empty(year))
+                source = fresh.get(year) or {name: blank for name in bitmap.FIELDS}
+                if row is None:
+                    row = cls(
+                        apartment_id=id,
+                        year=year,
+                        updated_at=now,
+                        **{name: blank for name in bitmap.FIELDS},
+                    )
+                for name in bitmap.FIELDS:
+                    bits = bytearray(getattr(row, name))
+                    bitmap.copy_range(bits, source[name], first, stop)
+                    setattr(row, name, bytes(bits))
+                row.updated_at = now
+                session.add(row)
+
+    @classmethod
+    async def list_available(
+        cls, session: AsyncSession, user_id: str, check_in: date, check_out: date
+    ) -> list[tuple[str, int]]:
+        # Apartment.list_available reading a few bytes per apartment
+        # instead of its bookings, apartments without bitmaps are free
+        spans = {
+            year: (first, stop)
+            for year, first, stop in bitmap.year_spans(check_in, check_out)
+        }
+        result = await session.exec(
+            select(Apartment.id, Apartment.number, cls.year, cls.blocked)
+            .outerjoin(
+                cls,
+                and_(
+                    cls.apartment_id == Apartment.id,
+                    cls.year.in_(spans),  # type: ignore[attr-defined]
+                ),
+            )
+            .where(Apartment.user_id == user_id)
+            .order_by(Apartment.number, Apartment.id)  # type: ignore[arg-type]
+        )
+        available = []
+        for (id, number), rows in groupby(result.all(), lambda row: row[:2]):
+            if not any(
+                blocked is not None and bitmap.any_in_range(blocked, *spans[year])
+                for _, _, year, blocked in rows
+            ):
+                available.append((cast(str, id), number))
+        return available
+
+    @classmethod
+    async def status_masks(
+        cls,
+        session: AsyncSession,
+        apartment_ids: list[str],
+        from_date: date,
+        to_date: date,
+    ) -> list[tuple[str, date, int]]:
+        # the same rows as Apartment.status_masks, vacant days left out
+        result = await session.exec(
+            select(
+                cls.apartment_id,
+                cls.year,
+                *(getattr(cls, name) for name in bitmap.FIELDS),
+            )
+            .where(cls.apartment_id.in_(apartment_ids))  # type: ignore[attr-defined]
+            .where(cls.year.between(from_date.year, to_date.year))  # type: ignore[attr-defined]
+        )
+        masks = []
+        for row in result.all():
+            bitmaps = row._mapping
+            for year, first, stop in bitmap.year_spans(
+                max(from_date, date(row.year, 1, 1)),
+                min(to_date + bitmap.ONE_DAY, date(row.year + 1, 1, 1)),
+            ):
+                start = date(year, 1, 1)
+                for index in range(first, stop):
+                    mask = bitmap.day_mask(bitmaps, index)
+                    if mask:
+                        masks.append(
+                            (row.apartment_id, start + bitmap.ONE_DAY * index, mask)
+                        )
+        return masks
+
+
+class MonthlyStats:
+    # backed by the apartment_monthly_stats materialized view, see migrations
+
+    @staticmethod
+    async def refresh(session: AsyncSession) -> None:
+        await session.exec(
+            text("REFRESH MATERIALIZED VIEW CONCURRENTLY apartment_monthly_stats")
+        )
+
+    @staticmethod
+    async def list(
+        session: AsyncSession, user_id: str, from_month: date, to_month: date
+    ) -> list[ApartmentMonth]:
+        result = await session.exec(
+            text(
+                "SELECT apartment.number, stats.month, stats.nights_booked, "
+                "stats.turnovers, stats.cleaning_days, stats.occupancy_rate "
+                "FROM apartment_monthly_stats AS stats "
+                "JOIN apartment ON apartment.id = stats.apartment_id "
+                "WHERE apartment.user_id = :user_id "
+                "AND stats.month BETWEEN :from_month AND :to_month "
+                "ORDER BY apartment.number, stats.month"
+            ).bindparams(
+                user_id=user_id,
+                from_month=from_month.replace(day=1),
+                to_month=to_month.replace(day=1),
+            )
+        )
+        return [ApartmentMonth.model_construct(**row) for row in result.mappings()]
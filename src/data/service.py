@@ -1,66 +1,287 @@
-from datetime import date, datetime
+import asyncio
+from datetime import date, datetime, timedelta
 from itertools import chain
-from typing import Generator, cast
+from typing import Awaitable, Callable, Generator, cast
 
-from dateutil.rrule import DAILY, rrule
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.data.entity import Apartment, Booking
-from src.data.value import ApartmentList, ApartmentValue
+from src.data import span
+from src.data.entity import Apartment, ApartmentOccupancy, Booking
+from src.data.value import (
+    STATUS_BITS,
+    ApartmentList,
+    ApartmentStatus,
+    ApartmentValue,
+    WorkItem,
+    WorkList,
+    mask_statuses,
+)
+
+WORK_STATUSES = frozenset(
+    (ApartmentStatus.CHECKIN, ApartmentStatus.CHECKOUT, ApartmentStatus.CLEANING)
+)
+
+# every mask decoded once, the lists are shared between days and never mutated
+DECODED_MASKS = [mask_statuses(mask) for mask in range(1 << len(STATUS_BITS))]
+
+StatusMasks = Callable[
+    [AsyncSession, list[str], date, date], Awaitable[list[tuple[str, date, int]]]
+]
 
 
 def make_schedule(
     apartments: list[Apartment],
     from_date: date | None = None,
     to_date: date | None = None,
+    max_days: int | None = None,
 ) -> tuple[ApartmentList, date | None, date | None]:
     if not apartments:
-        return ApartmentList(apartments=[]), None, None
-    start_date = _determine_minimal_date(_get_bookings_generator(apartments), from_date)
-    end_date = _determine_maximal_date(_get_bookings_generator(apartments), to_date)
+        return ApartmentList.model_construct(apartments=[]), None, None
+    start_date, end_date = _window(apartments, from_date, to_date, max_days)
 
+    days = _days(start_date, end_date)
     full_schedule: list[ApartmentValue] = []
     for apartment in apartments:
-        apartment_schedule = {
-            dt.date(): apartment.status(dt.date())
-            for dt in rrule(DAILY, dtstart=start_date, until=end_date)
-        }
+        apartment_schedule = dict(zip(days, _statuses(apartment, start_date, end_date)))
 
+        # values are built from trusted data, skip re-validating every day
         full_schedule.append(
-            ApartmentValue(number=apartment.number, schedule=apartment_schedule)
+            ApartmentValue.model_construct(
+                number=apartment.number, schedule=apartment_schedule
+            )
+        )
+    return ApartmentList.model_construct(apartments=full_schedule), start_date, end_date
+
+
+def schedule_size(
+    apartments: list[Apartment],
+    from_date: date | None = None,
+    to_date: date | None = None,
+    max_days: int | None = None,
+) -> int:
+    # apartment days make_schedule computes for the same arguments
+    if not apartments:
+        return 0
+    start_date, end_date = _window(apartments, from_date, to_date, max_days)
+    return len(apartments) * max(0, (end_date - start_date).days + 1)
+
+
+async def make_schedule_parallel(
+    apartments: list[Apartment],
+    run: Callable[..., Awaitable[list[bytes]]],
+    from_date: date | None = None,
+    to_date: date | None = None,
+    max_days: int | None = None,
+    chunk_size: int = 250,
+) -> tuple[ApartmentList, date | None, date | None]:
+    # same result as make_schedule, the statuses of each chunk of apartments
+    # computed by run (e.g. in a process pool) from packed booking ordinals
+    if not apartments:
+        return ApartmentList.model_construct(apartments=[]), None, None
+    start_date, end_date = _window(apartments, from_date, to_date, max_days)
+    first, last = start_date.toordinal(), end_date.toordinal()
+    chunks = await asyncio.gather(
+        *(
+            run(
+                span.packed_masks,
+                span.pack(
+                    apartment.bookings
+                    for apartment in apartments[index : index + chunk_size]
+                ),
+                first,
+                last,
+            )
+            for index in range(0, len(apartments), chunk_size)
+        )
+    )
+
+    days = _days(start_date, end_date)
+    full_schedule = [
+        ApartmentValue.model_construct(
+            number=apartment.number,
+            schedule=dict(zip(days, map(DECODED_MASKS.__getitem__, masks))),
+        )
+        for apartment, masks in zip(apartments, chain.from_iterable(chunks))
+    ]
+    return ApartmentList.model_construct(apartments=full_schedule), start_date, end_date
+
+
+async def make_schedule_sql(
+    session: AsyncSession,
+    user_id: str,
+    from_date: date | None = None,
+    to_date: date | None = None,
+    max_days: int | None = None,
+    limit: int | None = None,
+    after: tuple[int, str] | None = None,
+) -> tuple[ApartmentList, date | None, date | None, list[tuple[str, int]]]:
+    # same result as make_schedule over Apartment.list, with the per-day
+    # statuses computed by Postgres instead of loading every booking
+    return await _make_schedule_from_masks(
+        Apartment.status_masks,
+        session,
+        user_id,
+        from_date,
+        to_date,
+        max_days,
+        limit,
+        after,
+    )
+
+
+async def make_schedule_bitmaps(
+    session: AsyncSession,
+    user_id: str,
+    from_date: date | None = None,
+    to_date: date | None = None,
+    max_days: int | None = None,
+    limit: int | None = None,
+    after: tuple[int, str] | None = None,
+) -> tuple[ApartmentList, date | None, date | None, list[tuple[str, int]]]:
+    # same as make_schedule_sql, decoding the persisted occupancy bitmaps
+    return await _make_schedule_from_masks(
+        ApartmentOccupancy.status_masks,
+        session,
+        user_id,
+        from_date,
+        to_date,
+        max_days,
+        limit,
+        after,
+    )
+
+
+async def _make_schedule_from_masks(
+    status_masks: StatusMasks,
+    session: AsyncSession,
+    user_id: str,
+    from_date: date | None,
+    to_date: date | None,
+    max_days: int | None,
+    limit: int | None,
+    after: tuple[int, str] | None,
+) -> tuple[ApartmentList, date | None, date | None, list[tuple[str, int]]]:
+    apartments = await Apartment.list_numbers(session, user_id, limit, after)
+    if not apartments:
+        return ApartmentList.model_construct(apartments=[]), None, None, apartments
+    ids = [id for id, _ in apartments]
+    first = last = None
+    if from_date is None or to_date is None:
+        first, last = await Apartment.booking_bounds(session, ids)
+    from_date, to_date = resolve_window(from_date, to_date, first, last, max_days)
+
+    days = _days(from_date, to_date)
+    masks: dict[str, dict[date, int]] = {id: {} for id in ids}
+    for id, day, mask in await status_masks(session, ids, from_date, to_date):
+        masks[id][day] = mask
+    vacant = STATUS_BITS[ApartmentStatus.VACANT]
+    full_schedule = [
+        ApartmentValue.model_construct(
+            number=number,
+            schedule={day: mask_statuses(masks[id].get(day, vacant)) for day in days},
         )
-    return ApartmentList(apartments=full_schedule), start_date, end_date
-
-
-def _determine_minimal_date(
-    bookings: Generator[Booking, None, None], from_date: date | None
-) -> date:
-    if from_date:
-        return from_date
-    try:
-        return min(booking.start_date for booking in bookings)
-    except ValueError:
-        return datetime.now().date()
-
-
-def _determine_maximal_date(
-    bookings: Generator[Booking, None, None], to_date: date | None
-) -> date:
-    if to_date:
-        return to_date
-    try:
-        return max(
-            (
-                booking.cleaning_deadline
-                or (
-                    booking.end_date
-                    if booking.end_date == booking.cleaning_date
-                    else cast(date, booking.cleaning_date)
+        for id, number in apartments
+    ]
+    return (
+        ApartmentList.model_construct(apartments=full_schedule),
+        from_date,
+        to_date,
+        apartments,
+    )
+
+
+def make_worklist(
+    apartments: list[Apartment], from_date: date, to_date: date
+) -> WorkList:
+    schedules = [_statuses(apartment, from_date, to_date) for apartment in apartments]
+    items: list[WorkItem] = []
+    for offset, day in enumerate(_days(from_date, to_date)):
+        for apartment, schedule in zip(apartments, schedules):
+            statuses = [
+                status for status in schedule[offset] if status in WORK_STATUSES
+            ]
+            if statuses:
+                items.append(
+                    WorkItem.model_construct(
+                        number=apartment.number, date=day, statuses=statuses
+                    )
                 )
+    return WorkList.model_construct(start_date=from_date, end_date=to_date, items=items)
+
+
+def resolve_window(
+    from_date: date | None,
+    to_date: date | None,
+    first: date | None,
+    last: date | None,
+    max_days: int | None = None,
+) -> tuple[date, date]:
+    # explicit dates win, an open end falls back to the last booking day and
+    # an open start to the first one, or to max_days before an explicit end,
+    # so a listing without dates shows its latest bookings rather than its oldest
+    today = datetime.now().date()
+    span = timedelta(days=max_days - 1) if max_days is not None else None
+    if from_date is None:
+        if to_date is not None and span is not None:
+            from_date = to_date - span
+        else:
+            to_date = to_date or last or today
+            from_date = min(first or to_date, to_date)
+            if span is not None:
+                from_date = max(from_date, to_date - span)
+    elif to_date is None:
+        to_date = max(last or from_date, from_date)
+    if span is not None:
+        to_date = min(cast(date, to_date), from_date + span)
+    return from_date, cast(date, to_date)
+
+
+def _window(
+    apartments: list[Apartment],
+    from_date: date | None,
+    to_date: date | None,
+    max_days: int | None,
+) -> tuple[date, date]:
+    first = last = None
+    if from_date is None or to_date is None:
+        first, last = _booking_bounds(apartments)
+    return resolve_window(from_date, to_date, first, last, max_days)
+
+
+def _days(start_date: date, end_date: date) -> list[date]:
+    return [
+        date.fromordinal(day)
+        for day in range(start_date.toordinal(), end_date.toordinal() + 1)
+    ]
+
+
+def _statuses(
+    apartment: Apartment, start_date: date, end_date: date
+) -> list[list[ApartmentStatus]]:
+    # Apartment.status for every day, swept in one pass when the bookings
+    # come ordered by start date as Apartment.list and list_active load them
+    return span.statuses(
+        span.Span.many(apartment.bookings),
+        start_date.toordinal(),
+        end_date.toordinal(),
+    )
+
+
+def _booking_bounds(apartments: list[Apartment]) -> tuple[date | None, date | None]:
+    bookings = list(_get_bookings_generator(apartments))
+    if not bookings:
+        return None, None
+    return min(booking.start_date for booking in bookings), max(
+        (
+            booking.cleaning_deadline
+            or (
+                booking.end_date
+                if booking.end_date == booking.cleaning_date
+                else cast(date, booking.cleaning_date)
             )
-            for booking in bookings
         )
-    except ValueError:
-        return datetime.now().date()
+        for booking in bookings
+    )
 
 
 def _get_bookings_generator(
@@ -0,0 +1,151 @@
+from array import array
+from datetime import date
+from typing import Iterable, Protocol, Self, Sequence
+
+from src.data.value import ApartmentStatus, status_mask
+
+# bookings as integer day ordinals (date.toordinal), so the per-day loops
+# compare ints instead of building and comparing date objects
+
+NO_DEADLINE = date(3000, 1, 1).toordinal()
+
+
+class Stay(Protocol):
+    start_date: date
+    end_date: date
+    cleaning_date: date | None
+    cleaning_deadline: date | None
+
+
+class Span:
+    __slots__ = ("start", "end", "cleaning", "deadline")
+
+    def __init__(self, start: int, end: int, cleaning: int, deadline: int) -> None:
+        self.start = start
+        self.end = end
+        self.cleaning = cleaning
+        self.deadline = deadline
+
+    @classmethod
+    def of(cls, stay: Stay) -> Self:
+        end = stay.end_date.toordinal()
+        return cls(
+            stay.start_date.toordinal(),
+            end,
+            stay.cleaning_date.toordinal() if stay.cleaning_date else end,
+            stay.cleaning_deadline.toordinal()
+            if stay.cleaning_deadline
+            else NO_DEADLINE,
+        )
+
+    @classmethod
+    def many(cls, stays: Iterable[Stay]) -> list[Self]:
+        return [cls.of(stay) for stay in stays]
+
+
+def covering(spans: Sequence[Span], day: int) -> list[Span]:
+    # the first run of spans covering the day, like dropwhile and takewhile
+    found: list[Span] = []
+    for span in spans:
+        if span.start <= day <= span.cleaning:
+            found.append(span)
+        elif found:
+            break
+    return found
+
+
+def status(spans: Sequence[Span], day: int) -> list[ApartmentStatus]:
+    return statuses_of(covering(spans, day), day)
+
+
+def sweep(spans: Sequence[Span], first: int, last: int) -> list[list[ApartmentStatus]]:
+    # status() for every day from first to last, spans sorted by start:
+    # spans cleaned before the current day never cover a later one, and
+    # no span starting after it can cover it
+    result = []
+    low = 0
+    count = len(spans)
+    for day in range(first, last + 1):
+        while low < count and spans[low].cleaning < day:
+            low += 1
+        found: list[Span] = []
+        for index in range(low, count):
+            span = spans[index]
+            if span.start > day:
+                break
+            if day <= span.cleaning:
+                found.append(span)
+            elif found:
+                break
+        result.append(statuses_of(found, day))
+    return result
+
+
+def statuses(
+    spans: Sequence[Span], first: int, last: int
+) -> list[list[ApartmentStatus]]:
+    if is_sorted(spans):
+        return sweep(spans, first, last)
+    return [status(spans, day) for day in range(first, last + 1)]
+
+
+def is_sorted(spans: Sequence[Span]) -> bool:
+    return all(a.start <= b.start for a, b in zip(spans, spans[1:]))
+
+
+def statuses_of(found: list[Span], day: int) -> list[ApartmentStatus]:
+    # a maximum of two bookings can overlap and
+    # if they do it means a checkin, a checkout and a cleaning
+    # is must happen that day
+    if not found:
+        return [ApartmentStatus.VACANT]
+    first = found[0]
+    if len(found) == 2:
+        if first.end == first.cleaning:
+            return [
+                ApartmentStatus.CHECKOUT,
+                ApartmentStatus.CLEANING,
+                ApartmentStatus.CHECKIN,
+            ]
+        return [ApartmentStatus.CLEANING, ApartmentStatus.CHECKIN]
+    if first.end == day and first.cleaning == day:
+        return [ApartmentStatus.CHECKOUT, ApartmentStatus.CLEANING]
+    if first.start == day:
+        return [ApartmentStatus.CHECKIN]
+    if first.end == day:
+        return [ApartmentStatus.CHECKOUT]
+    if first.cleaning == day:
+        return [ApartmentStatus.CLEANING]
+    if first.start < day < first.end:
+        return [ApartmentStatus.OCCUPIED]
+    return [ApartmentStatus.VACANT]
+
+
+Packed = tuple[array, array, array, array]
+
+
+def pack(stays: Iterable[Iterable[Stay]]) -> Packed:
+    # one int array per field plus where each apartment's bookings begin,
+    # cheap to pickle across processes
+    starts, ends, cleanings = array("l"), array("l"), array("l")
+    offsets = array("l", [0])
+    for apartment in stays:
+        for record in Span.many(apartment):
+            starts.append(record.start)
+            ends.append(record.end)
+            cleanings.append(record.cleaning)
+        offsets.append(len(starts))
+    return starts, ends, cleanings, offsets
+
+
+def packed_masks(packed: Packed, first: int, last: int) -> list[bytes]:
+    # per apartment one STATUS_BITS mask byte per day from first to last
+    starts, ends, cleanings, offsets = packed
+    masks = []
+    for low, high in zip(offsets, offsets[1:]):
+        spans = [
+            Span(starts[index], ends[index], cleanings[index], NO_DEADLINE)
+            for index in range(low, high)
+        ]
+        masks.append(bytes(status_mask(day) for day in statuses(spans, first, last)))
+    return masks
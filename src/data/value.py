@@ -1,6 +1,7 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from datetime import date
 from enum import auto
-from typing import Self
+from typing import Iterator, Self
 
 from pydantic import BaseModel, ConfigDict, model_validator
 from strenum import StrEnum
@@ -36,6 +37,34 @@ class ApartmentStatus(StrEnum):
     VACANT = auto()
 
 
+STATUS_BITS = {
+    ApartmentStatus.CHECKIN: 1,
+    ApartmentStatus.CHECKOUT: 2,
+    ApartmentStatus.CLEANING: 4,
+    ApartmentStatus.OCCUPIED: 8,
+    ApartmentStatus.VACANT: 16,
+}
+# the order Apartment.status lists statuses in, e.g. checkout, cleaning, checkin
+MASK_ORDER = (
+    ApartmentStatus.CHECKOUT,
+    ApartmentStatus.CLEANING,
+    ApartmentStatus.CHECKIN,
+    ApartmentStatus.OCCUPIED,
+    ApartmentStatus.VACANT,
+)
+
+
+def status_mask(statuses: list[ApartmentStatus]) -> int:
+    mask = 0
+    for status in statuses:
+        mask |= STATUS_BITS[status]
+    return mask
+
+
+def mask_statuses(mask: int) -> list[ApartmentStatus]:
+    return [status for status in MASK_ORDER if mask & STATUS_BITS[status]]
+
+
 class ApartmentValue(BaseModel):
     number: int
     schedule: dict[date, list[ApartmentStatus]]
@@ -43,3 +72,69 @@ class ApartmentValue(BaseModel):
 
 class ApartmentList(BaseModel):
     apartments: list[ApartmentValue]
+
+
+class WorkItem(BaseModel):
+    number: int
+    date: date
+    statuses: list[ApartmentStatus]
+
+
+class WorkList(BaseModel):
+    start_date: date
+    end_date: date
+    items: list[WorkItem]
+
+
+class Availability(BaseModel):
+    check_in: date
+    check_out: date
+    apartments: list[int]
+
+
+class ApartmentMonth(BaseModel):
+    number: int
+    month: date
+    nights_booked: int
+    turnovers: int
+    cleaning_days: int
+    occupancy_rate: float
+
+
+class MonthlyReport(BaseModel):
+    from_month: date
+    to_month: date
+    months: list[ApartmentMonth]
+
+
+class ApartmentCursor(BaseValue):
+    number: int
+    id: str
+
+    def encode(self) -> str:
+        return urlsafe_b64encode(self.model_dump_json().encode()).decode()
+
+    @classmethod
+    def decode(cls, cursor: str) -> Self:
+        return cls.model_validate_json(urlsafe_b64decode(cursor.encode()))
+
+
+class DirtyIntervals:
+    # per apartment the first and last day whose statuses an import changed
+
+    def __init__(self) -> None:
+        self.intervals: dict[str, tuple[date, date]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.intervals)
+
+    def __iter__(self) -> Iterator[tuple[str, date, date]]:
+        for apartment_id, (start, end) in self.intervals.items():
+            yield apartment_id, start, end
+
+    def add(self, apartment_id: str, start: date, end: date) -> None:
+        start, end = min(start, end), max(start, end)
+        if apartment_id in self.intervals:
+            first, last = self.intervals[apartment_id]
+            start, end = min(start, first), max(end, last)
+        self.intervals[apartment_id] = (start, end)
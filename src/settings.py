@@ -1,4 +1,6 @@
-from pydantic import Field
+from typing import Literal, Self
+
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -17,6 +19,52 @@ class Settings(BaseSettings):
     token_secret: str
     token_expiration: int
     algorithm: str = "HS256"
+    auth_cache_size: int = 1024
+    auth_cache_ttl: int = 60
+    hashing_workers: int = 2
+    hashing_queue_size: int = 32
+
+    calendars_page_size: int = 50
+    calendars_max_page_size: int = 200
+    schedule_max_days: int = 366
+    schedule_engine: Literal["python", "sql", "bitmap"] = "python"
+    schedule_workers: int = 0
+    schedule_queue_size: int = 16
+    # the process pool takes a schedule of at least this many apartment days,
+    # e.g. a full calendars page of 200 apartments over half a year or more,
+    # split into chunks of schedule_chunk_size apartments, so keep the chunks
+    # well below calendars_max_page_size for a page to use several workers
+    schedule_parallel_threshold: int = 36500
+    schedule_chunk_size: int = 50
+    dashboard_window_days: int = 30
+    work_max_days: int = 14
+    occupancy_bitmaps: bool = False
+
+    import_workers: int = 4
+    import_queue_size: int = 64
+    job_retention: int = 1024
+    stats_refresh_delay: float = 30.0
+
+    compression_minimum_size: int = 1024
+    compression_cache_size: int = 256
+    # bodies above this are compressed in a worker thread, off the event loop
+    compression_thread_size: int = 64 * 1024
+    export_cache_size: int = 512
+    export_batch_size: int = 1000
+
+    slow_query_threshold_ms: int = 200
+
+    profile_token: str | None = None
+    profile_sample_rate: float = 0.0
+    profile_interval_ms: float = 1.0
+    profile_dir: str = "profiles"
+
+    @model_validator(mode="after")
+    def bitmaps_maintained(self) -> Self:
+        # imports only keep the bitmaps current while occupancy_bitmaps is set
+        if self.schedule_engine == "bitmap" and not self.occupancy_bitmaps:
+            raise ValueError("schedule_engine bitmap requires occupancy_bitmaps")
+        return self
 
     @property
     def db_dsn(self) -> str:
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import sys
+from dataclasses import dataclass
+from datetime import UTC, date, datetime, timedelta
+from itertools import islice
+from pathlib import Path
+from random import Random
+from typing import Iterable, Iterator
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from src.data.entity import Apartment, Booking, User
+from src.settings import settings
+from src.web.auth import LoginManager
+
+
+@dataclass(slots=True)
+class Stay:
+    start_date: date
+    end_date: date
+    cleaning_date: date
+    cleaning_deadline: date | None
+
+
+def generate_stays(
+    rng: Random, count: int, horizon_days: int, start: date
+) -> list[Stay]:
+    slot = max(2, horizon_days // max(count, 1))
+    ranges: list[tuple[date, date]] = []
+    cursor = start
+    for i in range(count):
+        slot_end = start + timedelta(days=(i + 1) * slot)
+        begin = cursor
+        if rng.random() > 0.4:  # otherwise a back-to-back turnover
+            begin += timedelta(
+                days=rng.randint(0, max(0, (slot_end - cursor).days - 2))
+            )
+        end = begin + timedelta(days=rng.randint(1, max(1, (slot_end - begin).days)))
+        ranges.append((begin, end))
+        cursor = end
+
+    stays = []
+    for (begin, end), following in zip(ranges, [*ranges[1:], None]):
+        deadline = following[0] if following else None
+        cleaning = end
+        if deadline and deadline > end:
+            cleaning = end + timedelta(days=rng.randint(0, (deadline - end).days))
+        stays.append(Stay(begin, end, cleaning, deadline))
+    return stays
+
+
+def random_id(rng: Random) -> str:
+    return f"{rng.getrandbits(128):032x}"
+
+
+def format_ics(apartment_no: int, stays: Iterable[Stay], rng: Random) -> str:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:-//intis//synthetic apartment {apartment_no}//EN",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+    ]
+    for stay in stays:
+        lines += [
+            "BEGIN:VEVENT",
+            f"DTSTART;VALUE=DATE:{stay.start_date:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{stay.end_date:%Y%m%d}",
+            f"UID:{random_id(rng)}",
+            f"SUMMARY:Guest {rng.randint(1, 10_000)}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def batched(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@dataclass
+class Portfolio:
+    users: int
+    apartments: int
+    bookings: int
+    horizon: int
+    start: date
+    seed: int
+
+    def owners(self) -> Iterator[tuple[int, int]]:
+        # (user number, apartment number) pairs, apartments spread evenly over users
+        for index in range(self.apartments):
+            yield index % self.users + 1, index // self.users + 1
+
+    def user_id(self, user_no: int) -> str:
+        return f"synthetic-{self.seed}-{user_no}"
+
+
+def write_ics(portfolio: Portfolio, output: Path) -> int:
+    rng = Random(portfolio.seed)
+    written = 0
+    for user_no, apartment_no in portfolio.owners():
+        directory = output / f"user{user_no}" if portfolio.users > 1 else output
+        directory.mkdir(parents=True, exist_ok=True)
+        stays = generate_stays(
+            rng, portfolio.bookings, portfolio.horizon, portfolio.start
+        )
+        (directory / f"apartment_{apartment_no}.ics").write_text(
+            format_ics(apartment_no, stays, rng)
+        )
+        written += 1
+    return written
+
+
+def booking_rows(portfolio: Portfolio, rng: Random) -> Iterator[dict]:
+    now = datetime.now(UTC)
+    for user_no, apartment_no in portfolio.owners():
+        apartment_id = Apartment.make_id(portfolio.user_id(user_no), apartment_no)
+        for stay in generate_stays(
+            rng, portfolio.bookings, portfolio.horizon, portfolio.start
+        ):
+            yield {
+                "id": random_id(rng),
+                "start_date": stay.start_date,
+                "end_date": stay.end_date,
+                "cleaning_deadline": stay.cleaning_deadline,
+                "cleaning_date": stay.cleaning_date,
+                "guest_name": None,
+                "created_at": now,
+                "updated_at": now,
+                "apartment_id": apartment_id,
+            }
+
+
+async def insert_rows(
+    connection: AsyncConnection, table, rows: Iterable[dict], batch_size: int
+) -> int:
+    inserted = 0
+    for batch in batched(rows, batch_size):
+        await connection.execute(insert(table), batch)
+        inserted += len(batch)
+    return inserted
+
+
+async def load_database(
+    portfolio: Portfolio, dsn: str, password_hash: str, batch_size: int
+) -> dict[str, int]:
+    rng = Random(portfolio.seed)
+    now = datetime.now(UTC)
+    users = (
+        {
+            "id": portfolio.user_id(user_no),
+            "username": f"synthetic{portfolio.seed}_{user_no}",
+            "password": password_hash,
+            "created_at": now,
+        }
+        for user_no in range(1, portfolio.users + 1)
+    )
+    apartments = (
+        {
+            "id": Apartment.make_id(portfolio.user_id(user_no), apartment_no),
+            "number": apartment_no,
+            "created_at": now,
+            "updated_at": now,
+            "user_id": portfolio.user_id(user_no),
+        }
+        for user_no, apartment_no in portfolio.owners()
+    )
+    engine = create_async_engine(dsn)
+    try:
+        async with engine.begin() as connection:
+            return {
+                "users": await insert_rows(
+                    connection, User.__table__, users, batch_size
+                ),
+                "apartments": await insert_rows(
+                    connection, Apartment.__table__, apartments, batch_size
+                ),
+                "bookings": await insert_rows(
+                    connection,
+                    Booking.__table__,
+                    booking_rows(portfolio, rng),
+                    batch_size,
+                ),
+            }
+    finally:
+        await engine.dispose()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.tools.generate",
+        description=(
+            "Generate a synthetic portfolio of non-overlapping bookings with "
+            "turnovers, gaps and cleaning deadlines."
+        ),
+    )
+    parser.add_argument("target", choices=["db", "ics"])
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--apartments", type=int, default=100)
+    parser.add_argument("--bookings", type=int, default=50, help="per apartment")
+    parser.add_argument("--horizon", type=int, default=730, help="days")
+    parser.add_argument("--start", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=Path("synthetic"))
+    parser.add_argument("--password", default="synthetic")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    portfolio = Portfolio(
+        users=args.users,
+        apartments=args.apartments,
+        bookings=args.bookings,
+        horizon=args.horizon,
+        start=args.start,
+        seed=args.seed,
+    )
+    if args.target == "ics":
+        written = write_ics(portfolio, args.output)
+        sys.stdout.write(f"wrote {written} calendars to {args.output}\n")
+        return
+
+    counts = asyncio.run(
+        load_database(
+            portfolio,
+            settings.db_dsn,
+            LoginManager.hash_password(args.password),
+            args.batch_size,
+        )
+    )
+    sys.stdout.write(
+        ", ".join(f"{count} {name}" for name, count in counts.items()) + " inserted\n"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.data.entity import Apartment, ApartmentOccupancy, User
+from src.settings import settings
+
+
+async def backfill(dsn: str, user_ids: list[str] | None = None) -> dict[str, int]:
+    # one transaction per user under the import lock, so a concurrent
+    # import cannot interleave with reading its bookings
+    engine = create_async_engine(dsn)
+    counts = {"users": 0, "apartments": 0}
+    try:
+        async with AsyncSession(engine) as session:
+            if user_ids is None:
+                user_ids = list(
+                    (await session.exec(select(User.id).order_by(User.id))).all()
+                )
+        for user_id in user_ids:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                await User.lock(session, user_id)
+                apartment_ids = (
+                    await session.exec(
+                        select(Apartment.id).where(Apartment.user_id == user_id)
+                    )
+                ).all()
+                await ApartmentOccupancy.rebuild(
+                    session, (id for id in apartment_ids if id is not None)
+                )
+                await User.set_occupancy_built(session, user_id, True)
+                await session.commit()
+            counts["users"] += 1
+            counts["apartments"] += len(apartment_ids)
+    finally:
+        await engine.dispose()
+    return counts
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.tools.occupancy",
+        description=(
+            "Rebuild the per-day occupancy bitmaps of every apartment, "
+            "run after enabling OCCUPANCY_BITMAPS, bitmaps of a user are "
+            "only read once it has run for them."
+        ),
+    )
+    parser.add_argument("--user", action="append", dest="users", help="user id")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    counts = asyncio.run(backfill(settings.db_dsn, args.users))
+    sys.stdout.write(
+        ", ".join(f"{count} {name}" for name, count in counts.items()) + " rebuilt\n"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,50 @@ from fastapi import APIRouter, FastAPI, HTTPException, Request, status
 from fastapi.responses import JSONResponse
 from starlette.responses import RedirectResponse
 
-from src.web.dependencies import db_manager, http_manager
+from src.settings import settings
+from src.web.cache import LRUCache
+from src.web.dependencies import (
+    db_manager,
+    hashing_executor,
+    http_manager,
+    schedule_executor,
+)
+from src.web.jobs import job_manager, stats_refresher
+from src.web.metrics import instrument_engine
+from src.web.middleware import (
+    CompressionMiddleware,
+    MetricsMiddleware,
+    ProfilerMiddleware,
+    QueryStatsMiddleware,
+)
 from src.web.routes import *
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     yield
+    await job_manager.shutdown()
+    await stats_refresher.shutdown()
     await asyncio.gather(
         db_manager.shutdown(),
         http_manager.shutdown(),
+        hashing_executor.shutdown(),
+        schedule_executor.shutdown(),
     )
 
 
+instrument_engine(db_manager.engine)
+
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    thread_size=settings.compression_thread_size,
+    cache=LRUCache(settings.compression_cache_size),
+)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.exception_handler(HTTPException)
@@ -42,3 +72,4 @@ api_router.include_router(login_router)
 
 app.include_router(ui_router)
 app.include_router(api_router)
+app.include_router(metrics_router)
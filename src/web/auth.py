@@ -4,12 +4,13 @@ import jwt
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, OAuth2PasswordBearer
 from passlib.context import CryptContext
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.data.entity import User
 from src.settings import settings
-from src.web.dependencies import db_manager
+from src.web.cache import LRUCache
+from src.web.dependencies import db_manager, hashing_executor
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -20,9 +21,25 @@ class Token(BaseModel):
     username: str
 
 
+class CurrentUser(BaseModel):
+    # what routes need of the authenticated user, safe to keep across
+    # requests unlike a User bound to the session that loaded it
+    model_config = ConfigDict(frozen=True)
+
+    id: str
+    username: str
+
+
 class LoginManager:
     SCHEME: ClassVar = HTTPBearer()
 
+    def __init__(self):
+        # keyed by token subject, nothing updates or deletes users yet so
+        # auth_cache_ttl bounds how long a change goes unnoticed
+        self.users: LRUCache[str, CurrentUser] = LRUCache(
+            settings.auth_cache_size, ttl=settings.auth_cache_ttl
+        )
+
     @staticmethod
     def decode_token(encoded: str) -> Token:
         token_decoded = jwt.decode(
@@ -45,10 +62,16 @@ class LoginManager:
     ) -> User | None:
         user = await User.get_by_username(session, username)
         if user:
-            if not self.verify_password(password, user.password):
+            if not await self.check_password(password, user.password):
                 return None
         return user
 
+    async def check_password(self, password: str, hashed: str) -> bool:
+        return await hashing_executor.run(self.verify_password, password, hashed)
+
+    async def make_password_hash(self, password: str) -> str:
+        return await hashing_executor.run(self.hash_password, password)
+
     @staticmethod
     def verify_password(password: str, hashed: str) -> bool:
         return pwd_context.verify(password, hashed)
@@ -61,7 +84,7 @@ class LoginManager:
         self,
         session: Annotated[AsyncSession, Depends(db_manager)],
         token: Annotated[str, Depends(oauth2_scheme)],
-    ) -> User:
+    ) -> CurrentUser:
         exception = {
             "status_code": status.HTTP_401_UNAUTHORIZED,
             "headers": {"WWW-Authenticate": "Bearer"},
@@ -70,16 +93,23 @@ class LoginManager:
             decoded_token = self.decode_token(token)
         except jwt.InvalidTokenError:
             raise HTTPException(detail="Cannot process token", **exception)
-        user = await User.get_by_username(session, decoded_token.username)
-        if not user:
-            raise HTTPException(detail="User does not exist", **exception)
-        return user
+        current = self.users.get(decoded_token.sub)
+        if current is None:
+            user = await User.get_by_id(session, decoded_token.sub)
+            if not user:
+                raise HTTPException(detail="User does not exist", **exception)
+            current = CurrentUser(id=user.id, username=user.username)
+            self.users.set(decoded_token.sub, current)
+        return current
+
+    def forget(self, user_id: str) -> None:
+        self.users.pop(user_id)
 
     async def authenticator(
         self,
         request: Request,
         session: Annotated[AsyncSession, Depends(db_manager)],
-    ):
+    ) -> CurrentUser:
         exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
         token = request.cookies.get("access_token")
         if not token:
@@ -0,0 +1,82 @@
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: K) -> V | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self.ttl is not None and monotonic() - stored_at > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = (monotonic(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def pop(self, key: K) -> V | None:
+        entry = self.entries.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+class SingleFlight(Generic[K, V]):
+    # concurrent callers with the same key share one in-flight call,
+    # nothing is kept once it completes
+    def __init__(self):
+        self.calls: dict[K, asyncio.Task[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self.calls)
+
+    async def do(self, key: K, fn: Callable[[], Awaitable[V]]) -> V:
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+        # a cancelled caller must not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def forget(self, key: K, task: asyncio.Task[V]) -> None:
+        if self.calls.get(key) is task:
+            del self.calls[key]
+
+
+class Versions(Generic[K]):
+    def __init__(self):
+        self.versions: dict[K, int] = {}
+
+    def get(self, key: K) -> int:
+        return self.versions.get(key, 0)
+
+    def bump(self, key: K) -> None:
+        self.versions[key] = self.get(key) + 1
+
+
+# per-user data version, bumped whenever an import commits
+data_versions: Versions[str] = Versions()
+schedule_builds: SingleFlight[Hashable, Any] = SingleFlight()
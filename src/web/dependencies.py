@@ -1,10 +1,19 @@
-from typing import AsyncGenerator
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from multiprocessing import get_context
+from typing import AsyncGenerator, AsyncIterator, Callable, TypeVar
+
+from fastapi import HTTPException, status
 from httpx import AsyncClient, Timeout
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.settings import settings
 
+T = TypeVar("T")
+
 
 class DbManager:
     def __init__(self):
@@ -21,6 +30,13 @@ class DbManager:
             await self.session.close()
             self.session = None
 
+    @asynccontextmanager
+    async def session_scope(self) -> AsyncIterator[AsyncSession]:
+        # for work running outside a request, e.g. background jobs
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            yield session
+            await session.commit()
+
     async def shutdown(self) -> None:
         if self.session:
             await self.session.close_all()
@@ -42,5 +58,49 @@ class HttpManager:
             await self.client.aclose()
 
 
+class ExecutorManager:
+    def __init__(
+        self,
+        max_workers: int,
+        max_queue: int,
+        executor_class: Callable[..., Executor] = ThreadPoolExecutor,
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor_class = executor_class
+        self.executor: Executor | None = None
+        self.pending = 0
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self.pending >= self.max_workers + self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+        if not self.executor:
+            self.executor = self.executor_class(max_workers=self.max_workers)
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, fn, *args
+            )
+        finally:
+            self.pending -= 1
+
+    async def shutdown(self) -> None:
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
 db_manager = DbManager()
 http_manager = HttpManager()
+hashing_executor = ExecutorManager(
+    settings.hashing_workers, settings.hashing_queue_size
+)
+# spawned rather than forked, the event loop and its threads stay behind
+schedule_executor = ExecutorManager(
+    settings.schedule_workers,
+    settings.schedule_queue_size,
+    partial(ProcessPoolExecutor, mp_context=get_context("spawn")),
+)
@@ -0,0 +1,94 @@
+from io import RawIOBase
+from typing import AsyncIterator, Literal
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from src.data.entity import Apartment, Booking
+from src.settings import settings
+from src.web.dependencies import db_manager
+from src.web.parser import CALENDAR_FOOTER, CALENDAR_HEADER, Calendar, ExportRow
+
+ExportFormat = Literal["zip", "ics"]
+
+
+class ChunkWriter(RawIOBase):
+    # an unseekable sink, zipfile then writes sizes after each entry
+    # and the archive can be sent while it is being built
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore[no-untyped-def, override]
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+async def stream_calendar(apartment_id: str) -> AsyncIterator[bytes]:
+    # read in batches on a session of its own, one chunk per batch
+    async with db_manager.session_scope() as session:
+        result = await session.stream(
+            Booking.export_rows(apartment_id).execution_options(
+                yield_per=settings.export_batch_size
+            )
+        )
+        yield CALENDAR_HEADER.encode()
+        async for rows in result.partitions():
+            yield "".join(Calendar.event(apartment_id, row) for row in rows).encode()
+        yield CALENDAR_FOOTER.encode()
+
+
+async def portfolio(
+    user_id: str,
+) -> AsyncIterator[tuple[str, int, list[ExportRow]]]:
+    # the request session is gone once streaming starts, so the rows come
+    # from a session of their own, fetched in batches
+    async with db_manager.session_scope() as session:
+        result = await session.stream(
+            Apartment.export_rows(user_id).execution_options(
+                yield_per=settings.export_batch_size
+            )
+        )
+        current: tuple[str, int] | None = None
+        rows: list[ExportRow] = []
+        async for row in result:
+            apartment = (row.id, row.number)
+            if apartment != current:
+                if current is not None:
+                    yield *current, rows
+                current, rows = apartment, []
+            if row.start_date is not None:
+                rows.append(row)
+        if current is not None:
+            yield *current, rows
+
+
+async def stream_ics(user_id: str) -> AsyncIterator[bytes]:
+    yield CALENDAR_HEADER.encode()
+    async for apartment_id, number, rows in portfolio(user_id):
+        location = f"Apartment {number}"
+        yield "".join(
+            Calendar.event(apartment_id, row, location) for row in rows
+        ).encode()
+    yield CALENDAR_FOOTER.encode()
+
+
+async def stream_zip(user_id: str) -> AsyncIterator[bytes]:
+    writer = ChunkWriter()
+    with ZipFile(writer, "w", ZIP_DEFLATED) as archive:
+        async for apartment_id, number, rows in portfolio(user_id):
+            with archive.open(Calendar.export_filename(number), "w") as entry:
+                for chunk in Calendar.stream(apartment_id, rows):
+                    entry.write(chunk)
+            yield writer.drain()
+    yield writer.drain()
+
+
+def stream_export(user_id: str, format: ExportFormat) -> AsyncIterator[bytes]:
+    return stream_zip(user_id) if format == "zip" else stream_ics(user_id)
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import UTC, datetime
+from enum import auto
+from typing import Any, Awaitable, Callable
+
+from cuid2 import Cuid
+from fastapi import HTTPException, status
+from pydantic import BaseModel, Field
+from strenum import StrEnum
+
+from src.data.entity import MonthlyStats
+from src.settings import settings
+from src.web.cache import LRUCache
+from src.web.dependencies import db_manager
+
+CUID = Cuid(length=32)
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(StrEnum):
+    PENDING = auto()
+    RUNNING = auto()
+    SUCCEEDED = auto()
+    FAILED = auto()
+
+
+class Job(BaseModel):
+    id: str = Field(default_factory=CUID.generate)
+    user_id: str = Field(exclude=True)
+    kind: str
+    status: JobStatus = JobStatus.PENDING
+    stage: str | None = None
+    progress: float = 0.0
+    result: Any = None
+    error: str | None = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    finished_at: datetime | None = None
+
+    def advance(self, stage: str, progress: float) -> None:
+        self.stage = stage
+        self.progress = progress
+
+
+JobFunction = Callable[[Job], Awaitable[Any]]
+
+
+class JobManager:
+    def __init__(self, workers: int, queue_size: int, retention: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.jobs: LRUCache[str, Job] = LRUCache(retention)
+        self.queue: asyncio.Queue[tuple[Job, JobFunction]] | None = None
+        self.tasks: list[asyncio.Task] = []
+        self.done: dict[str, asyncio.Event] = {}
+        # jobs of a user wait in line behind the one queued or running, only
+        # the head of a line is on the shared queue so no worker sits idle
+        # waiting for a user while other users' jobs are ready
+        self.lines: dict[str, deque[tuple[Job, JobFunction]]] = {}
+        self.waiting = 0
+
+    async def submit(self, user_id: str, kind: str, fn: JobFunction) -> Job:
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+            self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        if self.waiting >= self.queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many pending imports, try again later",
+                headers={"Retry-After": "5"},
+            )
+        job = Job(user_id=user_id, kind=kind)
+        if user_id in self.lines:
+            self.lines[user_id].append((job, fn))
+        else:
+            self.lines[user_id] = deque()
+            self.queue.put_nowait((job, fn))
+        self.waiting += 1
+        self.jobs.set(job.id, job)
+        self.done[job.id] = asyncio.Event()
+        return job
+
+    def get(self, job_id: str, user_id: str) -> Job | None:
+        job = self.jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    async def wait(self, job_id: str) -> None:
+        if event := self.done.get(job_id):
+            await event.wait()
+
+    async def work(self) -> None:
+        assert self.queue is not None
+        while True:
+            job, fn = await self.queue.get()
+            self.waiting -= 1
+            try:
+                await self.run(job, fn)
+            finally:
+                self.queue.task_done()
+                self.done.pop(job.id).set()
+                self.next_in_line(job.user_id)
+
+    def next_in_line(self, user_id: str) -> None:
+        assert self.queue is not None
+        line = self.lines[user_id]
+        if line:
+            self.queue.put_nowait(line.popleft())
+        else:
+            del self.lines[user_id]
+
+    async def run(self, job: Job, fn: JobFunction) -> None:
+        try:
+            job.status = JobStatus.RUNNING
+            job.result = await fn(job)
+            job.status = JobStatus.SUCCEEDED
+            job.progress = 1.0
+        except HTTPException as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e.detail)
+        except Exception:
+            logger.exception("Job %s failed", job.id)
+            job.status = JobStatus.FAILED
+            job.error = "Internal error"
+        finally:
+            job.finished_at = datetime.now(UTC)
+
+    async def shutdown(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.queue = None
+        self.lines = {}
+        self.waiting = 0
+
+
+class Debouncer:
+    # coalesces triggers into at most one run of fn per delay,
+    # a trigger arriving while fn runs causes one more run afterwards
+    def __init__(self, delay: float, fn: Callable[[], Awaitable[None]]):
+        self.delay = delay
+        self.fn = fn
+        self.task: asyncio.Task | None = None
+        self.pending = False
+
+    def trigger(self) -> None:
+        self.pending = True
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        while self.pending:
+            await asyncio.sleep(self.delay)
+            self.pending = False
+            try:
+                await self.fn()
+            except Exception:
+                logger.exception("Debounced %s failed", self.fn.__name__)
+
+    async def shutdown(self) -> None:
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+
+async def refresh_monthly_stats() -> None:
+    async with db_manager.session_scope() as session:
+        await MonthlyStats.refresh(session)
+
+
+job_manager = JobManager(
+    settings.import_workers, settings.import_queue_size, settings.job_retention
+)
+stats_refresher = Debouncer(settings.stats_refresh_delay, refresh_monthly_stats)
@@ -0,0 +1,271 @@
+import json
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Lock
+from time import perf_counter
+from typing import Any, AsyncIterator, Callable, Iterator, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.settings import settings
+from src.web.dependencies import db_manager, http_manager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0)
+
+slow_query_logger = logging.getLogger("src.sql.slow")
+query_logger = logging.getLogger("src.sql")
+
+Labels = tuple[tuple[str, str], ...]
+T = TypeVar("T")
+
+
+def format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series: dict[Labels, tuple[list[int], list[float]]] = {}
+        self.lock = Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total = self.series.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    async def time_stream(
+        self, chunks: AsyncIterator[T], **labels: str
+    ) -> AsyncIterator[T]:
+        # time spent producing a streamed body, not waiting for it to be sent
+        elapsed = 0.0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    elapsed += perf_counter() - start
+                yield chunk
+        finally:
+            self.observe(elapsed, **labels)
+
+    def collect(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.lock:
+            series = [
+                (key, list(counts), total[0])
+                for key, (counts, total) in self.series.items()
+            ]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{format_labels(labels, le)} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        function: Callable[[], float] | None = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def collect(self) -> list[str]:
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                value = float("nan")
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {value}",
+        ]
+
+
+M = TypeVar("M", Histogram, Gauge)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Histogram | Gauge] = []
+
+    def register(self, metric: M) -> M:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+def db_pool_checked_out() -> float:
+    return db_manager.engine.pool.checkedout()  # type: ignore[attr-defined]
+
+
+def http_pool_connections() -> float:
+    if not http_manager.client:
+        return 0
+    # httpx does not expose pool usage publicly, read it off the transport
+    return len(http_manager.client._transport._pool.connections)  # type: ignore[attr-defined]
+
+
+registry = Registry()
+request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time spent handling a request, per route.",
+    )
+)
+stage_duration = registry.register(
+    Histogram(
+        "stage_duration_seconds",
+        "Time spent in internal processing stages.",
+    )
+)
+in_flight = registry.register(
+    Gauge("http_requests_in_flight", "Requests currently being handled.")
+)
+registry.register(
+    Gauge(
+        "db_pool_checked_out",
+        "Database connections currently checked out of the pool.",
+        db_pool_checked_out,
+    )
+)
+registry.register(
+    Gauge(
+        "http_client_pool_connections",
+        "Connections held by the outgoing HTTP client pool.",
+        http_pool_connections,
+    )
+)
+query_duration = registry.register(
+    Histogram("db_query_duration_seconds", "Time spent executing SQL statements.")
+)
+queries_per_request = registry.register(
+    Histogram(
+        "db_queries_per_request",
+        "Number of SQL statements executed per request.",
+        buckets=COUNT_BUCKETS,
+    )
+)
+
+
+@dataclass
+class QueryStats:
+    path: str
+    count: int = 0
+    duration: float = 0.0
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+    keep: int = 3
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.slowest.append((duration, statement))
+        self.slowest.sort(key=lambda item: item[0], reverse=True)
+        del self.slowest[self.keep :]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def record_query(statement: str, duration: float) -> None:
+    query_duration.observe(duration)
+    stats = query_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    if duration * 1000 >= settings.slow_query_threshold_ms:
+        slow_query_logger.warning(
+            json.dumps(
+                {
+                    "event": "slow_query",
+                    "duration_ms": round(duration * 1000, 1),
+                    "path": stats.path if stats else None,
+                    "statement": statement,
+                }
+            )
+        )
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        record_query(statement, perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def handle_error(context: Any) -> None:
+        # a failed statement never reaches after_cursor_execute
+        conn = context.connection
+        starts = conn.info.get("query_start") if conn is not None else None
+        if starts and context.statement is not None:
+            record_query(context.statement, perf_counter() - starts.pop())
@@ -0,0 +1,300 @@
+import asyncio
+import gzip
+import hmac
+import random
+import threading
+import zlib
+from time import perf_counter
+from typing import Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.settings import settings
+from src.web.cache import LRUCache
+from src.web.metrics import (
+    QueryStats,
+    in_flight,
+    queries_per_request,
+    query_logger,
+    query_stats,
+    request_duration,
+)
+from src.web.profiling import SamplingProfiler, profile_name, write_profile
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+)
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def streaming_compressor(encoding: str) -> tuple[Callable, Callable]:
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        return (
+            lambda chunk: compressor.process(chunk) + compressor.flush(),
+            compressor.finish,
+        )
+    compressobj = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress_chunk(chunk: bytes) -> bytes:
+        return compressobj.compress(chunk) + compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    return compress_chunk, compressobj.flush
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        cache: LRUCache[tuple[str, str, str], bytes] | None = None,
+        thread_size: int = 64 * 1024,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+        self.thread_size = thread_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("Accept-Encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = CompressionResponder(
+            send, encoding, self.minimum_size, self.cache, scope, self.thread_size
+        )
+        await self.app(scope, receive, responder)
+
+
+class CompressionResponder:
+    def __init__(
+        self,
+        send: Send,
+        encoding: str,
+        minimum_size: int,
+        cache: LRUCache[tuple[str, str, str], bytes] | None,
+        scope: Scope,
+        thread_size: int = 64 * 1024,
+    ):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.cache = cache
+        self.thread_size = thread_size
+        self.resource = scope["path"] + "?" + scope.get("query_string", b"").decode()
+        self.start_message: Message | None = None
+        self.passthrough = False
+        self.compress_chunk: Callable | None = None
+        self.finish: Callable | None = None
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers or not headers.get(
+                "content-type", ""
+            ).startswith(COMPRESSIBLE_TYPES)
+            self.start_message = message
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            if not more_body:
+                await self.send_complete(start_message, body)
+                return
+            await self.start_stream(start_message)
+        await self.send_chunk(body, more_body)
+
+    async def send_complete(self, message: Message, body: bytes) -> None:
+        if len(body) < self.minimum_size:
+            await self.send(message)
+            await self.send({"type": "http.response.body", "body": body})
+            return
+        headers = MutableHeaders(raw=message["headers"])
+        etag = headers.get("ETag")
+        key = (self.resource, etag or "", self.encoding)
+        compressed = self.cache.get(key) if self.cache and etag else None
+        if compressed is None:
+            if len(body) >= self.thread_size:
+                # large bodies would hold up every other request on the loop
+                compressed = await asyncio.to_thread(compress, body, self.encoding)
+            else:
+                compressed = compress(body, self.encoding)
+            if self.cache is not None and etag:
+                self.cache.set(key, compressed)
+        self.set_encoding_headers(headers)
+        headers["Content-Length"] = str(len(compressed))
+        message["headers"] = headers.raw
+        await self.send(message)
+        await self.send({"type": "http.response.body", "body": compressed})
+
+    async def start_stream(self, message: Message) -> None:
+        headers = MutableHeaders(raw=message["headers"])
+        self.set_encoding_headers(headers)
+        del headers["Content-Length"]
+        message["headers"] = headers.raw
+        self.compress_chunk, self.finish = streaming_compressor(self.encoding)
+        await self.send(message)
+
+    async def send_chunk(self, body: bytes, more_body: bool) -> None:
+        assert self.compress_chunk is not None and self.finish is not None
+        chunk = self.compress_chunk(body) if body else b""
+        if not more_body:
+            chunk += self.finish()
+        await self.send(
+            {"type": "http.response.body", "body": chunk, "more_body": more_body}
+        )
+
+    def set_encoding_headers(self, headers: MutableHeaders) -> None:
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            # the compressed body is a different representation of the resource
+            headers["ETag"] = f"W/{etag}"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            route = scope.get("route")
+            request_duration.observe(
+                perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code),
+            )
+
+
+class QueryStatsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(path=scope["path"])
+        token = query_stats.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                headers.append("Server-Timing", stats.server_timing())
+                message["headers"] = headers.raw
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            query_stats.reset(token)
+            queries_per_request.observe(stats.count)
+            if stats.count:
+                query_logger.debug(
+                    "%s ran %d queries in %.1fms, slowest: %s",
+                    stats.path,
+                    stats.count,
+                    stats.duration * 1000,
+                    [
+                        (round(duration * 1000, 1), statement)
+                        for duration, statement in stats.slowest
+                    ],
+                )
+
+
+class ProfilerMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def should_profile(self, scope: Scope) -> bool:
+        requested = Headers(scope=scope).get("X-Profile")
+        if requested and settings.profile_token:
+            return hmac.compare_digest(requested, settings.profile_token)
+        return random.random() < settings.profile_sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = profile_name(scope["method"], scope["path"])
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                headers["X-Profile-Id"] = name
+                message["headers"] = headers.raw
+            await send(message)
+
+        profiler = SamplingProfiler(
+            threading.get_ident(), settings.profile_interval_ms / 1000
+        )
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            await asyncio.to_thread(write_profile, settings.profile_dir, name, profiler)
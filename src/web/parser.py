@@ -1,21 +1,29 @@
 from dataclasses import dataclass, field
 from datetime import date
-from itertools import zip_longest
+from hashlib import blake2b
+from itertools import islice, zip_longest
 from tempfile import SpooledTemporaryFile
-from typing import BinaryIO, Self
+from typing import BinaryIO, Iterable, Iterator, Protocol, Self, cast
 
 from fastapi import HTTPException, status
 from ics import Calendar as iCalendar
-from ics import Event
-from ics.event import Arrow
 
 from src.data.entity import Apartment
 from src.data.value import Booking
 
+CALENDAR_HEADER = "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//intis//export//EN\r\n"
+CALENDAR_FOOTER = "END:VCALENDAR\r\n"
+
 
 class ParserError(HTTPException): ...
 
 
+class ExportRow(Protocol):
+    start_date: date
+    end_date: date
+    guest_name: str | None
+
+
 @dataclass
 class Calendar:
     filename: str | None
@@ -42,18 +50,77 @@ class Calendar:
             bookings=cls.extract_dates(icalendar),
         )
 
+    @classmethod
+    def export(cls, apartment: Apartment) -> tuple[str, bytes]:
+        return cls.export_filename(apartment.number), b"".join(
+            cls.stream(
+                cast(str, apartment.id),
+                sorted(apartment.bookings, key=lambda b: b.start_date),
+            )
+        )
+
+    @staticmethod
+    def export_filename(number: int) -> str:
+        return f"apartment_{number}.ics"
+
+    @classmethod
+    def stream(
+        cls, apartment_id: str, bookings: Iterable[ExportRow], batch_size: int = 64
+    ) -> Iterator[bytes]:
+        # VEVENT lines written straight from the rows, a batch per chunk
+        rows = iter(bookings)
+        yield CALENDAR_HEADER.encode()
+        while batch := list(islice(rows, batch_size)):
+            yield "".join(cls.event(apartment_id, row) for row in batch).encode()
+        yield CALENDAR_FOOTER.encode()
+
+    @classmethod
+    def event(
+        cls, apartment_id: str, booking: ExportRow, location: str | None = None
+    ) -> str:
+        # the same fields and date format the ics serializer produced,
+        # with a UID that stays put while the booking does
+        lines = ["BEGIN:VEVENT"]
+        if booking.guest_name:
+            lines.append(cls.fold(f"DESCRIPTION:{cls.escape(booking.guest_name)}"))
+        if location:
+            lines.append(cls.fold(f"LOCATION:{cls.escape(location)}"))
+        lines += [
+            f"DTEND:{booking.end_date:%Y%m%d}T000000Z",
+            f"DTSTART:{booking.start_date:%Y%m%d}T000000Z",
+            f"UID:{cls.event_uid(apartment_id, booking)}",
+            "END:VEVENT",
+        ]
+        return "\r\n".join(lines) + "\r\n"
+
+    @staticmethod
+    def event_uid(apartment_id: str, booking: ExportRow) -> str:
+        key = f"{apartment_id}|{booking.start_date}|{booking.end_date}"
+        return f"{blake2b(key.encode(), digest_size=16).hexdigest()}@intis"
+
+    @staticmethod
+    def escape(text: str) -> str:
+        return (
+            text.replace("\\", "\\\\")
+            .replace(";", "\\;")
+            .replace(",", "\\,")
+            .replace("\r\n", "\\n")
+            .replace("\n", "\\n")
+        )
+
     @staticmethod
-    def export(
-        apartment: Apartment,
-    ) -> tuple[str, bytes]:
-        calendar = iCalendar()
-        for booking in apartment.bookings:
-            event = Event()
-            event.description = booking.guest_name
-            event.begin = Arrow.fromdate(booking.start_date)
-            event.end = Arrow.fromdate(booking.end_date)
-            calendar.events.add(event)
-        return f"apartment_{apartment.number}.ics", calendar.serialize().encode()
+    def fold(line: str) -> str:
+        # content lines are at most 75 octets, continuations start with a space
+        parts, current, size = [], [], 0
+        for char in line:
+            width = len(char.encode())
+            if size + width > 75:
+                parts.append("".join(current))
+                current, size = [" "], 1
+            current.append(char)
+            size += width
+        parts.append("".join(current))
+        return "\r\n".join(parts)
 
     @staticmethod
     def extract_dates(icalendar: iCalendar) -> list[Booking]:
@@ -0,0 +1,18 @@
+from hashlib import blake2b
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+from src.web.metrics import stage_duration
+
+
+class PydanticJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        with stage_duration.time(stage="json_encode"):
+            return to_json(content)
+
+
+def make_etag(*parts: Any) -> str:
+    digest = blake2b("|".join(map(str, parts)).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
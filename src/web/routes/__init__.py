@@ -1,5 +1,6 @@
 from .api import router as calendar_router
 from .login import router as login_router
+from .metrics import router as metrics_router
 from .ui import router as ui_router
 
-__all__ = ["calendar_router", "login_router", "ui_router"]
+__all__ = ["calendar_router", "login_router", "metrics_router", "ui_router"]
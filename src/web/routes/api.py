@@ -1,20 +1,52 @@
-from datetime import UTC, date, datetime
-from typing import Annotated
+from datetime import UTC, date, datetime, timedelta
+from functools import partial
+from typing import Annotated, Any, AsyncIterator, cast
 
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from pydantic_core import Url
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.data.entity import Apartment, User
-from src.data.service import ApartmentList, make_schedule
-from src.web.auth import login_manager
-from src.web.dependencies import db_manager, http_manager
+from src.data.entity import (
+    Apartment,
+    ApartmentOccupancy,
+    MonthlyStats,
+    User,
+)
+from src.data.service import (
+    ApartmentList,
+    make_schedule,
+    make_schedule_bitmaps,
+    make_schedule_parallel,
+    make_schedule_sql,
+    make_worklist,
+    resolve_window,
+    schedule_size,
+)
+from src.data.value import (
+    ApartmentCursor,
+    Availability,
+    DirtyIntervals,
+    MonthlyReport,
+    WorkList,
+)
+from src.settings import settings
+from src.web.auth import CurrentUser, login_manager
+from src.web.cache import LRUCache, SingleFlight, data_versions, schedule_builds
+from src.web.dependencies import db_manager, http_manager, schedule_executor
+from src.web.export import ExportFormat, stream_calendar, stream_export
+from src.web.jobs import Job, job_manager, stats_refresher
+from src.web.metrics import stage_duration
 from src.web.parser import Calendar
+from src.web.responses import PydanticJSONResponse, make_etag
 
 router = APIRouter()
+feed_fetches: SingleFlight[str, Calendar] = SingleFlight()
+exports: LRUCache[tuple[str, datetime | None], bytes] = LRUCache(
+    settings.export_cache_size
+)
 
 
 class FileURL(BaseModel):
@@ -25,85 +57,413 @@ class Schedule(BaseModel):
     calendars: ApartmentList = Field(default_factory=list)
     start_date: date | None
     end_date: date | None
+    next_cursor: str | None = None
 
 
 class CalendarsQuery(BaseModel):
     from_date: date | None = None
     to_date: date | None = None
+    limit: int = Field(
+        default=settings.calendars_page_size,
+        ge=1,
+        le=settings.calendars_max_page_size,
+    )
+    cursor: str | None = None
 
+    def after(self) -> tuple[int, str] | None:
+        if self.cursor is None:
+            return None
+        try:
+            cursor = ApartmentCursor.decode(self.cursor)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            ) from e
+        return cursor.number, cursor.id
 
-@router.post("/import-url")
-async def import_calendar_from_url(
-    client: Annotated[httpx.AsyncClient, Depends(http_manager)],
-    session: Annotated[AsyncSession, Depends(db_manager)],
-    user: Annotated[User, Depends(login_manager)],
-    payload: FileURL,
-) -> JSONResponse:
+    async def window(self, session: AsyncSession, user_id: str) -> tuple[date, date]:
+        # resolved over the whole portfolio so every page covers the same days
+        first = last = None
+        if self.from_date is None or self.to_date is None:
+            first, last = await Apartment.user_booking_bounds(session, user_id)
+        return resolve_window(
+            self.from_date, self.to_date, first, last, settings.schedule_max_days
+        )
+
+    def check_window(self) -> None:
+        # rather than quietly cutting an explicit window at schedule_max_days
+        if (
+            self.from_date is not None
+            and self.to_date is not None
+            and (self.to_date - self.from_date).days >= settings.schedule_max_days
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"A schedule spans at most {settings.schedule_max_days} days",
+            )
+
+
+class WorkQuery(BaseModel):
+    from_date: date | None = None
+    days: int = Field(default=1, ge=1, le=settings.work_max_days)
+
+
+class AvailabilityQuery(BaseModel):
+    check_in: date
+    check_out: date
+
+
+class ReportQuery(BaseModel):
+    from_month: date
+    to_month: date
+
+
+class ExportQuery(BaseModel):
+    format: ExportFormat = "zip"
+
+
+async def fetch_calendar(client: httpx.AsyncClient, url: str) -> Calendar:
+    response = await client.get(url)
+    with stage_duration.time(stage="calendar_parse"):
+        return Calendar.parse(response.content, url)
+
+
+async def run_url_import(
+    job: Job, client: httpx.AsyncClient, user_id: str, url: Url
+) -> dict[str, Any]:
+    # the network and parsing happen before the import transaction opens,
+    # which then only holds the per-user lock for the database writes
     try:
-        response = await client.head(str(payload.url))
-        if "Last-Modified" in response.headers:
-            last_modified = response.headers["Last-Modified"]
-            apartment_no = Calendar.get_apartment_no(payload.url.path)
-            apartment = await Apartment.get(session, apartment_no, user.id)
-            if not apartment:
-                apartment = await Apartment.create(session, apartment_no, user.id)
-            if not apartment.updated_at or (
-                apartment.updated_at
-                < datetime.strptime(last_modified, "%a, %d %b %Y %H:%M:%S GMT").replace(
-                    tzinfo=UTC
-                )
-            ):
-                response = await client.get(str(payload.url))
-                calendar = Calendar.parse(response.content, str(payload.url))
-                await apartment.set_schedule(session, calendar.bookings)
+        job.advance("checking", 0.1)
+        response = await client.head(str(url))
+        if "Last-Modified" not in response.headers:
+            return {"updated": False}
+        last_modified = datetime.strptime(
+            response.headers["Last-Modified"], "%a, %d %b %Y %H:%M:%S GMT"
+        ).replace(tzinfo=UTC)
+        apartment_no = Calendar.get_apartment_no(url.path)
+        async with db_manager.session_scope() as session:
+            updated_at = await Apartment.last_updated(session, apartment_no, user_id)
+        if updated_at and updated_at >= last_modified:
+            return {"apartment": apartment_no, "updated": False}
+        job.advance("fetching", 0.3)
+        calendar = await feed_fetches.do(
+            str(url), partial(fetch_calendar, client, str(url))
+        )
     except (httpx.RequestError, httpx.NetworkError, httpx.ConnectError) as e:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="Error trying to fetch provided URL",
         ) from e
-    return JSONResponse(content="success", status_code=200)
+    job.advance("scheduling", 0.7)
+    async with db_manager.session_scope() as session:
+        await User.lock(session, user_id)
+        apartment = await Apartment.get(session, apartment_no, user_id)
+        if not apartment:
+            apartment = await Apartment.create(session, apartment_no, user_id)
+        with stage_duration.time(stage="set_schedule"):
+            dirty = await apartment.set_schedule(session, calendar.bookings)
+        if settings.occupancy_bitmaps:
+            with stage_duration.time(stage="occupancy_update"):
+                await ApartmentOccupancy.update(session, dirty)
+        else:
+            await User.set_occupancy_built(session, user_id, False)
+    data_versions.bump(user_id)
+    stats_refresher.trigger()
+    return {
+        "apartment": apartment_no,
+        "bookings": len(calendar.bookings),
+        "updated": True,
+    }
+
+
+async def run_calendar_import(
+    job: Job, user_id: str, content: bytes, filename: str | None
+) -> dict[str, Any]:
+    job.advance("parsing", 0.1)
+    with stage_duration.time(stage="calendar_parse"):
+        calendar = Calendar.parse(content, filename)
+    job.advance("scheduling", 0.4)
+    async with db_manager.session_scope() as session:
+        await User.lock(session, user_id)
+        apartment = await Apartment.get(session, calendar.apartment_no, user_id)
+        if not apartment:
+            apartment = await Apartment.create(session, calendar.apartment_no, user_id)
+        dirty = DirtyIntervals()
+        await apartment.prepare(session, dirty)
+        with stage_duration.time(stage="set_schedule"):
+            await apartment.set_schedule(session, calendar.bookings, dirty)
+        if settings.occupancy_bitmaps:
+            with stage_duration.time(stage="occupancy_update"):
+                await ApartmentOccupancy.update(session, dirty)
+        else:
+            await User.set_occupancy_built(session, user_id, False)
+    data_versions.bump(user_id)
+    stats_refresher.trigger()
+    return {
+        "apartment": calendar.apartment_no,
+        "bookings": len(calendar.bookings),
+        "updated": True,
+    }
+
 
+def accepted(response: Response, job: Job) -> Job:
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return job
 
-@router.post("/import-calendar")
+
+@router.post("/import-url", status_code=status.HTTP_202_ACCEPTED)
+async def import_calendar_from_url(
+    client: Annotated[httpx.AsyncClient, Depends(http_manager)],
+    user: Annotated[CurrentUser, Depends(login_manager)],
+    payload: FileURL,
+    response: Response,
+) -> Job:
+    user_id = user.id
+    job = await job_manager.submit(
+        user_id,
+        "import-url",
+        partial(run_url_import, client=client, user_id=user_id, url=payload.url),
+    )
+    return accepted(response, job)
+
+
+@router.post("/import-calendar", status_code=status.HTTP_202_ACCEPTED)
 async def import_calendar(
-    session: Annotated[AsyncSession, Depends(db_manager)],
-    user: Annotated[User, Depends(login_manager)],
+    user: Annotated[CurrentUser, Depends(login_manager)],
     file: UploadFile,
-) -> JSONResponse:
-    calendar = Calendar.parse(file.file, file.filename)  # noqa: F841
-    apartment = await Apartment.get(session, calendar.apartment_no, user.id)
-    if not apartment:
-        apartment = await Apartment.create(session, calendar.apartment_no, user.id)
-    await apartment.prepare(session)
-    await apartment.set_schedule(session, calendar.bookings)
-    return JSONResponse(content="File uploaded", status_code=200)
+    response: Response,
+) -> Job:
+    Calendar.get_apartment_no(file.filename)
+    user_id = user.id
+    job = await job_manager.submit(
+        user_id,
+        "import-calendar",
+        partial(
+            run_calendar_import,
+            user_id=user_id,
+            content=await file.read(),
+            filename=file.filename,
+        ),
+    )
+    return accepted(response, job)
+
+
+@router.get("/jobs/{id}")
+async def get_job(user: Annotated[CurrentUser, Depends(login_manager)], id: str) -> Job:
+    job = job_manager.get(id, user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return job
 
 
-@router.get("/calendars")
+async def build_schedule(
+    user_id: str, filter_query: CalendarsQuery, after: tuple[int, str] | None
+) -> Schedule:
+    # the build is shared and outlives the request that started it,
+    # so it reads through a session of its own
+    if settings.schedule_engine != "python":
+        async with db_manager.session_scope() as session:
+            name = settings.schedule_engine
+            if name == "bitmap" and not await User.occupancy_ready(session, user_id):
+                # not backfilled for this user yet
+                name = "sql"
+            engine = make_schedule_sql if name == "sql" else make_schedule_bitmaps
+            from_date, to_date = await filter_query.window(session, user_id)
+            with stage_duration.time(stage=f"make_schedule_{name}"):
+                calendars, start_date, end_date, page = await engine(
+                    session,
+                    user_id,
+                    from_date,
+                    to_date,
+                    settings.schedule_max_days,
+                    filter_query.limit,
+                    after,
+                )
+    else:
+        async with db_manager.session_scope() as session:
+            from_date, to_date = await filter_query.window(session, user_id)
+            apartments = await Apartment.list_window(
+                session, user_id, from_date, to_date, filter_query.limit, after
+            )
+        if (
+            settings.schedule_workers
+            and schedule_size(apartments, from_date, to_date)
+            >= settings.schedule_parallel_threshold
+        ):
+            with stage_duration.time(stage="make_schedule_parallel"):
+                calendars, start_date, end_date = await make_schedule_parallel(
+                    apartments,
+                    schedule_executor.run,
+                    from_date,
+                    to_date,
+                    settings.schedule_max_days,
+                    settings.schedule_chunk_size,
+                )
+        else:
+            with stage_duration.time(stage="make_schedule"):
+                calendars, start_date, end_date = make_schedule(
+                    apartments, from_date, to_date, settings.schedule_max_days
+                )
+        page = [(cast(str, apartment.id), apartment.number) for apartment in apartments]
+    next_cursor = None
+    if len(page) == filter_query.limit:
+        id, number = page[-1]
+        next_cursor = ApartmentCursor(number=number, id=id).encode()
+    return Schedule.model_construct(
+        calendars=calendars,
+        start_date=start_date,
+        end_date=end_date,
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/calendars", response_model=Schedule)
 async def get_calendars(
-    session: Annotated[AsyncSession, Depends(db_manager)],
-    user: Annotated[User, Depends(login_manager)],
+    user: Annotated[CurrentUser, Depends(login_manager)],
     filter_query: Annotated[CalendarsQuery, Depends()],
-) -> Schedule:
-    apartments = await Apartment.list(session, user.id)
-    calendars, start_date, end_date = make_schedule(
-        apartments, filter_query.from_date, filter_query.to_date
+) -> Response:
+    user_id = user.id
+    filter_query.check_window()
+    after = filter_query.after()
+    key = (
+        "calendars",
+        user_id,
+        data_versions.get(user_id),
+        filter_query.from_date,
+        filter_query.to_date,
+        filter_query.limit,
+        after,
+    )
+    schedule = await schedule_builds.do(
+        key, partial(build_schedule, user_id, filter_query, after)
+    )
+    # stable while the data is, so compressed bodies can be reused;
+    # the default window moves with today
+    etag = make_etag(*key, date.today())
+    return PydanticJSONResponse(schedule, headers={"ETag": etag})
+
+
+@router.get("/work", response_model=WorkList)
+async def get_work(
+    session: Annotated[AsyncSession, Depends(db_manager)],
+    user: Annotated[CurrentUser, Depends(login_manager)],
+    work_query: Annotated[WorkQuery, Depends()],
+) -> Response:
+    from_date = work_query.from_date or date.today()
+    to_date = from_date + timedelta(days=work_query.days - 1)
+    apartments = await Apartment.list_active(session, user.id, from_date, to_date)
+    with stage_duration.time(stage="make_worklist"):
+        worklist = make_worklist(apartments, from_date, to_date)
+    return PydanticJSONResponse(worklist)
+
+
+@router.get("/availability", response_model=Availability)
+async def get_availability(
+    session: Annotated[AsyncSession, Depends(db_manager)],
+    user: Annotated[CurrentUser, Depends(login_manager)],
+    stay: Annotated[AvailabilityQuery, Depends()],
+) -> Response:
+    if stay.check_out <= stay.check_in:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Check-out must come after check-in",
+        )
+    user_id = user.id
+    if settings.occupancy_bitmaps and await User.occupancy_ready(session, user_id):
+        numbers = [
+            number
+            for _, number in await ApartmentOccupancy.list_available(
+                session, user_id, stay.check_in, stay.check_out
+            )
+        ]
+    else:
+        apartments = await Apartment.list_available(
+            session, user_id, stay.check_in, stay.check_out
+        )
+        numbers = [apartment.number for apartment in apartments]
+    return PydanticJSONResponse(
+        Availability.model_construct(
+            check_in=stay.check_in, check_out=stay.check_out, apartments=numbers
+        )
+    )
+
+
+@router.get("/reports/monthly", response_model=MonthlyReport)
+async def get_monthly_report(
+    session: Annotated[AsyncSession, Depends(db_manager)],
+    user: Annotated[CurrentUser, Depends(login_manager)],
+    report_query: Annotated[ReportQuery, Depends()],
+) -> Response:
+    from_month = report_query.from_month.replace(day=1)
+    to_month = report_query.to_month.replace(day=1)
+    if to_month < from_month:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="to_month cannot come before from_month",
+        )
+    months = await MonthlyStats.list(session, user.id, from_month, to_month)
+    return PydanticJSONResponse(
+        MonthlyReport.model_construct(
+            from_month=from_month, to_month=to_month, months=months
+        )
+    )
+
+
+async def cached_export(
+    key: tuple[str, datetime | None], chunks: AsyncIterator[bytes]
+) -> AsyncIterator[bytes]:
+    body = []
+    async for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    # only a completely sent calendar is kept
+    exports.set(key, b"".join(body))
+
+
+@router.get("/export")
+async def export_portfolio(
+    user: Annotated[CurrentUser, Depends(login_manager)],
+    export_query: Annotated[ExportQuery, Depends()],
+) -> StreamingResponse:
+    filename = f"apartments.{export_query.format}"
+    return StreamingResponse(
+        stream_export(user.id, export_query.format),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        media_type=(
+            "application/zip" if export_query.format == "zip" else "text/calendar"
+        ),
     )
-    return Schedule(calendars=calendars, start_date=start_date, end_date=end_date)
 
 
 @router.get("/export/{id}")
 async def export(
     session: Annotated[AsyncSession, Depends(db_manager)],
-    user: Annotated[User, Depends(login_manager)],
+    user: Annotated[CurrentUser, Depends(login_manager)],
     id: str,
 ) -> Response:
-    apartment = await Apartment.get(session, id, user.id)
-    if not apartment:
+    found = await Apartment.version(session, id, user.id)
+    if not found:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    filename, content = Calendar.export(apartment)
-    return Response(
-        content=content,
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    apartment_id, number, updated_at = found
+    headers = {
+        "Content-Disposition": (
+            f'attachment; filename="{Calendar.export_filename(number)}"'
+        ),
+        "ETag": make_etag(apartment_id, updated_at),
+    }
+    # updated_at moves with every import of the apartment
+    key = (apartment_id, updated_at)
+    content = exports.get(key)
+    if content is not None:
+        return Response(content=content, headers=headers, media_type="text/calendar")
+    return StreamingResponse(
+        cached_export(
+            key,
+            stage_duration.time_stream(
+                stream_calendar(apartment_id), stage="calendar_export"
+            ),
+        ),
+        headers=headers,
         media_type="text/calendar",
     )
@@ -6,6 +6,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.data.entity import User
+from src.settings import settings
 from src.web.auth import LoginManager, get_login_manager
 from src.web.dependencies import db_manager
 
@@ -36,6 +37,8 @@ async def register(
     session: Annotated[AsyncSession, Depends(db_manager)],
     form: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> JSONResponse:
-    password_hash = login.hash_password(form.password)
-    user = await User.create(session, form.username, password_hash)
+    password_hash = await login.make_password_hash(form.password)
+    user = await User.create(
+        session, form.username, password_hash, settings.occupancy_bitmaps
+    )
     return JSONResponse(content={"username": user.username, "password": form.password})
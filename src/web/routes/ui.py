@@ -1,37 +1,117 @@
-from typing import Annotated
+from datetime import date, timedelta
+from functools import partial
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.templating import Jinja2Templates
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.data.entity import Apartment, User
-from src.data.service import make_schedule
-from src.web.auth import LoginManager, get_login_manager, login_manager
-from src.web.dependencies import db_manager
+from src.data.service import (
+    make_schedule,
+    make_schedule_bitmaps,
+    make_schedule_parallel,
+    make_schedule_sql,
+    schedule_size,
+)
+from src.settings import settings
+from src.web.auth import (
+    CurrentUser,
+    LoginManager,
+    get_login_manager,
+    login_manager,
+)
+from src.web.cache import data_versions, schedule_builds
+from src.web.dependencies import db_manager, schedule_executor
+from src.web.metrics import stage_duration
 
 router = APIRouter()
 templates = Jinja2Templates(directory="src/templates")
 
 
+async def render_window(
+    user: CurrentUser, from_date: date, days: int
+) -> dict[str, Any]:
+    user_id = user.id
+    key = ("dashboard", user_id, data_versions.get(user_id), from_date, days)
+    return await schedule_builds.do(
+        key, partial(build_window, user_id, from_date, days)
+    )
+
+
+async def build_window(user_id: str, from_date: date, days: int) -> dict[str, Any]:
+    # shared between callers, so it reads through a session of its own
+    to_date = from_date + timedelta(days=days - 1)
+    if settings.schedule_engine == "bitmap":
+        async with db_manager.session_scope() as session:
+            # the SQL engine until the bitmaps are backfilled for this user
+            ready = await User.occupancy_ready(session, user_id)
+            engine = make_schedule_bitmaps if ready else make_schedule_sql
+            with stage_duration.time(
+                stage="make_schedule_bitmap" if ready else "make_schedule_sql"
+            ):
+                apartments_view, _, _, _ = await engine(
+                    session, user_id, from_date, to_date
+                )
+    else:
+        async with db_manager.session_scope() as session:
+            apartments = await Apartment.list_window(
+                session, user_id, from_date, to_date
+            )
+        if (
+            settings.schedule_workers
+            and schedule_size(apartments, from_date, to_date)
+            >= settings.schedule_parallel_threshold
+        ):
+            with stage_duration.time(stage="make_schedule_parallel"):
+                apartments_view, _, _ = await make_schedule_parallel(
+                    apartments,
+                    schedule_executor.run,
+                    from_date,
+                    to_date,
+                    chunk_size=settings.schedule_chunk_size,
+                )
+        else:
+            with stage_duration.time(stage="make_schedule"):
+                apartments_view, _, _ = make_schedule(apartments, from_date, to_date)
+    return {
+        "apartments": apartments_view.apartments,
+        "dates": [from_date + timedelta(days=day) for day in range(days)],
+        "start_date": from_date,
+        "end_date": to_date,
+        "days": days,
+    }
+
+
+def stream_template(name: str, context: dict[str, Any]) -> StreamingResponse:
+    stream = templates.get_template(name).stream(context)
+    stream.enable_buffering(size=256)
+    return StreamingResponse(stream, media_type="text/html")
+
+
 @router.get("/", response_class=HTMLResponse)
 async def index(
-    request: Request,
-    user: Annotated[User, Depends(login_manager.authenticator)],
-    session: Annotated[AsyncSession, Depends(db_manager)],
-):
-    apartments = await Apartment.list(session, user.id)
-    apartments_view, min_date, max_date = make_schedule(apartments)
-    return templates.TemplateResponse(
-        request=request,
-        name="index.html",
-        context={
-            **apartments_view.model_dump(),
-            "start_date": min_date,
-            "end_date": max_date,
-        },
+    user: Annotated[CurrentUser, Depends(login_manager.authenticator)],
+    from_date: date | None = None,
+) -> StreamingResponse:
+    context = await render_window(
+        user, from_date or date.today(), settings.dashboard_window_days
     )
+    return stream_template("index.html", context)
+
+
+@router.get("/schedule", response_class=HTMLResponse)
+async def schedule_rows(
+    user: Annotated[CurrentUser, Depends(login_manager.authenticator)],
+    from_date: date,
+    days: Annotated[
+        int, Query(ge=1, le=settings.schedule_max_days)
+    ] = settings.dashboard_window_days,
+) -> StreamingResponse:
+    context = await render_window(user, from_date, days)
+    return stream_template("schedule_rows.html", context)
 
 
 @router.get("/signin", response_class=HTMLResponse)
@@ -71,5 +151,10 @@ async def register(
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = await User.create(session, form.username, login.hash_password(form.password))
+    user = await User.create(
+        session,
+        form.username,
+        await login.make_password_hash(form.password),
+        settings.occupancy_bitmaps,
+    )
     return RedirectResponse("/signin", status_code=status.HTTP_303_SEE_OTHER)
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import json
+import platform
+import sys
+from dataclasses import asdict
+from datetime import UTC, datetime
+from pathlib import Path
+
+from src.settings import settings
+from tests.benchmarks.suite import Scale, compare, run, run_engines
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.benchmarks",
+        description="Micro-benchmarks for the schedule, cleaning and parsing paths.",
+    )
+    parser.add_argument("--apartments", type=int, default=Scale.apartments)
+    parser.add_argument("--bookings", type=int, default=Scale.bookings)
+    parser.add_argument("--horizon", type=int, default=Scale.horizon)
+    parser.add_argument("--seed", type=int, default=Scale.seed)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="run only the named cases")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON results to compare with")
+    parser.add_argument(
+        "--engines",
+        metavar="USER_ID",
+        help="also compare the python and sql schedule engines on the database",
+    )
+    parser.add_argument("--days", type=int, default=settings.schedule_max_days)
+    parser.add_argument("--limit", type=int, help="apartments per schedule page")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> dict:
+    args = parse_args(argv)
+    scale = Scale(args.apartments, args.bookings, args.horizon, args.seed)
+    report = {
+        "created_at": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": asdict(scale),
+        "results": run(scale, args.repeat, args.only),
+    }
+    if args.engines:
+        report["results"].update(
+            asyncio.run(run_engines(args.engines, args.days, args.limit, args.repeat))
+        )
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        report["compared_to"] = str(args.compare)
+        report["ratios"] = compare(report["results"], baseline["results"])
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        sys.stdout.write(output + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import statistics
+from dataclasses import dataclass
+from datetime import timedelta
+from time import perf_counter
+from typing import Awaitable, Callable
+
+from dateutil.rrule import DAILY, rrule
+
+from src.data.entity import Apartment, Booking
+from src.data.service import make_schedule, make_schedule_sql
+from src.web.dependencies import db_manager
+from src.web.parser import Calendar
+from tests.factories import build_portfolio
+
+
+@dataclass
+class Scale:
+    apartments: int = 50
+    bookings: int = 40
+    horizon: int = 365
+    seed: int = 0
+
+
+Case = Callable[[], object]
+
+
+def overlapping_with(
+    booking: Booking, portfolio: list[Apartment]
+) -> tuple[Booking, ...]:
+    return tuple(
+        other
+        for apartment in portfolio
+        if apartment.id != booking.apartment_id
+        for other in apartment.bookings
+        if booking.start_date <= other.end_date and booking.end_date > other.start_date
+    )
+
+
+def build_cases(scale: Scale) -> dict[str, Case]:
+    portfolio = build_portfolio(
+        scale.apartments, scale.bookings, scale.horizon, scale.seed
+    )
+    apartment = portfolio[0]
+    first, last = apartment.bookings[0], apartment.bookings[-1]
+    days = [
+        dt.date()
+        for dt in rrule(
+            DAILY,
+            dtstart=first.start_date,
+            until=last.end_date + timedelta(days=1),
+        )
+    ]
+    booking = apartment.bookings[len(apartment.bookings) // 2]
+    overlapping = overlapping_with(booking, portfolio)
+    filename, content = Calendar.export(apartment)
+    icalendar = Calendar.get_icalendar(content)
+
+    return {
+        "apartment_status": lambda: [apartment.status(day) for day in days],
+        "make_schedule": lambda: make_schedule(portfolio),
+        "determine_best_cleaning_date": lambda: apartment.determine_best_cleaning_date(
+            booking, overlapping
+        ),
+        "calendar_parse": lambda: Calendar.parse(content, filename),
+        "calendar_extract_dates": lambda: Calendar.extract_dates(icalendar),
+        "calendar_export": lambda: Calendar.export(apartment),
+    }
+
+
+def measure(case: Case, repeat: int) -> dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        case()
+        timings.append(perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "max": max(timings),
+    }
+
+
+async def measure_async(
+    case: Callable[[], Awaitable[object]], repeat: int
+) -> dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        await case()
+        timings.append(perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "max": max(timings),
+    }
+
+
+async def run_engines(
+    user_id: str, days: int, limit: int | None, repeat: int
+) -> dict[str, dict[str, float]]:
+    # both schedule engines end to end against the configured database,
+    # e.g. one loaded with `python -m src.tools.generate db`
+    async with db_manager.session_scope() as session:
+
+        async def python_engine() -> object:
+            apartments = await Apartment.list(session, user_id, limit)
+            return make_schedule(apartments, max_days=days)
+
+        async def sql_engine() -> object:
+            return await make_schedule_sql(session, user_id, max_days=days, limit=limit)
+
+        results = {
+            "make_schedule_python_engine": await measure_async(python_engine, repeat),
+            "make_schedule_sql_engine": await measure_async(sql_engine, repeat),
+        }
+    await db_manager.shutdown()
+    return results
+
+
+def run(
+    scale: Scale, repeat: int, only: list[str] | None = None
+) -> dict[str, dict[str, float]]:
+    cases = build_cases(scale)
+    return {
+        name: measure(case, repeat)
+        for name, case in cases.items()
+        if not only or name in only
+    }
+
+
+def compare(
+    current: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]]
+) -> dict[str, float]:
+    return {
+        name: result["median"] / baseline[name]["median"]
+        for name, result in current.items()
+        if name in baseline and baseline[name]["median"]
+    }
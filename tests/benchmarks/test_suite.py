@@ -0,0 +1,78 @@
+import json
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+from unittest.mock import AsyncMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from src.data.entity import Apartment
+from src.web.dependencies import db_manager
+from tests.benchmarks import suite
+from tests.benchmarks.__main__ import main
+from tests.benchmarks.suite import compare
+from tests.factories import build_portfolio
+
+
+def test_build_portfolio_bookings_are_consistent() -> None:
+    portfolio = build_portfolio(
+        apartments=3, bookings_per_apartment=20, horizon_days=200
+    )
+    assert [apartment.number for apartment in portfolio] == [1, 2, 3]
+    for apartment in portfolio:
+        assert len(apartment.bookings) == 20
+        for booking, following in zip(apartment.bookings, apartment.bookings[1:]):
+            assert booking.start_date < booking.end_date <= following.start_date
+            assert booking.cleaning_deadline == following.start_date
+            assert booking.end_date <= booking.cleaning_date <= following.start_date
+
+
+def test_benchmarks_write_json(tmp_path: Path) -> None:
+    output = tmp_path / "bench.json"
+    main(
+        [
+            "--apartments",
+            "2",
+            "--bookings",
+            "4",
+            "--horizon",
+            "30",
+            "--repeat",
+            "1",
+            "--output",
+            str(output),
+        ]
+    )
+
+    report = json.loads(output.read_text())
+    assert report["scale"] == {"apartments": 2, "bookings": 4, "horizon": 30, "seed": 0}
+    assert set(report["results"]) == {
+        "apartment_status",
+        "make_schedule",
+        "determine_best_cleaning_date",
+        "calendar_parse",
+        "calendar_extract_dates",
+        "calendar_export",
+    }
+    assert compare(report["results"], report["results"])["make_schedule"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_run_engines(mocker: MockerFixture) -> None:
+    @asynccontextmanager
+    async def session_scope() -> AsyncIterator[None]:
+        yield None
+
+    portfolio = build_portfolio(apartments=2, bookings_per_apartment=4, horizon_days=30)
+    mocker.patch.object(db_manager, "session_scope", session_scope)
+    mocker.patch.object(db_manager, "shutdown", AsyncMock())
+    mocker.patch.object(Apartment, "list", AsyncMock(return_value=portfolio))
+    sql_engine = AsyncMock()
+    mocker.patch.object(suite, "make_schedule_sql", sql_engine)
+
+    results = await suite.run_engines("user", days=30, limit=10, repeat=2)
+
+    assert set(results) == {"make_schedule_python_engine", "make_schedule_sql_engine"}
+    assert results["make_schedule_sql_engine"]["repeat"] == 2
+    sql_engine.assert_called_with(None, "user", max_days=30, limit=10)
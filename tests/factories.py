@@ -1,8 +1,12 @@
+from datetime import date
+from random import Random
+
 from polyfactory.factories.pydantic_factory import ModelFactory
 
 from src.data.entity import Apartment, Booking
 from src.data.entity import User
 from src.data.value import Booking as BookingValue
+from src.tools.generate import generate_stays
 
 
 class UserFactory(ModelFactory[User]): ...
@@ -15,3 +19,43 @@ class BookingFactory(ModelFactory[Booking]): ...
 
 
 class BookingValueFactory(ModelFactory[BookingValue]): ...
+
+
+def build_bookings(
+    rng: Random,
+    apartment_id: str,
+    count: int,
+    horizon_days: int,
+    start: date,
+) -> list[Booking]:
+    return [
+        BookingFactory.build(
+            start_date=stay.start_date,
+            end_date=stay.end_date,
+            cleaning_deadline=stay.cleaning_deadline,
+            cleaning_date=stay.cleaning_date,
+            apartment_id=apartment_id,
+        )
+        for stay in generate_stays(rng, count, horizon_days, start)
+    ]
+
+
+def build_portfolio(
+    apartments: int,
+    bookings_per_apartment: int,
+    horizon_days: int,
+    seed: int = 0,
+    start: date = date(2024, 1, 1),
+) -> list[Apartment]:
+    rng = Random(seed)
+    portfolio = []
+    for number in range(1, apartments + 1):
+        apartment_id = Apartment.make_id("user", number)
+        apartment = ApartmentFactory.build(
+            id=apartment_id, number=number, user_id="user", bookings=[]
+        )
+        apartment.bookings = build_bookings(
+            rng, apartment_id, bookings_per_apartment, horizon_days, start
+        )
+        portfolio.append(apartment)
+    return portfolio
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import json
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+
+from tests.load.harness import DEFAULT_MIX, SCENARIOS, LoadConfig, run_load
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {name: 0 for name in SCENARIOS}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}")
+        mix[name] = int(weight)
+    return mix
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.load",
+        description="Drive the API with a weighted mix of requests and report latency.",
+    )
+    parser.add_argument(
+        "--base-url",
+        help="running server to target, the app runs in-process if omitted",
+    )
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=dict(DEFAULT_MIX),
+        help="weights, e.g. calendars=70,export=20,import_calendar=5,import_url=5",
+    )
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--apartments", type=int, default=20)
+    parser.add_argument("--bookings", type=int, default=40, help="per apartment")
+    parser.add_argument("--feed-url", default=LoadConfig.feed_url)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="write the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> dict:
+    args = parse_args(argv)
+    config = LoadConfig(
+        mix=args.mix,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        apartments=args.apartments,
+        bookings=args.bookings,
+        feed_url=args.feed_url,
+        seed=args.seed,
+    )
+    started = datetime.now(UTC)
+    username = f"load-{started:%Y%m%d%H%M%S%f}"
+    results = asyncio.run(run_load(config, args.base_url, username))
+    report = {
+        "created_at": started.isoformat(),
+        "target": args.base_url or "in-process",
+        "concurrency": config.concurrency,
+        "duration": results.elapsed,
+        "mix": config.mix,
+        "endpoints": results.report(),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        sys.stdout.write(output + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import asyncio
+import statistics
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from random import Random
+from time import perf_counter
+from typing import Awaitable, Callable
+
+from httpx import ASGITransport, AsyncClient
+
+from src.tools.generate import format_ics, generate_stays
+from src.web.app import app
+
+DEFAULT_MIX = {
+    "calendars": 70,
+    "export": 20,
+    "import_calendar": 5,
+    "import_url": 5,
+}
+
+
+@dataclass
+class LoadConfig:
+    mix: dict[str, int] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    concurrency: int = 10
+    duration: float = 30.0
+    apartments: int = 20
+    bookings: int = 40
+    feed_url: str = "http://localhost:8089/apartman_4.ics"
+    seed: int = 0
+
+
+@dataclass
+class Session:
+    client: AsyncClient
+    token: str
+    calendars: dict[int, bytes]
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+Scenario = Callable[[Session, Random, LoadConfig], Awaitable[int]]
+
+
+async def get_calendars(session: Session, rng: Random, config: LoadConfig) -> int:
+    response = await session.client.get("/api/calendars", headers=session.headers)
+    return response.status_code
+
+
+async def export(session: Session, rng: Random, config: LoadConfig) -> int:
+    number = rng.choice(list(session.calendars))
+    response = await session.client.get(
+        f"/api/export/{number}", headers=session.headers
+    )
+    return response.status_code
+
+
+async def import_calendar(session: Session, rng: Random, config: LoadConfig) -> int:
+    number = rng.choice(list(session.calendars))
+    response = await session.client.post(
+        "/api/import-calendar",
+        files={"file": (f"apartment_{number}.ics", session.calendars[number])},
+        headers=session.headers,
+    )
+    return response.status_code
+
+
+async def import_url(session: Session, rng: Random, config: LoadConfig) -> int:
+    response = await session.client.post(
+        "/api/import-url", json={"url": config.feed_url}, headers=session.headers
+    )
+    return response.status_code
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "calendars": get_calendars,
+    "export": export,
+    "import_calendar": import_calendar,
+    "import_url": import_url,
+}
+
+
+def make_client(base_url: str | None) -> AsyncClient:
+    if base_url:
+        return AsyncClient(base_url=base_url, timeout=60)
+    return AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://localhost", timeout=60
+    )
+
+
+async def prepare(client: AsyncClient, config: LoadConfig, username: str) -> Session:
+    credentials = {"username": username, "password": "load-test"}
+    response = await client.post("/api/register", data=credentials)
+    response.raise_for_status()
+    response = await client.post("/api/login", data=credentials)
+    response.raise_for_status()
+
+    rng = Random(config.seed)
+    calendars = {
+        number: format_ics(
+            number,
+            generate_stays(rng, config.bookings, config.bookings * 7, date.today()),
+            rng,
+        ).encode()
+        for number in range(1, config.apartments + 1)
+    }
+    session = Session(client=client, token=response.json(), calendars=calendars)
+    for number in calendars:
+        status = await import_calendar_number(session, number)
+        if status >= 400:
+            raise RuntimeError(f"seeding apartment {number} failed with {status}")
+    return session
+
+
+async def import_calendar_number(session: Session, number: int) -> int:
+    response = await session.client.post(
+        "/api/import-calendar",
+        files={"file": (f"apartment_{number}.ics", session.calendars[number])},
+        headers=session.headers,
+    )
+    if response.status_code != 202:
+        return response.status_code
+    return await wait_for_job(session, response.headers["Location"])
+
+
+async def wait_for_job(session: Session, location: str, interval: float = 0.05) -> int:
+    # seeding has to finish before the measured run starts
+    while True:
+        response = await session.client.get(location, headers=session.headers)
+        if response.status_code != 200:
+            return response.status_code
+        if response.json()["status"] == "FAILED":
+            return 500
+        if response.json()["status"] == "SUCCEEDED":
+            return 200
+        await asyncio.sleep(interval)
+
+
+@dataclass
+class Results:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    elapsed: float = 0.0
+
+    def record(self, name: str, latency: float, status: int) -> None:
+        self.latencies[name].append(latency)
+        if status >= 400:
+            self.errors[name] += 1
+
+    def report(self) -> dict[str, dict[str, float]]:
+        return {
+            name: summarize(latencies, self.errors[name], self.elapsed)
+            for name, latencies in sorted(self.latencies.items())
+        }
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p90_ms": percentile(ordered, 0.90) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+async def worker(
+    session: Session,
+    config: LoadConfig,
+    rng: Random,
+    deadline: float,
+    results: Results,
+) -> None:
+    names = [name for name, weight in config.mix.items() if weight > 0]
+    weights = [config.mix[name] for name in names]
+    while perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = perf_counter()
+        try:
+            status = await SCENARIOS[name](session, rng, config)
+        except Exception:
+            status = 599
+        results.record(name, perf_counter() - start, status)
+
+
+async def run_load(
+    config: LoadConfig, base_url: str | None = None, username: str = "load-test"
+) -> Results:
+    async with make_client(base_url) as client:
+        session = await prepare(client, config, username)
+        results = Results()
+        start = perf_counter()
+        await asyncio.gather(
+            *(
+                worker(
+                    session,
+                    config,
+                    Random(config.seed + i),
+                    start + config.duration,
+                    results,
+                )
+                for i in range(config.concurrency)
+            )
+        )
+        results.elapsed = perf_counter() - start
+        return results
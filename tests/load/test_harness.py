@@ -0,0 +1,70 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+from pytest_mock import MockerFixture
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from tests.load import harness
+from tests.load.__main__ import parse_mix
+from tests.load.harness import LoadConfig, percentile, run_load
+
+
+async def ok(request):
+    return JSONResponse("token")
+
+
+async def failing(request):
+    return JSONResponse("nope", status_code=502)
+
+
+@pytest.fixture
+def stub_client(mocker: MockerFixture) -> None:
+    app = Starlette(
+        routes=[
+            Route("/api/register", ok, methods=["POST"]),
+            Route("/api/login", ok, methods=["POST"]),
+            Route("/api/import-calendar", ok, methods=["POST"]),
+            Route("/api/import-url", failing, methods=["POST"]),
+            Route("/api/calendars", ok),
+            Route("/api/export/{number}", ok),
+        ]
+    )
+    mocker.patch.object(
+        harness,
+        "make_client",
+        lambda base_url: AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ),
+    )
+
+
+def test_percentile() -> None:
+    ordered = [float(i) for i in range(1, 101)]
+    assert percentile(ordered, 0.5) == 50.0
+    assert percentile(ordered, 0.99) == 99.0
+    assert percentile([3.0], 0.99) == 3.0
+
+
+def test_parse_mix() -> None:
+    assert parse_mix("calendars=3,export=1") == {
+        "calendars": 3,
+        "export": 1,
+        "import_calendar": 0,
+        "import_url": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_run_load(stub_client: None) -> None:
+    config = LoadConfig(concurrency=2, duration=0.2, apartments=2, bookings=3)
+
+    results = await run_load(config)
+
+    report = results.report()
+    assert set(report) <= {"calendars", "export", "import_calendar", "import_url"}
+    assert report["calendars"]["requests"] > 0
+    assert report["calendars"]["errors"] == 0
+    assert report["calendars"]["p50_ms"] <= report["calendars"]["p99_ms"]
+    if "import_url" in report:
+        assert report["import_url"]["errors"] == report["import_url"]["requests"]
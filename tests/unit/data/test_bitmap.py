@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+from typing import cast
+
+from src.data import bitmap
+from src.data.value import STATUS_BITS, ApartmentStatus, mask_statuses
+from tests.factories import build_portfolio
+
+
+def test_year_spans() -> None:
+    assert list(bitmap.year_spans(date(2024, 12, 30), date(2025, 1, 3))) == [
+        (2024, 364, 366),
+        (2025, 0, 2),
+    ]
+    assert list(bitmap.year_spans(date(2025, 3, 1), date(2025, 3, 1))) == []
+
+
+def test_ranges() -> None:
+    bits = bitmap.empty(2024)
+    assert len(bits) == 46
+    bitmap.set_range(bits, 5, 12)
+    bitmap.set_range(bits, 365, 366)
+    assert bits[0] == 0b11100000 and bits[1] == 0b00001111
+    assert bitmap.is_set(bits, 365)
+    assert bitmap.any_in_range(bits, 11, 20)
+    assert not bitmap.any_in_range(bits, 12, 365)
+    bitmap.copy_range(bits, bitmap.empty(2024), 0, 8)
+    assert bits[0] == 0 and bits[1] == 0b00001111
+    bitmap.copy_range(bits, bitmap.empty(2024), 8, 366)
+    assert not any(bits)
+
+
+def test_build_matches_status_and_availability() -> None:
+    portfolio = build_portfolio(3, 8, 90, start=date(2024, 11, 20))
+    vacant = STATUS_BITS[ApartmentStatus.VACANT]
+    days = [date(2024, 11, 15) + timedelta(days=offset) for offset in range(110)]
+    for apartment in portfolio:
+        years = bitmap.build(apartment.bookings)
+        assert set(years) == {2024, 2025}
+        for day in days:
+            mask = bitmap.day_mask(years[day.year], bitmap.day_index(day))
+            assert mask_statuses(mask or vacant) == apartment.status(day), day
+        for check_in in days[::3]:
+            for nights in range(1, 8):
+                check_out = check_in + timedelta(days=nights)
+                blocked = any(
+                    bitmap.any_in_range(years[year]["blocked"], first, stop)
+                    for year, first, stop in bitmap.year_spans(check_in, check_out)
+                )
+                # booked from check-in through cleaning, turnovers allowed
+                assert blocked == any(
+                    booking.start_date < check_out
+                    and cast(date, booking.cleaning_date) > check_in
+                    for booking in apartment.bookings
+                )
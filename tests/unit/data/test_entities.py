@@ -7,8 +7,21 @@ from freezegun import freeze_time
 from pytest_mock import MockerFixture
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.data.entity import Apartment, Booking, DayInfo, User
-from src.data.value import ApartmentStatus
+from src.data import bitmap
+from src.data.entity import (
+    Apartment,
+    ApartmentOccupancy,
+    Booking,
+    DayInfo,
+    MonthlyStats,
+    User,
+)
+from src.data.value import (
+    ApartmentMonth,
+    ApartmentStatus,
+    DirtyIntervals,
+    mask_statuses,
+)
 from tests.unit.conftest import FakeSession
 from tests.factories import (
     ApartmentFactory,
@@ -109,10 +122,42 @@ async def test_create_user(fake_session: FakeSession, mocker: MockerFixture) ->
     assert user == mock_user
     assert fake_session.add() == [mock_user]
     mock_new.assert_called_once_with(
-        User, username=mock_user.username, password=mock_user.password
+        User,
+        username=mock_user.username,
+        password=mock_user.password,
+        occupancy_built_at=None,
     )
 
 
+@pytest.mark.asyncio
+async def test_user_occupancy_built(fake_session: FakeSession) -> None:
+    fake_session(return_=None)
+    assert not await User.occupancy_ready(fake_session, "user")  # type: ignore[arg-type]
+    fake_session(return_=datetime(2024, 9, 1, tzinfo=UTC))
+    assert await User.occupancy_ready(fake_session, "user")  # type: ignore[arg-type]
+
+    await User.set_occupancy_built(fake_session, "user", True)  # type: ignore[arg-type]
+    query = fake_session.query.compile()  # type: ignore[attr-defined]
+    assert str(query).startswith('UPDATE "user" SET occupancy_built_at=')
+    assert query.params["occupancy_built_at"] is not None
+
+    await User.set_occupancy_built(fake_session, "user", False)  # type: ignore[arg-type]
+    query = fake_session.query.compile()  # type: ignore[attr-defined]
+    assert '"user".occupancy_built_at IS NOT NULL' in str(query)
+    assert query.params["occupancy_built_at"] is None
+
+
+@pytest.mark.asyncio
+async def test_lock_user(fake_session: FakeSession) -> None:
+    key = User.lock_key("user")
+    assert key == User.lock_key("user")
+    assert key != User.lock_key("other")
+    assert -(2**63) <= key < 2**63
+
+    await User.lock(fake_session, "user")  # type: ignore[arg-type]
+    assert "pg_advisory_xact_lock" in str(fake_session.query)
+
+
 def test_make_id() -> None:
     assert "user.10" == Apartment.make_id("user", 10)
 
@@ -153,6 +198,23 @@ async def test_prepare(fake_session: FakeSession, mocker: MockerFixture) -> None
     mock_delete_own_bookings.assert_called_once_with(fake_session)
 
 
+@pytest.mark.asyncio
+async def test_prepare_records_dirty_days(
+    fake_session: FakeSession, bookings: list[Booking], mocker: MockerFixture
+) -> None:
+    mocker.patch.object(Apartment, "delete_own_bookings", AsyncMock())
+    apartment = ApartmentFactory.build(id="a", bookings=bookings)
+    dirty = DirtyIntervals()
+    await apartment.prepare(cast(AsyncSession, fake_session), dirty)
+    assert list(dirty) == [
+        (
+            "a",
+            min(b.start_date for b in bookings),
+            max(cast(date, b.cleaning_date) for b in bookings),
+        )
+    ]
+
+
 @pytest.mark.asyncio
 async def test_set_schedule(
     fake_session: FakeSession,
@@ -175,7 +237,9 @@ async def test_set_schedule(
     ]
     day_info = DayInfo(0, now, {})
 
-    booking_instance_mock = AsyncMock()
+    booking_instance_mock = AsyncMock(
+        start_date=date(2020, 5, 5), cleaning_date=date(2020, 6, 6)
+    )
     booking_instance_mock.get_overlapping_bookings.return_value = tuple(
         overlapping_bookings_2
     )
@@ -189,7 +253,9 @@ async def test_set_schedule(
     mocker.patch("src.data.entity.Booking", booking_mock)
 
     with freeze_time(now):
-        await apartment.set_schedule(fake_session, booking_values)  # type: ignore[arg-type]
+        dirty = await apartment.set_schedule(fake_session, booking_values)  # type: ignore[arg-type]
+
+        assert list(dirty) == [("user", date(2020, 5, 5), date(2020, 6, 6))]
 
         assert apartment.updated_at == now.replace(tzinfo=UTC)
         assert len(booking_values) == booking_mock.call_count
@@ -202,6 +268,7 @@ async def test_set_schedule(
         booking_instance_mock.get_overlapping_bookings.assert_called_with(
             fake_session,
             cast(str, apartment.id),
+            apartment.user_id,
         )
         assert (
             len(booking_values)
@@ -212,7 +279,7 @@ async def test_set_schedule(
         )
         assert len(booking_values) == determine_best_cleaning_date_mock.call_count
         assign_cleaning_date_mock.assert_called_with(
-            fake_session, booking_instance_mock, day_info
+            fake_session, booking_instance_mock, day_info, dirty
         )
         assert len(booking_values) == assign_cleaning_date_mock.call_count
 
@@ -324,6 +391,29 @@ def test_assign_cleaning_date_with_best(
     assert new_booking.cleaning_date == best_date
 
 
+def test_assign_cleaning_date_records_moved_cleanings(
+    fake_session: FakeSession[Booking], overlapping_bookings_1: list[Booking]
+) -> None:
+    best = DayInfo(
+        2,
+        date(2020, 5, 6),
+        bookings={str(i): booking for i, booking in enumerate(overlapping_bookings_1)},
+    )
+    moved = {
+        b.apartment_id: b.cleaning_date
+        for b in overlapping_bookings_1
+        if b.cleaning_date != best.date
+    }
+    dirty = DirtyIntervals()
+    Apartment.assign_cleaning_date(
+        cast(AsyncSession, fake_session), BookingFactory.build(), best, dirty
+    )
+    assert dirty.intervals == {
+        id: (min(cleaning, best.date), max(cleaning, best.date))
+        for id, cleaning in moved.items()
+    }
+
+
 def test_assign_cleaning_date_without_best(fake_session: FakeSession[Booking]) -> None:
     new_booking = BookingFactory.build()
     Apartment.assign_cleaning_date(cast(AsyncSession, fake_session), new_booking, None)
@@ -354,3 +444,223 @@ def test_apartment_status(bookings: list[Booking]) -> None:
 
     apartment.bookings = []
     assert [ApartmentStatus.VACANT] == apartment.status(date(2020, 7, 21))
+
+
+def test_booking_blocking_clause() -> None:
+    clause = str(Booking.blocking(date(2020, 6, 1), date(2020, 6, 5)))
+    assert "booking.start_date < :start_date_1" in clause
+    assert "booking.cleaning_date > :cleaning_date_1" in clause
+
+
+@pytest.mark.asyncio
+async def test_monthly_stats_list(fake_session: FakeSession) -> None:
+    row = {
+        "number": 3,
+        "month": date(2024, 9, 1),
+        "nights_booked": 15,
+        "turnovers": 4,
+        "cleaning_days": 4,
+        "occupancy_rate": 0.5,
+    }
+    fake_session.mappings = lambda: [row]  # type: ignore[attr-defined]
+
+    months = await MonthlyStats.list(
+        fake_session,  # type: ignore[arg-type]
+        "user",
+        date(2024, 9, 15),
+        date(2024, 10, 2),
+    )
+
+    assert months == [ApartmentMonth(**row)]
+    query = fake_session.query.compile()  # type: ignore[attr-defined]
+    assert "apartment_monthly_stats" in str(query)
+    assert query.params == {
+        "user_id": "user",
+        "from_month": date(2024, 9, 1),
+        "to_month": date(2024, 10, 1),
+    }
+
+    await MonthlyStats.refresh(fake_session)  # type: ignore[arg-type]
+    assert "CONCURRENTLY" in str(fake_session.query)
+
+
+@pytest.mark.asyncio
+async def test_occupancy_rebuild(fake_session: FakeSession) -> None:
+    stay = Booking(
+        start_date=date(2024, 12, 29),
+        end_date=date(2025, 1, 2),
+        cleaning_date=date(2025, 1, 3),
+        apartment_id="a",
+    )
+    queries = []
+
+    async def exec(query):
+        queries.append(query)
+        return fake_session
+
+    fake_session.exec = exec  # type: ignore[method-assign]
+    fake_session.all = lambda: [stay]  # type: ignore[attr-defined]
+
+    await ApartmentOccupancy.rebuild(fake_session, ["b", "a", "a"])  # type: ignore[arg-type]
+
+    assert "DELETE FROM apartment_occupancy" in str(queries[1])
+    rows = {(row.apartment_id, row.year): row for row in fake_session.add_args}
+    assert set(rows) == {("a", 2024), ("a", 2025)}
+    assert rows[("a", 2024)].nights == bytes(bitmap.build([stay])[2024]["nights"])
+    assert bitmap.is_set(rows[("a", 2025)].cleanings, 2)
+
+
+@pytest.mark.asyncio
+async def test_occupancy_list_available(fake_session: FakeSession) -> None:
+    blocked = bitmap.empty(2024)
+    bitmap.set_range(blocked, bitmap.day_index(date(2024, 6, 10)), 200)
+    fake_session.all = lambda: [  # type: ignore[attr-defined]
+        ("u.1", 1, None, None),
+        ("u.2", 2, 2024, bytes(blocked)),
+        ("u.3", 3, 2024, bytes(bitmap.empty(2024))),
+    ]
+
+    available = await ApartmentOccupancy.list_available(
+        fake_session,  # type: ignore[arg-type]
+        "u",
+        date(2024, 6, 5),
+        date(2024, 6, 10),
+    )
+    assert available == [("u.1", 1), ("u.2", 2), ("u.3", 3)]
+
+    available = await ApartmentOccupancy.list_available(
+        fake_session,  # type: ignore[arg-type]
+        "u",
+        date(2024, 6, 5),
+        date(2024, 6, 11),
+    )
+    assert available == [("u.1", 1), ("u.3", 3)]
+    assert "apartment_occupancy.year IN" in str(fake_session.query)
+
+
+@pytest.mark.asyncio
+async def test_occupancy_status_masks(fake_session: FakeSession) -> None:
+    stay = Booking(
+        start_date=date(2024, 12, 30),
+        end_date=date(2025, 1, 1),
+        cleaning_date=date(2025, 1, 1),
+    )
+    years = bitmap.build([stay])
+    fake_session.all = lambda: [  # type: ignore[attr-defined]
+        Mock(_mapping=bitmaps, apartment_id="a", year=year)
+        for year, bitmaps in years.items()
+    ]
+
+    masks = await ApartmentOccupancy.status_masks(
+        fake_session,  # type: ignore[arg-type]
+        ["a"],
+        date(2024, 12, 29),
+        date(2025, 1, 5),
+    )
+
+    apartment = ApartmentFactory.build(bookings=[stay])
+    assert [(day, mask_statuses(mask)) for _, day, mask in masks] == [
+        (date(2024, 12, 30), apartment.status(date(2024, 12, 30))),
+        (date(2024, 12, 31), apartment.status(date(2024, 12, 31))),
+        (date(2025, 1, 1), apartment.status(date(2025, 1, 1))),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_occupancy_update_patches_dirty_days() -> None:
+    def stay(start: date, end: date, cleaning: date) -> Booking:
+        return Booking(
+            start_date=start, end_date=end, cleaning_date=cleaning, apartment_id="a"
+        )
+
+    kept = stay(date(2024, 3, 1), date(2024, 3, 5), date(2024, 3, 5))
+    moved = stay(date(2024, 12, 20), date(2024, 12, 24), date(2024, 12, 26))
+    before = bitmap.build([kept, moved])
+    row = ApartmentOccupancy(
+        apartment_id="a",
+        year=2024,
+        **{name: bytes(bits) for name, bits in before[2024].items()},
+    )
+    moved.cleaning_date = date(2024, 12, 28)
+    added = stay(date(2024, 12, 30), date(2025, 1, 4), date(2025, 1, 4))
+    dirty = DirtyIntervals()
+    dirty.add("a", date(2024, 12, 26), date(2024, 12, 28))
+    dirty.add("a", added.start_date, cast(date, added.cleaning_date))
+    results = iter([[moved, added], [row]])
+    session = FakeSession()
+    session.all = lambda: next(results)  # type: ignore[attr-defined]
+
+    await ApartmentOccupancy.update(session, dirty)  # type: ignore[arg-type]
+
+    after = bitmap.build([kept, moved, added])
+    rows = {row.year: row for row in session.add_args}
+    assert set(rows) == {2024, 2025}
+    for year, bitmaps in after.items():
+        for name, bits in bitmaps.items():
+            assert getattr(rows[year], name) == bytes(bits), (year, name)
+
+
+def test_apartment_export_rows() -> None:
+    query = Apartment.export_rows("user").compile()
+
+    assert "LEFT OUTER JOIN booking" in str(query)
+    assert str(query).endswith(
+        "ORDER BY apartment.number, apartment.id, booking.start_date"
+    )
+    assert list(query.params.values()) == ["user"]
+
+
+@pytest.mark.asyncio
+async def test_apartment_list_window(fake_session: FakeSession) -> None:
+    fake_session.all = lambda: []  # type: ignore[attr-defined]
+
+    await Apartment.list_window(
+        fake_session,  # type: ignore[arg-type]
+        "user",
+        date(2024, 9, 1),
+        date(2024, 9, 30),
+    )
+
+    query = fake_session.query.compile()  # type: ignore[attr-defined]
+    assert "LEFT OUTER JOIN booking ON booking.apartment_id = apartment.id" in str(
+        query
+    )
+    assert "booking.start_date <= :start_date_1" in str(query)
+    assert "coalesce(booking.cleaning_date, booking.end_date) >= :coalesce_1" in str(
+        query
+    )
+    assert query.params == {
+        "start_date_1": date(2024, 9, 30),
+        "coalesce_1": date(2024, 9, 1),
+        "user_id_1": "user",
+    }
+
+    await Apartment.list_window(
+        fake_session,  # type: ignore[arg-type]
+        "user",
+        date(2024, 9, 1),
+        date(2024, 9, 30),
+        2,
+        (3, "user.3"),
+    )
+
+    query = fake_session.query.compile()  # type: ignore[attr-defined]
+    assert "apartment.id IN (SELECT apartment.id" in str(query)
+    assert "LIMIT :param_3" in str(query)
+    assert query.params["param_3"] == 2
+
+
+@pytest.mark.asyncio
+async def test_apartment_user_booking_bounds(fake_session: FakeSession) -> None:
+    bounds = (date(2020, 1, 1), date(2023, 12, 31))
+    fake_session.one = lambda: bounds  # type: ignore[attr-defined]
+
+    result = await Apartment.user_booking_bounds(
+        fake_session,  # type: ignore[arg-type]
+        "user",
+    )
+
+    assert result == bounds
+    query = fake_session.query.compile()  # type: ignore[attr-defined]
+    assert "JOIN apartment ON apartment.id = booking.apartment_id" in str(query)
+    assert query.params == {"user_id_1": "user"}
@@ -1,10 +1,23 @@
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
+from unittest.mock import AsyncMock, Mock
 
 import pytest
+from pytest_mock import MockerFixture
 
-from src.data.entity import Apartment, Booking
-from src.data.service import ApartmentList, make_schedule
-from src.data.value import ApartmentStatus
+from src.data import bitmap
+from src.data.entity import Apartment, ApartmentOccupancy, Booking
+from src.data.service import (
+    ApartmentList,
+    make_schedule,
+    make_schedule_bitmaps,
+    make_schedule_parallel,
+    make_schedule_sql,
+    make_worklist,
+    resolve_window,
+    schedule_size,
+)
+from src.data.value import ApartmentStatus, status_mask
+from tests.factories import build_portfolio
 
 
 @pytest.fixture
@@ -239,3 +252,174 @@ def test_make_schedule_unbound(apartment_list: list[Apartment]) -> None:
         ApartmentStatus.CHECKOUT,
         ApartmentStatus.CLEANING,
     ]
+
+
+def test_make_schedule_max_days(apartment_list: list[Apartment]) -> None:
+    # without dates the window keeps the latest bookings
+    apartments_list, start, end = make_schedule(apartment_list, max_days=3)
+    assert start == date(2024, 9, 10)
+    assert end == date(2024, 9, 12)
+    assert len(apartments_list.apartments[0].schedule) == 3
+
+    _, start, end = make_schedule(apartment_list, to_date=date(2024, 9, 4), max_days=3)
+    assert (start, end) == (date(2024, 9, 2), date(2024, 9, 4))
+
+    _, start, end = make_schedule(apartment_list, date(2024, 9, 2), max_days=3)
+    assert (start, end) == (date(2024, 9, 2), date(2024, 9, 4))
+
+
+def test_resolve_window() -> None:
+    first, last = date(2020, 1, 1), date(2023, 12, 31)
+    today = datetime.now().date()
+
+    assert resolve_window(None, None, first, last) == (first, last)
+    assert resolve_window(None, None, first, last, 366) == (date(2022, 12, 31), last)
+    assert resolve_window(None, date(2024, 2, 1), first, last, 366) == (
+        date(2023, 2, 1),
+        date(2024, 2, 1),
+    )
+    assert resolve_window(None, date(2024, 2, 1), first, last) == (
+        first,
+        date(2024, 2, 1),
+    )
+    assert resolve_window(date(2023, 6, 1), None, first, last, 366) == (
+        date(2023, 6, 1),
+        last,
+    )
+    assert resolve_window(date(2024, 6, 1), None, first, last, 366) == (
+        date(2024, 6, 1),
+        date(2024, 6, 1),
+    )
+    assert resolve_window(date(2024, 6, 1), date(2026, 1, 1), None, None, 10) == (
+        date(2024, 6, 1),
+        date(2024, 6, 10),
+    )
+    assert resolve_window(None, None, None, None, 366) == (today, today)
+
+
+def test_make_worklist(apartment_list: list[Apartment]) -> None:
+    worklist = make_worklist(apartment_list, date(2024, 9, 5), date(2024, 9, 10))
+
+    assert worklist.start_date == date(2024, 9, 5)
+    assert worklist.end_date == date(2024, 9, 10)
+    assert [(item.number, item.date, item.statuses) for item in worklist.items] == [
+        (2, date(2024, 9, 6), [ApartmentStatus.CLEANING]),
+        (3, date(2024, 9, 6), [ApartmentStatus.CHECKOUT, ApartmentStatus.CLEANING]),
+        (3, date(2024, 9, 10), [ApartmentStatus.CHECKIN]),
+    ]
+
+
+def test_make_worklist_matches_schedule(apartment_list: list[Apartment]) -> None:
+    from_date, to_date = date(2024, 8, 30), date(2024, 9, 14)
+    schedule, _, _ = make_schedule(apartment_list, from_date, to_date)
+    worklist = make_worklist(apartment_list, from_date, to_date)
+
+    expected = sorted(
+        (day, apartment.number, statuses)
+        for apartment in schedule.apartments
+        for day, statuses in apartment.schedule.items()
+        if set(statuses) - {ApartmentStatus.OCCUPIED, ApartmentStatus.VACANT}
+    )
+    assert [(item.date, item.number, item.statuses) for item in worklist.items] == (
+        expected
+    )
+
+
+@pytest.mark.asyncio
+async def test_make_schedule_sql_matches_make_schedule(
+    mocker: MockerFixture,
+) -> None:
+    portfolio = build_portfolio(3, 6, 60)
+    by_id = {apartment.id: apartment for apartment in portfolio}
+
+    async def status_masks(session, ids, from_date, to_date):
+        # what the SQL query returns: every non-vacant day as a mask
+        rows = []
+        for id in ids:
+            for offset in range((to_date - from_date).days + 1):
+                day = from_date + timedelta(days=offset)
+                statuses = by_id[id].status(day)
+                if statuses != [ApartmentStatus.VACANT]:
+                    rows.append((id, day, status_mask(statuses)))
+        return rows
+
+    bookings = [b for apartment in portfolio for b in apartment.bookings]
+    bounds = (
+        min(b.start_date for b in bookings),
+        max(b.cleaning_deadline or b.cleaning_date for b in bookings),
+    )
+    numbers = [(apartment.id, apartment.number) for apartment in portfolio]
+    mocker.patch.object(Apartment, "list_numbers", AsyncMock(return_value=numbers))
+    mocker.patch.object(Apartment, "booking_bounds", AsyncMock(return_value=bounds))
+    mocker.patch.object(Apartment, "status_masks", status_masks)
+
+    for window in ((None, None), (date(2024, 1, 10), date(2024, 2, 20))):
+        expected = make_schedule(portfolio, *window, max_days=30)
+        result = await make_schedule_sql(None, "user", *window, max_days=30)  # type: ignore[arg-type]
+        assert result[:3] == expected
+        assert result[3] == numbers
+
+
+@pytest.mark.asyncio
+async def test_make_schedule_bitmaps_matches_make_schedule(
+    mocker: MockerFixture,
+) -> None:
+    portfolio = build_portfolio(3, 6, 60, start=date(2024, 12, 1))
+    rows = [
+        Mock(_mapping=bitmaps, apartment_id=apartment.id, year=year)
+        for apartment in portfolio
+        for year, bitmaps in bitmap.build(apartment.bookings).items()
+    ]
+    session = Mock(exec=AsyncMock(return_value=Mock(all=Mock(return_value=rows))))
+    window = (date(2024, 12, 10), date(2025, 1, 20))
+    numbers = [(apartment.id, apartment.number) for apartment in portfolio]
+    mocker.patch.object(Apartment, "list_numbers", AsyncMock(return_value=numbers))
+    masks = mocker.spy(ApartmentOccupancy, "status_masks")
+
+    result = await make_schedule_bitmaps(session, "user", *window, max_days=40)
+
+    assert result[:3] == make_schedule(portfolio, *window, max_days=40)
+    masks.assert_called_once_with(
+        session, [id for id, _ in numbers], window[0], date(2025, 1, 18)
+    )
+
+
+@pytest.mark.asyncio
+async def test_make_schedule_parallel_matches_make_schedule() -> None:
+    portfolio = build_portfolio(5, 6, 60)
+    chunks = []
+
+    async def run(fn, packed, first, last):
+        chunks.append(len(packed[3]) - 1)
+        return fn(packed, first, last)
+
+    for window in ((None, None), (date(2024, 1, 10), date(2024, 2, 20))):
+        chunks.clear()
+        result = await make_schedule_parallel(
+            portfolio, run, *window, max_days=30, chunk_size=2
+        )
+        assert result == make_schedule(portfolio, *window, max_days=30)
+        assert chunks == [2, 2, 1]
+
+    empty = await make_schedule_parallel([], run)
+    assert empty[0].apartments == [] and empty[1:] == (None, None)
+
+
+@pytest.mark.asyncio
+async def test_make_schedule_sql_empty(mocker: MockerFixture) -> None:
+    mocker.patch.object(Apartment, "list_numbers", AsyncMock(return_value=[]))
+    calendars, start, end, page = await make_schedule_sql(None, "user")  # type: ignore[arg-type]
+    assert calendars.apartments == []
+    assert (start, end, page) == (None, None, [])
+
+
+def test_schedule_size(apartment_with_single_booking: Apartment) -> None:
+    apartments = [apartment_with_single_booking] * 3
+
+    assert schedule_size([]) == 0
+    assert schedule_size(apartments) == 3 * 6
+    assert schedule_size(apartments, date(2024, 1, 1), date(2024, 12, 31)) == 3 * 366
+    assert (
+        schedule_size(apartments, date(2024, 1, 1), date(2024, 12, 31), max_days=30)
+        == 3 * 30
+    )
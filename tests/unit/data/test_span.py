@@ -0,0 +1,168 @@
+from datetime import date, timedelta
+from itertools import dropwhile, takewhile
+from random import Random
+from typing import cast
+
+from dateutil.rrule import DAILY, rrule
+
+from src.data import span
+from src.data.entity import Apartment, Booking, DayInfo
+from src.data.value import ApartmentStatus, status_mask
+from tests.factories import ApartmentFactory, build_portfolio
+
+
+def reference_status(bookings: list[Booking], dt: date) -> list[ApartmentStatus]:
+    # the date based Apartment.status this module replaced
+    def covers(booking: Booking) -> bool:
+        return booking.start_date <= dt <= cast(date, booking.cleaning_date)
+
+    found = list(takewhile(covers, dropwhile(lambda b: not covers(b), bookings)))
+    if not found:
+        return [ApartmentStatus.VACANT]
+    if len(found) == 2:
+        if found[0].end_date == found[0].cleaning_date:
+            return [
+                ApartmentStatus.CHECKOUT,
+                ApartmentStatus.CLEANING,
+                ApartmentStatus.CHECKIN,
+            ]
+        return [ApartmentStatus.CLEANING, ApartmentStatus.CHECKIN]
+    if found[0].end_date == dt and found[0].cleaning_date == dt:
+        return [ApartmentStatus.CHECKOUT, ApartmentStatus.CLEANING]
+    if found[0].start_date == dt:
+        return [ApartmentStatus.CHECKIN]
+    if found[0].end_date == dt:
+        return [ApartmentStatus.CHECKOUT]
+    if found[0].cleaning_date == dt:
+        return [ApartmentStatus.CLEANING]
+    if found[0].start_date < dt < found[0].end_date:
+        return [ApartmentStatus.OCCUPIED]
+    return [ApartmentStatus.VACANT]
+
+
+def random_bookings(rng: Random, count: int) -> list[Booking]:
+    # overlapping and out of order on purpose
+    bookings = []
+    for _ in range(count):
+        start = date(2024, 1, 1) + timedelta(days=rng.randrange(60))
+        end = start + timedelta(days=rng.randrange(1, 6))
+        cleaning = end + timedelta(days=rng.randrange(3))
+        bookings.append(Booking(start_date=start, end_date=end, cleaning_date=cleaning))
+    return bookings
+
+
+def test_span_of() -> None:
+    booking = Booking(
+        start_date=date(2024, 1, 1),
+        end_date=date(2024, 1, 3),
+        cleaning_date=None,
+        cleaning_deadline=date(2024, 1, 5),
+    )
+    record = span.Span.of(booking)
+    assert (record.start, record.end, record.cleaning, record.deadline) == (
+        date(2024, 1, 1).toordinal(),
+        date(2024, 1, 3).toordinal(),
+        date(2024, 1, 3).toordinal(),
+        date(2024, 1, 5).toordinal(),
+    )
+    assert (
+        span.Span.of(
+            Booking(**{**booking.model_dump(), "cleaning_deadline": None})
+        ).deadline
+        == span.NO_DEADLINE
+    )
+
+
+def test_status_matches_reference() -> None:
+    rng = Random(7)
+    days = [date(2023, 12, 28) + timedelta(days=offset) for offset in range(75)]
+    for _ in range(50):
+        bookings = random_bookings(rng, rng.randrange(8))
+        spans = span.Span.many(bookings)
+        apartment = ApartmentFactory.build(bookings=bookings)
+        for day in days:
+            expected = reference_status(bookings, day)
+            assert span.status(spans, day.toordinal()) == expected
+            assert apartment.status(day) == expected
+
+
+def test_sweep_matches_reference() -> None:
+    rng = Random(11)
+    first, last = date(2023, 12, 28), date(2024, 3, 10)
+    days = [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+    cases = [apartment.bookings for apartment in build_portfolio(4, 10, 70)]
+    cases += [
+        sorted(random_bookings(rng, rng.randrange(8)), key=lambda b: b.start_date)
+        for _ in range(50)
+    ]
+    for bookings in cases:
+        spans = span.Span.many(bookings)
+        assert span.is_sorted(spans)
+        assert span.sweep(spans, first.toordinal(), last.toordinal()) == [
+            reference_status(bookings, day) for day in days
+        ]
+
+
+def reference_best_cleaning_date(
+    booking: Booking, overlapping: tuple[Booking, ...]
+) -> DayInfo | None:
+    # the rrule based Apartment.determine_best_cleaning_date
+    best: DayInfo | None = None
+    if not overlapping:
+        return best
+    deadline = Apartment.get_furthest_deadline(overlapping)
+    end_date = Apartment.get_furthest_end_date_generator(overlapping, booking)
+    for ddate in rrule(
+        DAILY,
+        dtstart=booking.end_date,
+        until=booking.cleaning_deadline or deadline or max(end_date),
+    ):
+        day = ddate.date()
+        vacant = {
+            b.id: b
+            for b in overlapping
+            if b.end_date <= day <= (b.cleaning_deadline or date(3000, 1, 1))
+        }
+        day_info = DayInfo(len(vacant), day, vacant)
+        if not best or (len(best.bookings) < len(day_info.bookings)):
+            best = day_info
+    return best
+
+
+def test_best_cleaning_date_matches_reference() -> None:
+    rng = Random(3)
+    apartment = Apartment(number=1, user_id="user")
+    for _ in range(300):
+        overlapping = []
+        for booking in random_bookings(rng, rng.randrange(6)):
+            if rng.random() < 0.5:
+                booking.cleaning_deadline = booking.end_date + timedelta(
+                    days=rng.randrange(-2, 6)
+                )
+            overlapping.append(booking)
+        booking = random_bookings(rng, 1)[0]
+        if rng.random() < 0.3:
+            booking.cleaning_deadline = booking.end_date + timedelta(
+                days=rng.randrange(4)
+            )
+        assert apartment.determine_best_cleaning_date(
+            booking, tuple(overlapping)
+        ) == reference_best_cleaning_date(booking, tuple(overlapping))
+
+
+def test_packed_masks() -> None:
+    rng = Random(5)
+    first, last = date(2024, 1, 1), date(2024, 3, 1)
+    apartments = [
+        random_bookings(rng, 6),
+        sorted(random_bookings(rng, 6), key=lambda b: b.start_date),
+        [],
+    ]
+    packed = span.pack(apartments)
+    assert list(packed[3]) == [0, 6, 12, 12]
+    masks = span.packed_masks(packed, first.toordinal(), last.toordinal())
+    days = [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+    assert masks == [
+        bytes(status_mask(reference_status(bookings, day)) for day in days)
+        for bookings in apartments
+    ]
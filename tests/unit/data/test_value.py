@@ -2,7 +2,14 @@ from datetime import date
 
 import pytest
 
-from src.data.value import Booking
+from src.data.value import (
+    ApartmentCursor,
+    ApartmentStatus,
+    Booking,
+    DirtyIntervals,
+    mask_statuses,
+    status_mask,
+)
 
 
 def test_booking_validation() -> None:
@@ -11,3 +18,36 @@ def test_booking_validation() -> None:
         Booking(start_date=some_date, end_date=date(2019, 10, 10))
     with pytest.raises(ValueError):
         Booking(start_date=some_date, end_date=some_date)
+
+
+def test_apartment_cursor_roundtrip() -> None:
+    cursor = ApartmentCursor(number=12, id="user.12")
+    assert ApartmentCursor.decode(cursor.encode()) == cursor
+    with pytest.raises(ValueError):
+        ApartmentCursor.decode("not-a-cursor")
+
+
+def test_status_mask_roundtrip() -> None:
+    for statuses in (
+        [ApartmentStatus.VACANT],
+        [ApartmentStatus.CHECKIN],
+        [ApartmentStatus.OCCUPIED],
+        [ApartmentStatus.CHECKOUT, ApartmentStatus.CLEANING],
+        [ApartmentStatus.CLEANING, ApartmentStatus.CHECKIN],
+        [ApartmentStatus.CHECKOUT, ApartmentStatus.CLEANING, ApartmentStatus.CHECKIN],
+    ):
+        assert mask_statuses(status_mask(statuses)) == statuses
+    assert status_mask([ApartmentStatus.CHECKOUT, ApartmentStatus.CHECKIN]) == 3
+
+
+def test_dirty_intervals() -> None:
+    dirty = DirtyIntervals()
+    assert not dirty
+    dirty.add("a", date(2024, 3, 5), date(2024, 3, 9))
+    dirty.add("b", date(2024, 4, 2), date(2024, 4, 1))
+    dirty.add("a", date(2024, 3, 1), date(2024, 3, 6))
+    dirty.add("a", date(2024, 3, 12), date(2024, 3, 12))
+    assert list(dirty) == [
+        ("a", date(2024, 3, 1), date(2024, 3, 12)),
+        ("b", date(2024, 4, 1), date(2024, 4, 2)),
+    ]
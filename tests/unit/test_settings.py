@@ -0,0 +1,15 @@
+import pytest
+from pydantic import ValidationError
+
+from src.settings import Settings
+
+
+def test_bitmap_engine_requires_occupancy_bitmaps() -> None:
+    with pytest.raises(ValidationError, match="requires occupancy_bitmaps"):
+        Settings(schedule_engine="bitmap")  # type: ignore[call-arg]
+
+    settings = Settings(
+        schedule_engine="bitmap",
+        occupancy_bitmaps=True,  # type: ignore[call-arg]
+    )
+    assert settings.schedule_engine == "bitmap"
@@ -0,0 +1,96 @@
+from datetime import date
+from pathlib import Path
+from random import Random
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.data.entity import Booking
+from src.tools.generate import (
+    Portfolio,
+    booking_rows,
+    format_ics,
+    generate_stays,
+    insert_rows,
+    write_ics,
+)
+from src.web.parser import Calendar
+
+
+@pytest.fixture
+def portfolio() -> Portfolio:
+    return Portfolio(
+        users=2,
+        apartments=5,
+        bookings=6,
+        horizon=60,
+        start=date(2024, 1, 1),
+        seed=1,
+    )
+
+
+def test_generate_stays() -> None:
+    stays = generate_stays(Random(0), 30, 365, date(2024, 1, 1))
+    assert len(stays) == 30
+    assert stays[-1].cleaning_deadline is None
+    for stay, following in zip(stays, stays[1:]):
+        assert stay.start_date < stay.end_date <= following.start_date
+        assert stay.cleaning_deadline == following.start_date
+        assert stay.end_date <= stay.cleaning_date <= following.start_date
+    assert any(
+        stay.end_date == following.start_date
+        for stay, following in zip(stays, stays[1:])
+    )
+
+
+def test_format_ics_parses() -> None:
+    stays = generate_stays(Random(0), 4, 40, date(2024, 1, 1))
+    content = format_ics(7, stays, Random(0)).encode()
+
+    calendar = Calendar.parse(content, "apartment_7.ics")
+
+    assert calendar.apartment_no == 7
+    assert [(b.start_date, b.end_date) for b in calendar.bookings] == [
+        (stay.start_date, stay.end_date) for stay in stays
+    ]
+
+
+def test_write_ics(portfolio: Portfolio, tmp_path: Path) -> None:
+    assert write_ics(portfolio, tmp_path) == 5
+    assert sorted(path.name for path in (tmp_path / "user1").iterdir()) == [
+        "apartment_1.ics",
+        "apartment_2.ics",
+        "apartment_3.ics",
+    ]
+    assert sorted(path.name for path in (tmp_path / "user2").iterdir()) == [
+        "apartment_1.ics",
+        "apartment_2.ics",
+    ]
+
+
+def test_booking_rows(portfolio: Portfolio) -> None:
+    rows = list(booking_rows(portfolio, Random(portfolio.seed)))
+    assert len(rows) == 30
+    assert {row["apartment_id"] for row in rows} == {
+        "synthetic-1-1.1",
+        "synthetic-1-1.2",
+        "synthetic-1-1.3",
+        "synthetic-1-2.1",
+        "synthetic-1-2.2",
+    }
+    assert set(rows[0]) == set(Booking.__table__.columns.keys())
+
+
+@pytest.mark.asyncio
+async def test_insert_rows_batches() -> None:
+    connection = AsyncMock()
+    rows = ({"id": str(i)} for i in range(5))
+
+    inserted = await insert_rows(connection, Booking.__table__, rows, batch_size=2)
+
+    assert inserted == 5
+    assert [len(call.args[1]) for call in connection.execute.await_args_list] == [
+        2,
+        2,
+        1,
+    ]
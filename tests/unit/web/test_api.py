@@ -1,17 +1,41 @@
-from datetime import UTC, datetime
-from unittest.mock import AsyncMock, Mock
+import asyncio
+from collections import OrderedDict
+from io import BytesIO
+from contextlib import asynccontextmanager
+from datetime import UTC, date, datetime
+from typing import AsyncIterator
+from unittest.mock import ANY, AsyncMock, Mock
+from zipfile import ZipFile
 
 import httpx
 import pytest
+import pytest_asyncio
 from fastapi import FastAPI
 from httpx import AsyncClient
 from pytest_mock import MockerFixture
 
-from src.data.value import ApartmentList
+from src.data.value import (
+    ApartmentCursor,
+    ApartmentList,
+    ApartmentMonth,
+    DirtyIntervals,
+)
+from src.settings import settings
 from src.web.auth import login_manager
-from src.web.dependencies import db_manager, http_manager
-from src.web.routes.api import Apartment, Calendar
-from tests.factories import UserFactory
+from src.web.cache import data_versions
+from src.web.dependencies import db_manager, http_manager, schedule_executor
+from src.web.jobs import job_manager, stats_refresher
+from src.web.metrics import stage_duration
+from src.web.responses import make_etag
+from src.web.routes.api import (
+    Apartment,
+    ApartmentOccupancy,
+    Calendar,
+    MonthlyStats,
+    User,
+    exports,
+)
+from tests.factories import ApartmentFactory, BookingFactory, UserFactory
 from tests.unit.conftest import FakeSession
 
 
@@ -27,6 +51,39 @@ def fake_session_override(app: FastAPI, fake_session: FakeSession):
     app.dependency_overrides[db_manager] = lambda: fake_session
 
 
+@pytest.fixture(autouse=True)
+def session_scope_override(mocker: MockerFixture, fake_session: FakeSession):
+    @asynccontextmanager
+    async def session_scope() -> AsyncIterator[FakeSession]:
+        yield fake_session
+
+    mocker.patch.object(db_manager, "session_scope", session_scope)
+
+
+@pytest.fixture(autouse=True)
+def booking_bounds(mocker: MockerFixture) -> AsyncMock:
+    bounds = AsyncMock(return_value=(date(2024, 9, 1), date(2024, 9, 30)))
+    mocker.patch.object(Apartment, "user_booking_bounds", bounds)
+    return bounds
+
+
+@pytest_asyncio.fixture(loop_scope="function")
+async def job_session(fake_session: FakeSession) -> AsyncIterator[FakeSession]:
+    yield fake_session
+    await job_manager.shutdown()
+    await stats_refresher.shutdown()
+
+
+async def run_job(api_client: AsyncClient, response: httpx.Response) -> dict:
+    assert response.status_code == 202
+    job = response.json()
+    assert response.headers["location"] == f"/api/jobs/{job['id']}"
+    await job_manager.wait(job["id"])
+    response = await api_client.get(response.headers["location"])
+    assert response.status_code == 200
+    return response.json()
+
+
 @pytest.fixture(scope="function")
 def mock_client(app: FastAPI):
     client = AsyncMock()
@@ -39,7 +96,7 @@ def mock_client(app: FastAPI):
 
 @pytest.fixture(scope="function")
 def parse_mock(mocker: MockerFixture) -> Mock:
-    calendar = Mock()
+    calendar = Mock(bookings=[])
     parse_mock = Mock(return_value=calendar)
     mocker.patch.object(Calendar, "parse", parse_mock)
     return parse_mock
@@ -55,7 +112,7 @@ def mock_apartment() -> AsyncMock:
 @pytest.mark.asyncio
 async def test_import_calendar_new(
     api_client: AsyncClient,
-    fake_session: FakeSession,
+    job_session: FakeSession,
     mocker: MockerFixture,
     mock_client: AsyncMock,
     parse_mock: Mock,
@@ -65,26 +122,31 @@ async def test_import_calendar_new(
     mock_apartment.updated_at = None
     apartment_get = AsyncMock(return_value=None)
     apartment_create = AsyncMock(return_value=mock_apartment)
+    occupancy_built = AsyncMock()
     mocker.patch.object(Apartment, "get", apartment_get)
     mocker.patch.object(Apartment, "create", apartment_create)
+    mocker.patch.object(User, "set_occupancy_built", occupancy_built)
 
     response = await api_client.post("/api/import-url", json={"url": url})
+    job = await run_job(api_client, response)
+    assert job["status"] == "SUCCEEDED"
+    assert job["result"] == {"apartment": 10, "bookings": 0, "updated": True}
 
-    assert response.status_code == 200
     mock_client.head.assert_called_once_with(url)
     mock_client.get.assert_called_once_with(url)
-    apartment_get.assert_called_once_with(fake_session, 10, "user")
-    apartment_create.assert_called_once_with(fake_session, 10, "user")
+    assert "pg_advisory_xact_lock" in str(job_session.query)
+    apartment_get.assert_called_once_with(job_session, 10, "user")
+    apartment_create.assert_called_once_with(job_session, 10, "user")
     parse_mock.assert_called_once_with(mock_client.get.return_value.content, url)
     mock_apartment.set_schedule.assert_called_once_with(
-        fake_session, parse_mock.return_value.bookings
+        job_session, parse_mock.return_value.bookings
     )
 
 
 @pytest.mark.asyncio
 async def test_import_calendar_update(
     api_client: AsyncClient,
-    fake_session: FakeSession,
+    job_session: FakeSession,
     mocker: MockerFixture,
     mock_client: AsyncMock,
     parse_mock: Mock,
@@ -92,74 +154,157 @@ async def test_import_calendar_update(
 ) -> None:
     url = "http://someurl.com/apartment_10.ics"
     mock_apartment.updated_at = datetime(1999, 10, 10, 20, 20, 20, tzinfo=UTC)
+    last_updated = AsyncMock(return_value=mock_apartment.updated_at)
     apartment_get = AsyncMock(return_value=mock_apartment)
     apartment_create = AsyncMock()
+    mocker.patch.object(Apartment, "last_updated", last_updated)
+    occupancy_built = AsyncMock()
     mocker.patch.object(Apartment, "get", apartment_get)
     mocker.patch.object(Apartment, "create", apartment_create)
+    mocker.patch.object(User, "set_occupancy_built", occupancy_built)
 
     response = await api_client.post("/api/import-url", json={"url": url})
+    job = await run_job(api_client, response)
+    assert job["status"] == "SUCCEEDED"
+    assert job["result"] == {"apartment": 10, "bookings": 0, "updated": True}
 
-    assert response.status_code == 200
     mock_client.head.assert_called_once_with(url)
     mock_client.get.assert_called_once_with(url)
-    apartment_get.assert_called_once_with(fake_session, 10, "user")
+    last_updated.assert_called_once_with(job_session, 10, "user")
+    apartment_get.assert_called_once_with(job_session, 10, "user")
     apartment_create.assert_not_called()
     parse_mock.assert_called_once_with(mock_client.get.return_value.content, url)
     mock_apartment.set_schedule.assert_called_once_with(
-        fake_session, parse_mock.return_value.bookings
+        job_session, parse_mock.return_value.bookings
     )
+    # bitmaps are not maintained, they are stale until backfilled again
+    occupancy_built.assert_called_once_with(job_session, "user", False)
+
+
+@pytest.mark.asyncio
+async def test_import_calendar_updates_occupancy(
+    api_client: AsyncClient,
+    job_session: FakeSession,
+    mocker: MockerFixture,
+    mock_client: AsyncMock,
+    parse_mock: Mock,
+    mock_apartment: AsyncMock,
+) -> None:
+    dirty = DirtyIntervals()
+    dirty.add("user.10", date(2020, 10, 1), date(2020, 10, 5))
+    mock_apartment.set_schedule.return_value = dirty
+    update = AsyncMock()
+    mocker.patch.object(settings, "occupancy_bitmaps", True)
+    mocker.patch.object(Apartment, "last_updated", AsyncMock(return_value=None))
+    mocker.patch.object(Apartment, "get", AsyncMock(return_value=mock_apartment))
+    mocker.patch.object(ApartmentOccupancy, "update", update)
+
+    response = await api_client.post(
+        "/api/import-url", json={"url": "http://someurl.com/apartment_10.ics"}
+    )
+    job = await run_job(api_client, response)
+
+    assert job["status"] == "SUCCEEDED"
+    update.assert_called_once_with(job_session, dirty)
 
 
 @pytest.mark.asyncio
 async def test_import_calendar_up_to_date(
     api_client: AsyncClient,
-    fake_session: FakeSession,
+    job_session: FakeSession,
     mocker: MockerFixture,
     mock_client: AsyncMock,
     parse_mock: Mock,
     mock_apartment: AsyncMock,
 ) -> None:
     url = "http://someurl.com/apartment_10.ics"
-    mock_apartment.updated_at = datetime(2025, 10, 10, 20, 20, 20, tzinfo=UTC)
-    apartment_get = AsyncMock(return_value=mock_apartment)
+    last_updated = AsyncMock(
+        return_value=datetime(2025, 10, 10, 20, 20, 20, tzinfo=UTC)
+    )
+    apartment_get = AsyncMock()
     apartment_create = AsyncMock()
+    mocker.patch.object(Apartment, "last_updated", last_updated)
+    occupancy_built = AsyncMock()
     mocker.patch.object(Apartment, "get", apartment_get)
     mocker.patch.object(Apartment, "create", apartment_create)
+    mocker.patch.object(User, "set_occupancy_built", occupancy_built)
 
     response = await api_client.post("/api/import-url", json={"url": url})
+    job = await run_job(api_client, response)
+    assert job["status"] == "SUCCEEDED"
+    assert job["result"] == {"apartment": 10, "updated": False}
 
-    assert response.status_code == 200
     mock_client.head.assert_called_once_with(url)
     mock_client.get.assert_not_called()
-    apartment_get.assert_called_once_with(fake_session, 10, "user")
+    last_updated.assert_called_once_with(job_session, 10, "user")
+    apartment_get.assert_not_called()
     apartment_create.assert_not_called()
     parse_mock.assert_not_called()
-    mock_apartment.set_schedule.assert_not_called()
 
 
 @pytest.mark.asyncio
 async def test_import_calendar_url_exceptions(
     api_client: AsyncClient,
+    job_session: FakeSession,
     mock_client: AsyncMock,
 ) -> None:
-    mock_client.head.side_effect = httpx.RequestError("fail")
-    response = await api_client.post("/api/import-url", json={"url": "http://url.com"})
-    assert response.status_code == 502
-    mock_client.head.side_effect = httpx.NetworkError("fail")
-    response = await api_client.post("/api/import-url", json={"url": "http://url.com"})
-    assert response.status_code == 502
-    mock_client.head.side_effect = httpx.ConnectError("fail")
-    assert response.status_code == 502
+    for error in (httpx.RequestError, httpx.NetworkError, httpx.ConnectError):
+        mock_client.head.side_effect = error("fail")
+        response = await api_client.post(
+            "/api/import-url", json={"url": "http://url.com"}
+        )
+        job = await run_job(api_client, response)
+        assert job["status"] == "FAILED"
+        assert job["error"] == "Error trying to fetch provided URL"
+
+
+@pytest.mark.asyncio
+async def test_import_calendar_file(
+    api_client: AsyncClient,
+    job_session: FakeSession,
+    mocker: MockerFixture,
+    parse_mock: Mock,
+    mock_apartment: AsyncMock,
+) -> None:
+    parse_mock.return_value.apartment_no = 10
+    mocker.patch.object(Apartment, "get", AsyncMock(return_value=mock_apartment))
+    version = data_versions.get("user")
+
+    response = await api_client.post(
+        "/api/import-calendar", files={"file": ("apartment_10.ics", b"ics")}
+    )
+    job = await run_job(api_client, response)
+
+    assert job["status"] == "SUCCEEDED"
+    assert job["result"] == {"apartment": 10, "bookings": 0, "updated": True}
+    assert data_versions.get("user") == version + 1
+    assert stats_refresher.pending
+    parse_mock.assert_called_once_with(b"ics", "apartment_10.ics")
+    mock_apartment.prepare.assert_called_once_with(job_session, ANY)
+    dirty = mock_apartment.prepare.call_args.args[1]
+    assert isinstance(dirty, DirtyIntervals)
+    mock_apartment.set_schedule.assert_called_once_with(job_session, [], dirty)
+
+    response = await api_client.post(
+        "/api/import-calendar", files={"file": ("calendar.ics", b"ics")}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_job_unknown(api_client: AsyncClient) -> None:
+    response = await api_client.get("/api/jobs/missing")
+    assert response.status_code == 404
 
 
 @pytest.mark.asyncio
 async def test_get_calendars(api_client: AsyncClient, mocker: MockerFixture) -> None:
     now = datetime.now().date()
-    apartments = Mock()
+    apartments: list[Apartment] = []
     apartment_list_obj = ApartmentList(apartments=[])
     list_mock = AsyncMock(return_value=apartments)
     make_schedule_mock = Mock(return_value=tuple([apartment_list_obj, now, now]))
-    mocker.patch.object(Apartment, "list", list_mock)
+    mocker.patch.object(Apartment, "list_window", list_mock)
     mocker.patch("src.web.routes.api.make_schedule", make_schedule_mock)
 
     response = await api_client.get("/api/calendars")
@@ -169,24 +314,551 @@ async def test_get_calendars(api_client: AsyncClient, mocker: MockerFixture) ->
         "calendars": {"apartments": []},
         "start_date": now.isoformat(),
         "end_date": now.isoformat(),
+        "next_cursor": None,
+    }
+    window = (date(2024, 9, 1), date(2024, 9, 30))
+    list_mock.assert_called_once_with(
+        ANY, "user", *window, settings.calendars_page_size, None
+    )
+    make_schedule_mock.assert_called_once_with(
+        apartments, *window, settings.schedule_max_days
+    )
+
+    # same data, same etag; a new import changes it
+    etag = response.headers["etag"]
+    response = await api_client.get("/api/calendars")
+    assert response.headers["etag"] == etag
+    response = await api_client.get("/api/calendars", params={"limit": 5})
+    assert response.headers["etag"] != etag
+    data_versions.bump("user")
+    response = await api_client.get("/api/calendars")
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_get_calendars_parallel(
+    api_client: AsyncClient, mocker: MockerFixture
+) -> None:
+    # with the default threshold a full page over a year goes to the pool,
+    # a default page over a month stays in the request
+    apartments = [
+        Apartment(id=f"user.{number}", number=number, bookings=[], user_id="user")
+        for number in range(settings.calendars_max_page_size)
+    ]
+    parallel_mock = AsyncMock(return_value=(ApartmentList(apartments=[]), None, None))
+    make_schedule_mock = Mock(return_value=(ApartmentList(apartments=[]), None, None))
+    list_mock = AsyncMock(return_value=apartments)
+    mocker.patch.object(Apartment, "list_window", list_mock)
+    mocker.patch.object(settings, "schedule_workers", 2)
+    mocker.patch("src.web.routes.api.make_schedule_parallel", parallel_mock)
+    mocker.patch("src.web.routes.api.make_schedule", make_schedule_mock)
+
+    year = {"from_date": "2024-01-01", "to_date": "2024-12-31"}
+    response = await api_client.get(
+        "/api/calendars", params={"limit": settings.calendars_max_page_size, **year}
+    )
+
+    assert response.status_code == 200
+    parallel_mock.assert_called_once_with(
+        apartments,
+        schedule_executor.run,
+        date(2024, 1, 1),
+        date(2024, 12, 31),
+        settings.schedule_max_days,
+        settings.schedule_chunk_size,
+    )
+    assert len(apartments) > settings.schedule_chunk_size
+    make_schedule_mock.assert_not_called()
+
+    list_mock.return_value = apartments[: settings.calendars_page_size]
+    response = await api_client.get(
+        "/api/calendars", params={"from_date": "2024-01-01", "to_date": "2024-01-31"}
+    )
+
+    assert response.status_code == 200
+    assert parallel_mock.call_count == 1
+    make_schedule_mock.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_get_calendars_paginated(
+    api_client: AsyncClient, mocker: MockerFixture
+) -> None:
+    apartments = [
+        ApartmentFactory.build(id="user.1", number=1),
+        ApartmentFactory.build(id="user.2", number=2),
+    ]
+    list_mock = AsyncMock(return_value=apartments)
+    make_schedule_mock = Mock(return_value=(ApartmentList(apartments=[]), None, None))
+    mocker.patch.object(Apartment, "list_window", list_mock)
+    mocker.patch("src.web.routes.api.make_schedule", make_schedule_mock)
+
+    cursor = ApartmentCursor(number=0, id="user.0").encode()
+    response = await api_client.get(
+        "/api/calendars", params={"limit": 2, "cursor": cursor}
+    )
+
+    assert response.status_code == 200
+    list_mock.assert_called_once_with(
+        ANY, "user", date(2024, 9, 1), date(2024, 9, 30), 2, (0, "user.0")
+    )
+    next_cursor = ApartmentCursor.decode(response.json()["next_cursor"])
+    assert next_cursor == ApartmentCursor(number=2, id="user.2")
+
+    list_mock.reset_mock()
+    response = await api_client.get("/api/calendars", params={"limit": 3})
+    assert response.status_code == 200
+    assert response.json()["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_calendars_coalesced(
+    api_client: AsyncClient, mocker: MockerFixture
+) -> None:
+    release = asyncio.Event()
+
+    async def slow_list(*args) -> list[Apartment]:
+        await release.wait()
+        return []
+
+    list_mock = AsyncMock(side_effect=slow_list)
+    mocker.patch.object(Apartment, "list_window", list_mock)
+    requests = [asyncio.create_task(api_client.get("/api/calendars")) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    release.set()
+    responses = await asyncio.gather(*requests)
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert list_mock.call_count == 1
+
+    data_versions.bump("user")
+    await api_client.get("/api/calendars")
+    assert list_mock.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_calendars_outlives_first_caller(
+    api_client: AsyncClient, mocker: MockerFixture
+) -> None:
+    release = asyncio.Event()
+    sessions: list[FakeSession] = []
+    scope_open: list[bool] = []
+
+    @asynccontextmanager
+    async def session_scope() -> AsyncIterator[FakeSession]:
+        session = FakeSession()
+        sessions.append(session)
+        scope_open.append(True)
+        yield session
+        scope_open[-1] = False
+
+    async def slow_list(session: FakeSession, *args) -> list[Apartment]:
+        await release.wait()
+        assert scope_open == [True]
+        return []
+
+    list_mock = AsyncMock(side_effect=slow_list)
+    mocker.patch.object(Apartment, "list_window", list_mock)
+    mocker.patch.object(db_manager, "session_scope", session_scope)
+
+    first = asyncio.create_task(api_client.get("/api/calendars"))
+    await asyncio.sleep(0.05)
+    second = asyncio.create_task(api_client.get("/api/calendars"))
+    await asyncio.sleep(0.05)
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    release.set()
+    response = await second
+
+    assert first.cancelled()
+    assert response.status_code == 200
+    list_mock.assert_called_once_with(sessions[0], "user", ANY, ANY, ANY, None)
+    assert scope_open == [False]
+
+
+@pytest.mark.asyncio
+async def test_get_calendars_sql_engine(
+    api_client: AsyncClient, mocker: MockerFixture
+) -> None:
+    now = datetime.now().date()
+    page = [("user.1", 1), ("user.2", 2)]
+    engine_mock = AsyncMock(return_value=(ApartmentList(apartments=[]), now, now, page))
+    list_mock = AsyncMock()
+    mocker.patch.object(settings, "schedule_engine", "sql")
+    mocker.patch("src.web.routes.api.make_schedule_sql", engine_mock)
+    mocker.patch.object(Apartment, "list_window", list_mock)
+
+    response = await api_client.get("/api/calendars", params={"limit": 2})
+
+    assert response.status_code == 200
+    engine_mock.assert_called_once_with(
+        ANY,
+        "user",
+        date(2024, 9, 1),
+        date(2024, 9, 30),
+        settings.schedule_max_days,
+        2,
+        None,
+    )
+    list_mock.assert_not_called()
+    next_cursor = ApartmentCursor.decode(response.json()["next_cursor"])
+    assert next_cursor == ApartmentCursor(number=2, id="user.2")
+
+
+@pytest.mark.asyncio
+async def test_get_calendars_bitmap_engine(
+    api_client: AsyncClient, mocker: MockerFixture
+) -> None:
+    result = (ApartmentList(apartments=[]), None, None, [])
+    sql_mock = AsyncMock(return_value=result)
+    bitmaps_mock = AsyncMock(return_value=result)
+    ready = AsyncMock(return_value=False)
+    mocker.patch.object(settings, "schedule_engine", "bitmap")
+    mocker.patch.object(settings, "occupancy_bitmaps", True)
+    mocker.patch("src.web.routes.api.make_schedule_sql", sql_mock)
+    mocker.patch("src.web.routes.api.make_schedule_bitmaps", bitmaps_mock)
+    mocker.patch.object(User, "occupancy_ready", ready)
+
+    response = await api_client.get("/api/calendars")
+    assert response.status_code == 200
+    sql_mock.assert_called_once()
+    bitmaps_mock.assert_not_called()
+
+    ready.return_value = True
+    data_versions.bump("user")
+    response = await api_client.get("/api/calendars")
+    assert response.status_code == 200
+    assert sql_mock.call_count == 1
+    bitmaps_mock.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_get_calendars_bad_page(api_client: AsyncClient) -> None:
+    response = await api_client.get("/api/calendars", params={"cursor": "garbage"})
+    assert response.status_code == 400
+    response = await api_client.get(
+        "/api/calendars", params={"limit": settings.calendars_max_page_size + 1}
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_calendars_window_per_portfolio(
+    api_client: AsyncClient, mocker: MockerFixture, booking_bounds: AsyncMock
+) -> None:
+    # bookings from 2020 to 2023, a page only sees its own apartments
+    booking_bounds.return_value = (date(2020, 1, 1), date(2023, 12, 31))
+    list_mock = AsyncMock(return_value=[])
+    mocker.patch.object(Apartment, "list_window", list_mock)
+
+    response = await api_client.get("/api/calendars", params={"to_date": "2024-02-01"})
+    assert response.status_code == 200
+    list_mock.assert_called_with(
+        ANY, "user", date(2023, 2, 1), date(2024, 2, 1), ANY, None
+    )
+
+    cursor = ApartmentCursor(number=3, id="user.3").encode()
+    for params in ({}, {"cursor": cursor}):
+        response = await api_client.get("/api/calendars", params=params)
+        assert response.status_code == 200
+        list_mock.assert_called_with(
+            ANY, "user", date(2022, 12, 31), date(2023, 12, 31), ANY, ANY
+        )
+    booking_bounds.assert_called_with(ANY, "user")
+
+
+@pytest.mark.asyncio
+async def test_get_calendars_window_too_long(
+    api_client: AsyncClient, mocker: MockerFixture
+) -> None:
+    list_mock = AsyncMock(return_value=[])
+    mocker.patch.object(Apartment, "list_window", list_mock)
+    response = await api_client.get(
+        "/api/calendars", params={"from_date": "2024-01-01", "to_date": "2025-01-01"}
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {
+        "detail": f"A schedule spans at most {settings.schedule_max_days} days"
     }
+    list_mock.assert_not_called()
+
+    response = await api_client.get(
+        "/api/calendars", params={"from_date": "2024-01-01", "to_date": "2024-12-31"}
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_get_work(api_client: AsyncClient, mocker: MockerFixture) -> None:
+    apartment = ApartmentFactory.build(number=7)
+    apartment.bookings = [
+        BookingFactory.build(
+            start_date=date(2024, 9, 2),
+            end_date=date(2024, 9, 4),
+            cleaning_date=date(2024, 9, 4),
+        )
+    ]
+    list_mock = AsyncMock(return_value=[apartment])
+    mocker.patch.object(Apartment, "list_active", list_mock)
+
+    response = await api_client.get(
+        "/api/work", params={"from_date": "2024-09-03", "days": 2}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "start_date": "2024-09-03",
+        "end_date": "2024-09-04",
+        "items": [
+            {"number": 7, "date": "2024-09-04", "statuses": ["CHECKOUT", "CLEANING"]}
+        ],
+    }
+    list_mock.assert_called_once_with(ANY, "user", date(2024, 9, 3), date(2024, 9, 4))
+
+    response = await api_client.get(
+        "/api/work", params={"days": settings.work_max_days + 1}
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_availability(api_client: AsyncClient, mocker: MockerFixture) -> None:
+    apartments = [ApartmentFactory.build(number=3), ApartmentFactory.build(number=8)]
+    list_mock = AsyncMock(return_value=apartments)
+    mocker.patch.object(Apartment, "list_available", list_mock)
+    stay = {"check_in": "2024-09-03", "check_out": "2024-09-06"}
+
+    response = await api_client.get("/api/availability", params=stay)
+
+    assert response.status_code == 200
+    assert response.json() == {**stay, "apartments": [3, 8]}
+    list_mock.assert_called_once_with(ANY, "user", date(2024, 9, 3), date(2024, 9, 6))
+
+    response = await api_client.get(
+        "/api/availability",
+        params={"check_in": "2024-09-06", "check_out": "2024-09-06"},
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_availability_bitmaps(
+    api_client: AsyncClient, mocker: MockerFixture
+) -> None:
+    list_mock = AsyncMock(return_value=[("user.3", 3)])
+    ready = AsyncMock(return_value=True)
+    fallback = AsyncMock(return_value=[])
+    mocker.patch.object(settings, "occupancy_bitmaps", True)
+    mocker.patch.object(ApartmentOccupancy, "list_available", list_mock)
+    mocker.patch.object(Apartment, "list_available", fallback)
+    mocker.patch.object(User, "occupancy_ready", ready)
+    stay = {"check_in": "2024-09-03", "check_out": "2024-09-06"}
+
+    response = await api_client.get("/api/availability", params=stay)
+
+    assert response.status_code == 200
+    assert response.json() == {**stay, "apartments": [3]}
+    list_mock.assert_called_once_with(ANY, "user", date(2024, 9, 3), date(2024, 9, 6))
+    ready.assert_called_once_with(ANY, "user")
+    fallback.assert_not_called()
+
+    # not backfilled yet, a user without bitmap rows is not all free
+    ready.return_value = False
+    response = await api_client.get("/api/availability", params=stay)
+
+    assert response.json() == {**stay, "apartments": []}
+    assert list_mock.call_count == 1
+    fallback.assert_called_once_with(ANY, "user", date(2024, 9, 3), date(2024, 9, 6))
+
+
+@pytest.mark.asyncio
+async def test_get_monthly_report(
+    api_client: AsyncClient, mocker: MockerFixture
+) -> None:
+    months = [
+        ApartmentMonth(
+            number=3,
+            month=date(2024, 9, 1),
+            nights_booked=15,
+            turnovers=4,
+            cleaning_days=4,
+            occupancy_rate=0.5,
+        )
+    ]
+    list_mock = AsyncMock(return_value=months)
+    mocker.patch.object(MonthlyStats, "list", list_mock)
+
+    response = await api_client.get(
+        "/api/reports/monthly",
+        params={"from_month": "2024-09-15", "to_month": "2024-10-02"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "from_month": "2024-09-01",
+        "to_month": "2024-10-01",
+        "months": [months[0].model_dump(mode="json")],
+    }
+    list_mock.assert_called_once_with(ANY, "user", date(2024, 9, 1), date(2024, 10, 1))
+
+    response = await api_client.get(
+        "/api/reports/monthly",
+        params={"from_month": "2024-10-01", "to_month": "2024-09-01"},
+    )
+    assert response.status_code == 400
+
+
+class StreamedRows:
+    def __init__(self, rows: list[Mock], size: int) -> None:
+        self.rows = rows
+        self.size = size
+
+    async def __aiter__(self) -> AsyncIterator[Mock]:
+        for row in self.rows:
+            yield row
+
+    async def partitions(self) -> AsyncIterator[list[Mock]]:
+        for index in range(0, len(self.rows), self.size):
+            yield self.rows[index : index + self.size]
+
+
+def stream_rows(job_session: FakeSession, rows: list[Mock]) -> list:
+    queries = []
+
+    async def stream(query):
+        queries.append(query)
+        return StreamedRows(rows, query.get_execution_options()["yield_per"])
+
+    job_session.stream = stream  # type: ignore[attr-defined]
+    return queries
 
 
 @pytest.mark.asyncio
 async def test_export(
-    api_client: AsyncClient, mocker: MockerFixture, mock_apartment: AsyncMock
+    api_client: AsyncClient, job_session: FakeSession, mocker: MockerFixture
 ) -> None:
-    apartment_get = AsyncMock(return_value=None)
-    mocker.patch.object(Apartment, "get", apartment_get)
-    response = await api_client.get("/api/export/10")
+    updated_at = datetime(2024, 9, 1, tzinfo=UTC)
+    version = AsyncMock(return_value=("user.10", 10, updated_at))
+    rows = [
+        Mock(start_date=date(2024, 9, day), end_date=date(2024, 9, day + 2))
+        for day in range(1, 28, 3)
+    ]
+    mocker.patch.object(Apartment, "version", version)
+    mocker.patch.object(settings, "export_batch_size", 4)
+    mocker.patch.object(exports, "entries", OrderedDict())
+    queries = stream_rows(job_session, rows)
+
+    first = await api_client.get("/api/export/10")
+    second = await api_client.get("/api/export/10")
+
+    for response in (first, second):
+        assert response.status_code == 200
+        assert response.content == b"".join(Calendar.stream("user.10", rows))
+        assert response.headers["content-disposition"] == (
+            'attachment; filename="apartment_10.ics"'
+        )
+        assert response.headers["content-type"] == "text/calendar; charset=utf-8"
+        etag = response.headers["etag"].removeprefix("W/")
+        assert etag == make_etag("user.10", updated_at)
+    version.assert_called_with(ANY, "10", "user")
+    assert len(queries) == 1
+    assert (("stage", "calendar_export"),) in stage_duration.series
+    assert "booking.apartment_id" in str(queries[0])
+    assert queries[0].get_execution_options()["yield_per"] == 4
+
+
+@pytest.mark.asyncio
+async def test_export_unknown_or_empty(
+    api_client: AsyncClient, job_session: FakeSession, mocker: MockerFixture
+) -> None:
+    mocker.patch.object(exports, "entries", OrderedDict())
+    stream_rows(job_session, [])
+
+    mocker.patch.object(Apartment, "version", AsyncMock(return_value=None))
+    response = await api_client.get("/api/export/11")
     assert response.status_code == 404
 
-    apartment_get = AsyncMock(return_value=mock_apartment)
-    mocker.patch.object(Apartment, "get", apartment_get)
-    export_mock = Mock(return_value=tuple(["filename", b"test"]))
-    mocker.patch.object(Calendar, "export", export_mock)
-    response = await api_client.get("/api/export/10")
+    mocker.patch.object(
+        Apartment, "version", AsyncMock(return_value=("user.12", 12, None))
+    )
+    response = await api_client.get("/api/export/12")
+    assert response.status_code == 200
+    assert response.content == b"".join(Calendar.stream("user.12", []))
+    assert response.text.count("VEVENT") == 0
+
+
+def portfolio_rows() -> list[Mock]:
+    def row(id: str, number: int, start: date | None, guest_name: str | None):
+        return Mock(
+            id=id,
+            number=number,
+            start_date=start,
+            end_date=start and date(start.year, start.month, start.day + 2),
+            guest_name=guest_name,
+        )
+
+    return [
+        row("user.1", 1, date(2024, 9, 3), "Ana"),
+        row("user.1", 1, date(2024, 9, 8), None),
+        row("user.2", 2, None, None),
+        row("user.3", 3, date(2024, 9, 4), "Bo"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_export_portfolio_zip(
+    api_client: AsyncClient, job_session: FakeSession
+) -> None:
+    rows = portfolio_rows()
+    queries = stream_rows(job_session, rows)
+
+    response = await api_client.get("/api/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    assert response.headers["content-disposition"] == (
+        'attachment; filename="apartments.zip"'
+    )
+    archive = ZipFile(BytesIO(response.content))
+    assert archive.namelist() == [
+        "apartment_1.ics",
+        "apartment_2.ics",
+        "apartment_3.ics",
+    ]
+    assert archive.read("apartment_1.ics") == b"".join(
+        Calendar.stream("user.1", rows[:2])
+    )
+    assert archive.read("apartment_2.ics") == b"".join(Calendar.stream("user.2", []))
+    assert archive.read("apartment_3.ics") == b"".join(
+        Calendar.stream("user.3", rows[3:])
+    )
+    assert len(queries) == 1
+    assert queries[0].get_execution_options()["yield_per"] == (
+        settings.export_batch_size
+    )
+
+
+@pytest.mark.asyncio
+async def test_export_portfolio_ics(
+    api_client: AsyncClient, job_session: FakeSession
+) -> None:
+    rows = portfolio_rows()
+    stream_rows(job_session, rows)
+
+    response = await api_client.get("/api/export", params={"format": "ics"})
+
     assert response.status_code == 200
-    assert response.content == b"test"
-    assert "content-disposition" in response.headers
     assert response.headers["content-type"] == "text/calendar; charset=utf-8"
+    assert response.headers["content-disposition"] == (
+        'attachment; filename="apartments.ics"'
+    )
+    events = sorted(Calendar.get_icalendar(response.content).events)
+    assert [(event.begin.date(), event.location) for event in events] == [
+        (date(2024, 9, 3), "Apartment 1"),
+        (date(2024, 9, 4), "Apartment 3"),
+        (date(2024, 9, 8), "Apartment 1"),
+    ]
+
+    response = await api_client.get("/api/export", params={"format": "pdf"})
+    assert response.status_code == 422
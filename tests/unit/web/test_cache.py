@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from freezegun import freeze_time
+
+from src.web.cache import LRUCache, SingleFlight, Versions
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache: LRUCache[str, int] = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.pop("a") == 1
+    assert len(cache) == 1
+
+
+def test_lru_cache_ttl() -> None:
+    with freeze_time("2024-09-01 12:00:00") as frozen:
+        cache: LRUCache[str, int] = LRUCache(2, ttl=10)
+        cache.set("a", 1)
+        frozen.tick(5)
+        assert cache.get("a") == 1
+        frozen.tick(6)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_in_flight_call() -> None:
+    flight: SingleFlight[str, int] = SingleFlight()
+    release = asyncio.Event()
+    calls = 0
+
+    async def compute() -> int:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return calls
+
+    waiters = [asyncio.create_task(flight.do("key", compute)) for _ in range(3)]
+    other = asyncio.create_task(flight.do("other", compute))
+    await asyncio.sleep(0)
+    assert len(flight) == 2
+    release.set()
+
+    assert await asyncio.gather(*waiters) == [1, 1, 1]
+    assert await other == 2
+    assert len(flight) == 0
+    assert await flight.do("key", compute) == 3
+
+
+@pytest.mark.asyncio
+async def test_single_flight_errors_and_cancellation() -> None:
+    flight: SingleFlight[str, int] = SingleFlight()
+    release = asyncio.Event()
+
+    async def fail() -> int:
+        await release.wait()
+        raise ValueError("boom")
+
+    leader = asyncio.create_task(flight.do("key", fail))
+    follower = asyncio.create_task(flight.do("key", fail))
+    await asyncio.sleep(0)
+    leader.cancel()
+    release.set()
+
+    with pytest.raises(ValueError):
+        await follower
+    assert leader.cancelled()
+    assert len(flight) == 0
+
+
+def test_versions() -> None:
+    versions: Versions[str] = Versions()
+    assert versions.get("user") == 0
+    versions.bump("user")
+    assert versions.get("user") == 1
+    assert versions.get("other") == 0
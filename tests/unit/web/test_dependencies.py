@@ -1,11 +1,21 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+
 import pytest
+from fastapi import HTTPException
 from unittest.mock import AsyncMock, patch
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlmodel.ext.asyncio.session import AsyncSession
 from httpx import AsyncClient, Timeout
 
-from src.web.dependencies import DbManager, HttpManager
+from src.data import span
+from src.web.dependencies import DbManager, ExecutorManager, HttpManager
 from src.settings import settings
+from tests.factories import BookingFactory
 
 
 @pytest.fixture
@@ -111,3 +121,46 @@ async def test_http_manager_client_timeout() -> None:
         mock_async_client_class.assert_called_once_with(
             timeout=Timeout(60, connect=10, pool=2)
         )
+
+
+@pytest.mark.asyncio
+async def test_executor_manager_run() -> None:
+    executor_manager = ExecutorManager(max_workers=1, max_queue=0)
+    result = await executor_manager.run(threading.get_ident)
+    assert result != threading.get_ident()
+    assert executor_manager.pending == 0
+    await executor_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_executor_manager_saturated() -> None:
+    executor_manager = ExecutorManager(max_workers=1, max_queue=1)
+    release = threading.Event()
+    running = [
+        asyncio.create_task(executor_manager.run(release.wait)) for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await executor_manager.run(release.wait)
+    assert exc_info.value.status_code == 503
+
+    release.set()
+    await asyncio.gather(*running)
+    assert executor_manager.pending == 0
+    await executor_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_executor_manager_process_pool() -> None:
+    executor_manager = ExecutorManager(
+        max_workers=1,
+        max_queue=0,
+        executor_class=partial(ProcessPoolExecutor, mp_context=get_context("spawn")),
+    )
+    assert await executor_manager.run(os.getpid) != os.getpid()
+    packed = span.pack([[BookingFactory.build(cleaning_date=None)]])
+    first = packed[0][0]
+    masks = await executor_manager.run(span.packed_masks, packed, first, first + 1)
+    assert masks == span.packed_masks(packed, first, first + 1)
+    await executor_manager.shutdown()
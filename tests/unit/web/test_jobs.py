@@ -0,0 +1,170 @@
+import asyncio
+from typing import AsyncIterator
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+
+from src.web.jobs import Debouncer, Job, JobManager, JobStatus
+
+
+@pytest_asyncio.fixture(loop_scope="function")
+async def manager() -> AsyncIterator[JobManager]:
+    manager = JobManager(workers=2, queue_size=4, retention=16)
+    yield manager
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_job_succeeds(manager: JobManager) -> None:
+    async def work(job: Job) -> int:
+        job.advance("working", 0.5)
+        return 42
+
+    job = await manager.submit("user", "test", work)
+    assert job.status == JobStatus.PENDING
+    await manager.wait(job.id)
+
+    assert manager.get(job.id, "user") is job
+    assert manager.get(job.id, "other") is None
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.stage == "working"
+    assert job.progress == 1.0
+    assert job.result == 42
+    assert job.finished_at is not None
+
+
+@pytest.mark.asyncio
+async def test_job_fails(manager: JobManager) -> None:
+    async def bad_request(job: Job) -> None:
+        raise HTTPException(status_code=400, detail="Bad calendar")
+
+    async def crash(job: Job) -> None:
+        raise RuntimeError("boom")
+
+    first = await manager.submit("user", "test", bad_request)
+    second = await manager.submit("user", "test", crash)
+    await manager.wait(first.id)
+    await manager.wait(second.id)
+
+    assert first.status == JobStatus.FAILED
+    assert first.error == "Bad calendar"
+    assert second.status == JobStatus.FAILED
+    assert second.error == "Internal error"
+    assert not manager.lines
+
+
+@pytest.mark.asyncio
+async def test_jobs_serialized_per_user(manager: JobManager) -> None:
+    running: dict[str, int] = {"user": 0, "other": 0}
+    peak: dict[str, int] = {"user": 0, "other": 0}
+
+    def work(user_id: str):
+        async def run(job: Job) -> None:
+            running[user_id] += 1
+            peak[user_id] = max(peak[user_id], running[user_id])
+            await asyncio.sleep(0.01)
+            running[user_id] -= 1
+
+        return run
+
+    jobs = [
+        await manager.submit(user_id, "test", work(user_id))
+        for user_id in ("user", "user", "other")
+    ]
+    await asyncio.gather(*(manager.wait(job.id) for job in jobs))
+
+    assert all(job.status == JobStatus.SUCCEEDED for job in jobs)
+    assert peak == {"user": 1, "other": 1}
+
+
+@pytest.mark.asyncio
+async def test_user_burst_leaves_workers_free(manager: JobManager) -> None:
+    release = asyncio.Event()
+    finished: list[str] = []
+
+    def work(user_id: str):
+        async def run(job: Job) -> None:
+            if user_id == "a":
+                await release.wait()
+            finished.append(user_id)
+
+        return run
+
+    burst = [await manager.submit("a", "test", work("a")) for _ in range(3)]
+    other = await manager.submit("b", "test", work("b"))
+    await asyncio.wait_for(manager.wait(other.id), 1)
+
+    assert finished == ["b"]
+    assert [job.status for job in burst] == [
+        JobStatus.RUNNING,
+        JobStatus.PENDING,
+        JobStatus.PENDING,
+    ]
+
+    release.set()
+    await asyncio.gather(*(manager.wait(job.id) for job in burst))
+    assert finished == ["b", "a", "a", "a"]
+    assert not manager.lines
+
+
+@pytest.mark.asyncio
+async def test_queue_full(manager: JobManager) -> None:
+    release = asyncio.Event()
+
+    async def blocked(job: Job) -> None:
+        await release.wait()
+
+    jobs = [await manager.submit(str(i), "test", blocked) for i in range(2)]
+    await asyncio.sleep(0)
+    jobs += [await manager.submit(str(i), "test", blocked) for i in range(4)]
+    with pytest.raises(HTTPException) as e:
+        await manager.submit("user", "test", blocked)
+    assert e.value.status_code == 503
+
+    release.set()
+    await asyncio.gather(*(manager.wait(job.id) for job in jobs))
+
+
+@pytest.mark.asyncio
+async def test_debouncer_coalesces_triggers() -> None:
+    runs = 0
+    running = asyncio.Event()
+    release = asyncio.Event()
+
+    async def refresh() -> None:
+        nonlocal runs
+        runs += 1
+        running.set()
+        await release.wait()
+
+    debouncer = Debouncer(0.01, refresh)
+    debouncer.trigger()
+    debouncer.trigger()
+    await running.wait()
+    assert runs == 1
+
+    debouncer.trigger()
+    release.set()
+    await asyncio.sleep(0.05)
+    assert runs == 2
+    assert debouncer.task is not None and debouncer.task.done()
+    await debouncer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_debouncer_survives_errors() -> None:
+    calls = 0
+
+    async def fail() -> None:
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("boom")
+
+    debouncer = Debouncer(0, fail)
+    debouncer.trigger()
+    await asyncio.sleep(0.01)
+    debouncer.trigger()
+    await asyncio.sleep(0.01)
+    assert calls == 2
+    await debouncer.shutdown()
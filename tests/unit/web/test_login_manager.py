@@ -4,7 +4,7 @@ from unittest.mock import AsyncMock
 from fastapi import HTTPException
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.web.auth import LoginManager, User
+from src.web.auth import CurrentUser, LoginManager, User
 from tests.unit.conftest import FakeSession
 
 
@@ -75,12 +75,12 @@ async def test_call_method_success(
     login_manager: LoginManager, fake_session: FakeSession
 ):
     token = login_manager.produce_token("user_id", "testuser")
-    mock_user = User(username="testuser", password="p")
+    mock_user = User(id="user_id", username="testuser", password="p")
     fake_session(return_=mock_user)
 
     result = await login_manager(cast(AsyncSession, fake_session), token)
 
-    assert result == mock_user
+    assert result == CurrentUser(id="user_id", username="testuser")
     assert fake_session.query is not None
 
 
@@ -109,3 +109,37 @@ async def test_call_method_nonexistent_user(
 
     assert exc_info.value.status_code == 401
     assert exc_info.value.detail == "User does not exist"
+
+
+@pytest.mark.asyncio
+async def test_call_method_caches_user(
+    login_manager: LoginManager, fake_session: FakeSession
+):
+    token = login_manager.produce_token("user_id", "testuser")
+    mock_user = User(id="user_id", username="testuser", password="p")
+    fake_session(return_=mock_user)
+    await login_manager(cast(AsyncSession, fake_session), token)
+    assert 'WHERE "user".id' in str(fake_session.query)
+
+    fake_session.query = None
+    result = await login_manager(cast(AsyncSession, fake_session), token)
+
+    assert result == CurrentUser(id="user_id", username="testuser")
+    assert fake_session.query is None
+    assert list(login_manager.users.entries) == ["user_id"]
+
+
+@pytest.mark.asyncio
+async def test_forget_invalidates_cached_user(
+    login_manager: LoginManager, fake_session: FakeSession
+):
+    token = login_manager.produce_token("user_id", "testuser")
+    fake_session(return_=User(id="user_id", username="testuser", password="p"))
+    await login_manager(cast(AsyncSession, fake_session), token)
+
+    login_manager.forget("user_id")
+    fake_session(return_=None)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await login_manager(cast(AsyncSession, fake_session), token)
+    assert exc_info.value.detail == "User does not exist"
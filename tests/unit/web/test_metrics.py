@@ -0,0 +1,153 @@
+import json
+import logging
+from types import SimpleNamespace
+from typing import cast
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.settings import settings
+from src.web.metrics import (
+    Gauge,
+    Histogram,
+    QueryStats,
+    Registry,
+    instrument_engine,
+    query_stats,
+)
+
+
+def test_histogram_collect() -> None:
+    histogram = Histogram("stage_seconds", "Stage timings.", buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="parse")
+    histogram.observe(0.5, stage="parse")
+    histogram.observe(5, stage="parse")
+
+    lines = histogram.collect()
+
+    assert "# TYPE stage_seconds histogram" in lines
+    assert 'stage_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="parse",le="1.0"} 2' in lines
+    assert 'stage_seconds_bucket{stage="parse",le="+Inf"} 3' in lines
+    assert 'stage_seconds_sum{stage="parse"} 5.55' in lines
+    assert 'stage_seconds_count{stage="parse"} 3' in lines
+
+
+def test_histogram_time() -> None:
+    histogram = Histogram("stage_seconds", "Stage timings.")
+    with histogram.time(stage="export"):
+        pass
+    assert 'stage_seconds_count{stage="export"} 1' in histogram.collect()
+
+
+@pytest.mark.asyncio
+async def test_histogram_time_stream() -> None:
+    histogram = Histogram("stage_seconds", "Stage timings.")
+
+    async def chunks():
+        yield b"a"
+        yield b"b"
+
+    assert [chunk async for chunk in histogram.time_stream(chunks(), stage="x")] == [
+        b"a",
+        b"b",
+    ]
+    assert 'stage_seconds_count{stage="x"} 1' in histogram.collect()
+
+
+def test_gauge_collect() -> None:
+    registry = Registry()
+    gauge = registry.register(Gauge("in_flight", "In flight."))
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    registry.register(Gauge("pool", "Pool.", lambda: 3))
+    registry.register(Gauge("broken", "Broken.", lambda: 1 / 0))
+
+    rendered = registry.render()
+
+    assert "in_flight 1.0\n" in rendered
+    assert "pool 3\n" in rendered
+    assert "broken nan\n" in rendered
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(api_client: AsyncClient) -> None:
+    await api_client.get("/signin")
+    response = await api_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/signin",status="200"}'
+        in response.text
+    )
+    assert "http_requests_in_flight" in response.text
+    assert "db_pool_checked_out" in response.text
+
+
+def test_query_stats_record() -> None:
+    stats = QueryStats(path="/api/calendars", keep=2)
+    stats.record("SELECT 1", 0.001)
+    stats.record("SELECT 2", 0.003)
+    stats.record("SELECT 3", 0.002)
+
+    assert stats.count == 3
+    assert [statement for _, statement in stats.slowest] == ["SELECT 2", "SELECT 3"]
+    assert stats.server_timing() == 'db;dur=6.0;desc="3 queries"'
+
+
+def test_instrument_engine(mocker: MockerFixture, caplog) -> None:
+    engine = create_engine("sqlite://")
+    instrument_engine(cast(AsyncEngine, SimpleNamespace(sync_engine=engine)))
+    mocker.patch.object(settings, "slow_query_threshold_ms", 0)
+    stats = QueryStats(path="/test")
+    token = query_stats.set(stats)
+    try:
+        with caplog.at_level(logging.WARNING, logger="src.sql.slow"):
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+    finally:
+        query_stats.reset(token)
+
+    assert stats.count == 1
+    assert stats.slowest[0][1] == "SELECT 1"
+    logged = json.loads(caplog.records[0].getMessage())
+    assert logged["event"] == "slow_query"
+    assert logged["path"] == "/test"
+    assert logged["statement"] == "SELECT 1"
+
+
+def test_instrument_engine_failed_query(mocker: MockerFixture, caplog) -> None:
+    engine = create_engine("sqlite://")
+    instrument_engine(cast(AsyncEngine, SimpleNamespace(sync_engine=engine)))
+    mocker.patch.object(settings, "slow_query_threshold_ms", 0)
+    stats = QueryStats(path="/test")
+    token = query_stats.set(stats)
+    try:
+        with caplog.at_level(logging.WARNING, logger="src.sql.slow"):
+            with engine.connect() as connection:
+                with pytest.raises(OperationalError):
+                    connection.execute(text("SELECT * FROM missing"))
+                connection.execute(text("SELECT 1"))
+                assert connection.info["query_start"] == []
+    finally:
+        query_stats.reset(token)
+
+    assert stats.count == 2
+    assert sorted(statement for _, statement in stats.slowest) == [
+        "SELECT * FROM missing",
+        "SELECT 1",
+    ]
+    logged = json.loads(caplog.records[0].getMessage())
+    assert logged["statement"] == "SELECT * FROM missing"
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header(api_client: AsyncClient) -> None:
+    response = await api_client.get("/signin")
+    assert response.headers["server-timing"] == 'db;dur=0.0;desc="0 queries"'
@@ -0,0 +1,119 @@
+import gzip
+from unittest.mock import Mock
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from pytest_mock import MockerFixture
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from src.web import middleware
+from src.web.cache import LRUCache
+from src.web.middleware import CompressionMiddleware, negotiate_encoding
+
+BODY = "apartment schedule " * 200
+
+
+def large(request):
+    return PlainTextResponse(BODY, headers={"ETag": '"v1"'})
+
+
+def small(request):
+    return PlainTextResponse("tiny")
+
+
+def streamed(request):
+    return StreamingResponse(iter([BODY, BODY]), media_type="text/html")
+
+
+@pytest.fixture
+def cache() -> LRUCache:
+    return LRUCache(8)
+
+
+@pytest.fixture
+async def client(cache: LRUCache):
+    app = Starlette(
+        routes=[
+            Route("/large", large),
+            Route("/small", small),
+            Route("/streamed", streamed),
+        ]
+    )
+    app.add_middleware(CompressionMiddleware, minimum_size=100, cache=cache)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://localhost"
+    ) as client:
+        yield client
+
+
+def test_negotiate_encoding(mocker: MockerFixture) -> None:
+    mocker.patch.object(middleware, "brotli", None)
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("br;q=1.0, gzip;q=0.5") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("*") == "gzip"
+    assert negotiate_encoding("") is None
+    mocker.patch.object(middleware, "brotli", Mock())
+    assert negotiate_encoding("br;q=1.0, gzip;q=0.5") == "br"
+
+
+@pytest.mark.asyncio
+async def test_compresses_and_caches(
+    client: AsyncClient, cache: LRUCache, mocker: MockerFixture
+) -> None:
+    compress = mocker.spy(middleware, "compress")
+    headers = {"Accept-Encoding": "gzip"}
+
+    response = await client.get("/large", headers=headers)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.text == BODY
+    assert len(cache) == 1
+
+    response = await client.get("/large", headers=headers)
+    assert response.text == BODY
+    assert compress.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_compresses_large_in_thread(mocker: MockerFixture) -> None:
+    to_thread = mocker.spy(middleware.asyncio, "to_thread")
+    app = Starlette(routes=[Route("/large", large), Route("/small", small)])
+    app.add_middleware(CompressionMiddleware, minimum_size=1, thread_size=len(BODY))
+    headers = {"Accept-Encoding": "gzip"}
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://localhost"
+    ) as client:
+        response = await client.get("/small", headers=headers)
+        assert response.text == "tiny"
+        to_thread.assert_not_called()
+
+        response = await client.get("/large", headers=headers)
+        assert response.text == BODY
+    to_thread.assert_called_once_with(middleware.compress, BODY.encode(), "gzip")
+
+
+@pytest.mark.asyncio
+async def test_skips_small_and_unaccepted(client: AsyncClient) -> None:
+    response = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "tiny"
+
+    response = await client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.text == BODY
+
+
+@pytest.mark.asyncio
+async def test_compresses_streams(client: AsyncClient) -> None:
+    async with client.stream(
+        "GET", "/streamed", headers={"Accept-Encoding": "gzip"}
+    ) as response:
+        raw = b"".join([chunk async for chunk in response.aiter_raw()])
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(raw).decode() == BODY * 2
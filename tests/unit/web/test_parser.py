@@ -5,6 +5,8 @@ from unittest.mock import Mock
 import pytest
 from pytest_mock import MockerFixture
 
+from src.data.entity import Apartment
+from src.data.entity import Booking as BookingEntity
 from src.data.value import Booking
 from src.web.parser import Calendar, ParserError
 
@@ -65,3 +67,53 @@ def test_extract_dates() -> None:
         ),
         Booking(start_date=date(2020, 10, 4), end_date=date(2020, 10, 10)),
     ] == Calendar.extract_dates(icalendar)
+
+
+def test_export_roundtrip() -> None:
+    guest = "Ana, Ivo; and\nfriends " + "Đurđa " * 12
+    apartment = Apartment(
+        id="user.3",
+        number=3,
+        user_id="user",
+        bookings=[
+            BookingEntity(start_date=date(2020, 10, 4), end_date=date(2020, 10, 10)),
+            BookingEntity(
+                start_date=date(2020, 9, 30),
+                end_date=date(2020, 10, 2),
+                guest_name=guest,
+            ),
+        ],
+    )
+    filename, content = Calendar.export(apartment)
+
+    assert filename == "apartment_3.ics"
+    assert all(len(line) <= 75 for line in content.split(b"\r\n"))
+    assert content == Calendar.export(apartment)[1]
+    calendar = Calendar.parse(content, filename)
+    assert calendar.bookings == [
+        Booking(
+            start_date=date(2020, 9, 30),
+            end_date=date(2020, 10, 2),
+            cleaning_deadline=date(2020, 10, 4),
+            summary=guest,
+        ),
+        Booking(start_date=date(2020, 10, 4), end_date=date(2020, 10, 10)),
+    ]
+
+
+def test_stream_batches() -> None:
+    rows = [
+        Mock(start_date=date(2020, 1, day), end_date=date(2020, 1, day + 1))
+        for day in range(1, 6)
+    ]
+    for row in rows:
+        row.guest_name = None
+    chunks = list(Calendar.stream("user.1", rows, batch_size=2))
+
+    assert len(chunks) == 5
+    assert chunks[0].startswith(b"BEGIN:VCALENDAR")
+    assert chunks[-1] == b"END:VCALENDAR\r\n"
+    assert b"".join(chunks).count(b"BEGIN:VEVENT") == 5
+    assert Calendar.event_uid("user.1", rows[0]) != Calendar.event_uid(
+        "user.2", rows[0]
+    )
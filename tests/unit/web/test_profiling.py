@@ -0,0 +1,77 @@
+import time
+from pathlib import Path
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from pytest_mock import MockerFixture
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from src.settings import settings
+from src.web.middleware import ProfilerMiddleware
+from src.web.profiling import profile_name
+
+
+def busy_handler():
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def busy(request):
+    busy_handler()
+    return PlainTextResponse("done")
+
+
+@pytest.fixture
+def profile_dir(tmp_path: Path, mocker: MockerFixture) -> Path:
+    mocker.patch.object(settings, "profile_dir", str(tmp_path))
+    mocker.patch.object(settings, "profile_token", "secret")
+    mocker.patch.object(settings, "profile_sample_rate", 0.0)
+    return tmp_path
+
+
+@pytest.fixture
+async def client():
+    app = Starlette(routes=[Route("/busy", busy)])
+    app.add_middleware(ProfilerMiddleware)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://localhost"
+    ) as client:
+        yield client
+
+
+def test_profile_name() -> None:
+    name = profile_name("GET", "/api/export/10")
+    assert name.endswith("-get-api_export_10.folded")
+
+
+@pytest.mark.asyncio
+async def test_profiles_requested(client: AsyncClient, profile_dir: Path) -> None:
+    response = await client.get("/busy", headers={"X-Profile": "secret"})
+
+    assert response.text == "done"
+    output = profile_dir / response.headers["x-profile-id"]
+    folded = output.read_text()
+    assert "busy_handler" in folded
+    stack, _, count = folded.splitlines()[0].rpartition(" ")
+    assert int(count) > 0
+
+
+@pytest.mark.asyncio
+async def test_skips_unauthorized(client: AsyncClient, profile_dir: Path) -> None:
+    response = await client.get("/busy", headers={"X-Profile": "wrong"})
+    assert "x-profile-id" not in response.headers
+    response = await client.get("/busy")
+    assert "x-profile-id" not in response.headers
+    assert list(profile_dir.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_samples_requests(
+    client: AsyncClient, profile_dir: Path, mocker: MockerFixture
+) -> None:
+    mocker.patch.object(settings, "profile_sample_rate", 1.0)
+    response = await client.get("/busy")
+    assert (profile_dir / response.headers["x-profile-id"]).exists()
@@ -0,0 +1,21 @@
+from datetime import date
+
+from src.data.value import ApartmentList, ApartmentStatus, ApartmentValue
+from src.web.responses import PydanticJSONResponse
+
+
+def test_pydantic_json_response() -> None:
+    content = ApartmentList.model_construct(
+        apartments=[
+            ApartmentValue.model_construct(
+                number=1,
+                schedule={date(2024, 9, 1): [ApartmentStatus.CHECKIN]},
+            )
+        ]
+    )
+    response = PydanticJSONResponse(content)
+    assert response.media_type == "application/json"
+    assert (
+        response.body
+        == b'{"apartments":[{"number":1,"schedule":{"2024-09-01":["CHECKIN"]}}]}'
+    )
@@ -0,0 +1,99 @@
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import AsyncIterator
+from unittest.mock import ANY, AsyncMock
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from src.data.entity import Apartment, Booking
+from src.settings import settings
+from src.web.auth import login_manager
+from src.web.dependencies import db_manager
+from tests.factories import UserFactory
+from tests.unit.conftest import FakeSession
+
+
+@pytest.fixture(scope="module", autouse=True)
+def authenticator_override(app: FastAPI):
+    app.dependency_overrides[login_manager.authenticator] = lambda: UserFactory.build(
+        id="user"
+    )
+    yield
+    app.dependency_overrides = {}
+
+
+@pytest.fixture(autouse=True)
+def fake_session_override(app: FastAPI, fake_session: FakeSession):
+    app.dependency_overrides[db_manager] = lambda: fake_session
+
+
+@pytest.fixture(autouse=True)
+def session_scope_override(mocker: MockerFixture, fake_session: FakeSession):
+    @asynccontextmanager
+    async def session_scope() -> AsyncIterator[FakeSession]:
+        yield fake_session
+
+    mocker.patch.object(db_manager, "session_scope", session_scope)
+
+
+@pytest.fixture
+def apartment_list(mocker: MockerFixture) -> AsyncMock:
+    booking = Booking(
+        start_date=date(2024, 9, 1),
+        end_date=date(2024, 9, 3),
+        cleaning_date=date(2024, 9, 3),
+        apartment_id="user.7",
+    )
+    list_mock = AsyncMock(
+        return_value=[
+            Apartment(id="user.7", number=7, bookings=[booking], user_id="user")
+        ]
+    )
+    mocker.patch.object(Apartment, "list_window", list_mock)
+    return list_mock
+
+
+@pytest.mark.asyncio
+async def test_index_renders_window(
+    api_client: AsyncClient, apartment_list: AsyncMock
+) -> None:
+    response = await api_client.get("/", params={"from_date": "2024-09-01"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert "Apartment 7" in response.text
+    assert response.text.count("<tr>") == settings.dashboard_window_days + 1
+    assert "2024-09-01" in response.text
+    assert "2024-08-31" not in response.text
+    assert "checkin" in response.text
+    apartment_list.assert_called_once_with(
+        ANY,
+        "user",
+        date(2024, 9, 1),
+        date(2024, 9, settings.dashboard_window_days),
+    )
+
+
+@pytest.mark.asyncio
+async def test_schedule_rows_fragment(
+    api_client: AsyncClient, apartment_list: AsyncMock
+) -> None:
+    response = await api_client.get(
+        "/schedule", params={"from_date": "2024-09-02", "days": 2}
+    )
+
+    assert response.status_code == 200
+    assert "<html" not in response.text
+    assert response.text.count("<tr>") == 2
+    assert "2024-09-02" in response.text
+    assert "2024-09-03" in response.text
+    assert "checkout" in response.text
+
+    response = await api_client.get(
+        "/schedule",
+        params={"from_date": "2024-09-02", "days": settings.schedule_max_days + 1},
+    )
+    assert response.status_code == 422